@@ -2,12 +2,16 @@ import google.generativeai as genai
 import os
 import json
 from dotenv import load_dotenv
+from deadlines import gemini_request_options, DeadlineExceeded
 
 load_dotenv()
 gemini_key = os.getenv("gemini_key")
 
 if not gemini_key:
     print("ERROR: 'gemini_key' is missing from .env file!")
+elif os.getenv("GEMINI_API_ENDPOINT"):
+    genai.configure(api_key=gemini_key, transport="rest",
+                    client_options={"api_endpoint": os.getenv("GEMINI_API_ENDPOINT")})
 else:
     genai.configure(api_key=gemini_key)
 
@@ -73,10 +77,13 @@ class AIService:
         try:
             response = self.model.generate_content(
                 prompt,
-                generation_config={"response_mime_type": "application/json"}
+                generation_config={"response_mime_type": "application/json"},
+                request_options=gemini_request_options()
             )
             return json.loads(response.text)
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"AI GENERATION ERROR: {e}")
             return {
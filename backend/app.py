@@ -1,13 +1,18 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, request, jsonify, make_response, Response, stream_with_context
 from flask_cors import CORS
 import os
+import io
+import csv
 from flask_login import LoginManager
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timezone
 from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.exceptions import InternalServerError
 
-from models import db, User, MealLog, UserStats, Recipe, Ingredient, RecipeIngredient
+from models import db, User, MealLog, UserStats, Recipe, Ingredient, RecipeIngredient, bump_data_version, record_meal_log_reset
 from validators import validate_biometrics
+from calculations import calorie_target as calculate_calorie_target
 from services import (
     fetch_nutritional_data, 
     generate_ai_recipe,
@@ -17,12 +22,34 @@ from services import (
     verify_google_token, 
     search_recipes_spoonacular, 
     predict_goal_date, 
-    log_user_weight
+    log_user_weight,
+    meal_log_rows,
+    serialize_stats,
+    get_meal_log_changes,
+    release_db_connection
 )
 from ai import AIService
 from analysis import PandasAnalysis
+from partitioning import ensure_partitions
+from dashboard import build_dashboard
+from http_cache import user_etag, compress_response
+from schema import upgrade_schema
+from export import generate_export, EXPORT_FORMATS
+from importer import import_history
+from recipe_nutrition import recompute_recipes
+from suggestions import suggest_meals
+from batch_predictions import stored_prediction
+from autocomplete import autocomplete
+from stats_series import stats_series
+from write_behind import meal_log_queue, log_meal_entry, merge_pending
+from profiler import init_profiling
+from json_provider import init_json
+from deadlines import init_deadlines, expensive, deadline
+from auth_tokens import init_auth, issue_token, verify_refresh_token, authorized_for
+from unit_of_work import unit_of_work
 
 app = Flask(__name__)
+init_json(app)
 
 database_url = os.environ.get('DATABASE_URL')
 
@@ -36,10 +63,27 @@ app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
 
+# One gevent worker serves many requests at once (gunicorn.conf.py); size its pool to match.
+if os.environ.get('DB_POOL_SIZE'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ['DB_POOL_SIZE']),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    }
+
 db.init_app(app)
 
+if os.environ.get('MEAL_LOG_WRITE_BEHIND') == '1':
+    meal_log_queue.start(app)
+
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Routes only catch the errors they expect. Anything else propagates to the error handlers:
+# a spent request deadline gets its 504 from deadlines.py, the rest a JSON 500.
+@app.errorhandler(InternalServerError)
+def internal_error(e):
+    return jsonify({"error": "Internal server error"}), 500
+
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
@@ -47,12 +91,13 @@ def after_request(response):
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     return response
 
+app.after_request(compress_response)
+init_profiling(app)
+init_deadlines(app)
+
 login_manager = LoginManager()
 login_manager.init_app(app)
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+init_auth(app, login_manager)
 
 @app.route('/')
 def home():
@@ -61,6 +106,7 @@ def home():
 # --- AUTH ROUTES ---
 
 @app.route('/api/auth/google', methods=['POST'])
+@unit_of_work
 def google_auth():
     data = request.get_json()
     token = data.get('token')
@@ -83,28 +129,30 @@ def google_auth():
         user = User.query.filter_by(email=email).first()
         if user:
             user.google_id = google_id
-            db.session.commit()
 
     if not user:
         base_username = name
         counter = 1
-        while User.query.filter_by(username=name).first():
+        taken = {row[0] for row in db.session.query(User.username).filter(User.username.startswith(base_username))}
+        while name in taken:
             name = f"{base_username}{counter}"
             counter += 1
 
         user = User(username=name, email=email, google_id=google_id)
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
     
     return jsonify({
         "message": "Login successful",
         "user_id": user.id,
         "username": user.username,
         "email": user.email,
-        "picture": user_info.get('picture')
+        "picture": user_info.get('picture'),
+        **issue_token(user)
     }), 200
 
 @app.route('/api/auth/register', methods=['POST'])
+@unit_of_work
 def register():
     data = request.get_json()
     username = data.get('username')
@@ -122,9 +170,10 @@ def register():
     
     try:
         db.session.add(new_user)
-        db.session.commit()
-        return jsonify({"message": "User created", "user_id": new_user.id}), 201
-    except Exception as e:
+        db.session.flush()
+        return jsonify({"message": "User created", "user_id": new_user.id, "username": new_user.username,
+                        **issue_token(new_user)}), 201
+    except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
@@ -140,13 +189,38 @@ def login():
         return jsonify({
             "message": "Login successful",
             "user_id": user.id,
-            "username": user.username
+            "username": user.username,
+            **issue_token(user)
         }), 200
     
     return jsonify({"error": "Invalid credentials"}), 401
 
+def _refresh_token_user():
+    data = request.get_json(silent=True) or {}
+    claims = verify_refresh_token(data.get('refresh_token') or '')
+    if not claims: return None, None
+    user = db.session.get(User, claims['uid'])
+    if not user or claims.get('ver', 0) != user.token_version: return None, None
+    return user, claims
+
+@app.route('/api/auth/refresh', methods=['POST'])
+def refresh_token():
+    user, claims = _refresh_token_user()
+    if not user: return jsonify({"error": "Invalid or expired session"}), 401
+    return jsonify({"user_id": user.id, "username": user.username,
+                    **issue_token(user, auth_time=claims['auth'])}), 200
+
+@app.route('/api/auth/logout', methods=['POST'])
+@unit_of_work
+def logout():
+    user, _ = _refresh_token_user()
+    if not user: return jsonify({"error": "Invalid or expired session"}), 401
+    user.token_version += 1
+    return jsonify({"message": "Logged out"}), 200
+
 
 @app.route('/api/user/<user_id>', methods=['GET'])
+@user_etag()
 def get_user_by_id(user_id):
     user = User.query.get(user_id)
     if user:
@@ -160,6 +234,7 @@ def get_user_by_id(user_id):
 # --- USER STATS ---
 
 @app.route('/api/user/<user_id>/stats', methods=['POST'])
+@unit_of_work
 def add_user_stats(user_id):
     try:
         uid = int(user_id)
@@ -178,15 +253,12 @@ def add_user_stats(user_id):
         gender = data.get('gender', 'Male') 
         activity = data.get('activity_level', 'moderate')
         
+        target_weight = data.get('target_weight') or weight
+
         calorie_target = data.get('calorie_target') or data.get('target')
         if not calorie_target:
-             bmr = (10 * weight) + (6.25 * height) - (5 * age)
-             bmr += 5 if gender.lower() == 'male' else -161
-             activity_multipliers = {"sedentary": 1.2, "light": 1.375, "moderate": 1.55, "active": 1.725}
-             multiplier = activity_multipliers.get(activity, 1.2)
-             calorie_target = int(bmr * multiplier)
+             calorie_target = calculate_calorie_target(weight, height, age, gender, activity, target_weight=target_weight)
 
-        target_weight = data.get('target_weight') or weight
         height_m = height / 100
         bmi = round(weight / (height_m * height_m), 2)
 
@@ -217,14 +289,15 @@ def add_user_stats(user_id):
             )
             db.session.add(new_stats)
         
-        db.session.commit()
+        db.session.flush()
         return jsonify({"message": "Stats saved", "bmi": bmi, "calorie_goal": int(calorie_target)}), 201
 
-    except Exception as e:
+    except (ValueError, TypeError, SQLAlchemyError) as e:
         db.session.rollback()
         return jsonify({"error": f"Database error: {str(e)}"}), 500
     
 @app.route('/api/user/<int:user_id>/stats', methods=['PUT'])
+@unit_of_work
 def update_user_stats(user_id):
     user = User.query.get_or_404(user_id)
     data = request.get_json()
@@ -240,24 +313,26 @@ def update_user_stats(user_id):
     )
     try:
         db.session.add(new_stats)
-        db.session.commit()
+        db.session.flush()
         return jsonify({"message": "New weight entry recorded!"}), 201
-    except Exception as e:
+    except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 # --- FOOD LOGGING ---
 
 @app.route('/api/food/search/<query>/<int:user_id>', methods=['GET'])
+@expensive
+@unit_of_work
 def search_food(query, user_id):
     try:
+        estimate = {}
         ing = Ingredient.query.filter(Ingredient.name.ilike(f"%{query}%")).first()
         if ing:
             recipe = ing.recipe_json
             if not recipe:
                 recipe = generate_ai_recipe(ing.name)
                 ing.recipe_json = recipe
-                db.session.commit()
             
             meal_name, calories, protein, fats, carbs = ing.name, ing.calories_per_unit, ing.protein_per_unit, ing.fats_per_unit, ing.carbs_per_unit
 
@@ -272,31 +347,40 @@ def search_food(query, user_id):
             carbs = data['carbs']
             recipe = data.get('recipe')
 
-            new_ing = Ingredient(name=meal_name, calories_per_unit=calories, protein_per_unit=protein, fats_per_unit=fats, carbs_per_unit=carbs, recipe_json=recipe)
-            db.session.add(new_ing)
-            db.session.commit()
+            # Estimates borrow another food's macros: they aren't cached as catalogue entries,
+            # or later searches (and the estimator's own index) would treat them as real data.
+            if 'estimated_from' in data:
+                estimate = {"estimated_from": data['estimated_from'], "confidence": data['confidence']}
+            else:
+                new_ing = Ingredient(name=meal_name, calories_per_unit=calories, protein_per_unit=protein, fats_per_unit=fats, carbs_per_unit=carbs, recipe_json=recipe)
+                db.session.add(new_ing)
 
-        new_log = MealLog(user_id=user_id, meal_name=meal_name, protein=protein, fats=fats, carbs=carbs, calories=calories, date=datetime.now(timezone.utc))
-        db.session.add(new_log)
-        db.session.commit()
+        log_id = log_meal_entry(user_id=user_id, meal_name=meal_name, protein=protein, fats=fats, carbs=carbs, calories=calories, date=datetime.now(timezone.utc))
 
         return jsonify({
             "meal_name": meal_name,
             "calories": calories,
             "protein": protein, "fats": fats, "carbs": carbs,
             "recipe": recipe,
-            "id": new_log.id
+            "id": log_id,
+            **estimate
         }), 200
-    except Exception as e:
+    except (KeyError, SQLAlchemyError) as e:
         print(f"Search Error: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/api/food/autocomplete', methods=['GET'])
+def autocomplete_food():
+    limit = min(request.args.get('limit', 10, type=int), 25)
+    return jsonify(autocomplete.search(request.args.get('q', ''), limit, app=app)), 200
+
 @app.route('/api/user/<int:user_id>/meal-log', methods=['POST'])
+@unit_of_work
 def log_meal(user_id):
     data = request.get_json()
     if not data.get('food_name'): return jsonify({"error": "Food name required"}), 400
     try:
-        new_meal = MealLog(
+        meal_id = log_meal_entry(
             user_id=user_id,
             meal_name=data.get('food_name'),
             protein=data.get('protein', 0),
@@ -305,55 +389,71 @@ def log_meal(user_id):
             calories=data.get('calories', 0),
             date=datetime.now(timezone.utc)
         )
-        db.session.add(new_meal)
-        db.session.commit()
-        return jsonify({"message": "Meal logged", "id": new_meal.id}), 201
-    except Exception as e:
+        return jsonify({"message": "Meal logged", "id": meal_id}), 201
+    except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/user/<int:user_id>/meal-log', methods=['GET'])
+@user_etag()
 def get_meal_log(user_id):
-    meals = MealLog.query.filter_by(user_id=user_id).order_by(MealLog.date.desc()).all()
-    return jsonify([{
-        "id": m.id, "meal_name": m.meal_name, "protein": m.protein,
-        "fats": m.fats, "carbs": m.carbs, "calories": m.calories,
-        "date": m.date.strftime("%Y-%m-%d %H:%M:%S")
-    } for m in meals]), 200
+    return jsonify(merge_pending(user_id, meal_log_rows(MealLog.user_id == user_id))), 200
+
+@app.route('/api/user/<int:user_id>/meal-log/changes', methods=['GET'])
+@user_etag()
+def get_meal_log_changes_route(user_id):
+    changes = get_meal_log_changes(user_id, request.args.get('since', 0, type=int))
+    if changes is None: return jsonify({"error": "User not found"}), 404
+    changes["upserts"] = merge_pending(user_id, changes["upserts"])
+    return jsonify(changes), 200
 
 @app.route('/api/user/<int:user_id>/meal-log/<int:meal_id>', methods=['DELETE'])
+@unit_of_work
 def delete_meal_log_entry(user_id, meal_id):
+    if meal_log_queue.is_pending(meal_id):
+        meal_log_queue.drain()
     meal = MealLog.query.filter_by(id=meal_id, user_id=user_id).first()
     if not meal: return jsonify({"error": "Not found"}), 404
     db.session.delete(meal)
-    db.session.commit()
     return jsonify({"message": "Deleted"}), 200
 
 @app.route('/api/user/<int:user_id>/meal-log', methods=['DELETE'])
+@unit_of_work
 def delete_all_meal_logs(user_id):
-    MealLog.query.filter_by(user_id=user_id).delete()
-    db.session.commit()
-    return jsonify({"message": "All deleted"}), 200
+    if meal_log_queue.pending_for(user_id):
+        meal_log_queue.drain()
+    # One transaction with the version bump and reset tombstone: a client never sees part
+    # of the history gone without learning about the reset.
+    deleted = MealLog.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    bump_data_version(db.session, [user_id])
+    record_meal_log_reset(db.session, user_id)
+    return jsonify({"message": "All deleted", "deleted": deleted}), 200
 
 # --- RECIPES ---
 
 @app.route('/api/recipes', methods=['POST'])
+@unit_of_work
 def create_recipe():
     data = request.get_json() 
-    if Recipe.query.filter_by(food=data.get('food')).first():
+    title = data.get('title') or data.get('food')
+    if not title: return jsonify({"error": "Recipe title required"}), 400
+    if Recipe.query.filter_by(title=title).first():
         return jsonify({"error": "Recipe already exists"}), 400
     try:
-        new_recipe = Recipe(food=data.get('food'), instructions=data.get('instructions'), base_servings=data.get('base_servings', 1))
+        new_recipe = Recipe(title=title, instructions=data.get('instructions'), base_servings=data.get('base_servings', 1))
         db.session.add(new_recipe)
         db.session.flush() 
         for ing in data.get('ingredients', []): _link_ingredient_to_recipe(new_recipe.id, ing)
-        db.session.commit()
+        db.session.flush()
+        recompute_recipes([new_recipe.id])
         return jsonify({"message": "Recipe created", "recipe_id": new_recipe.id}), 201
-    except Exception as e:
+    except (KeyError, TypeError, AttributeError, SQLAlchemyError) as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/recipes/<int:recipe_id>', methods=['GET'])
+@expensive
+@unit_of_work
 def get_recipe(recipe_id):
     recipe = get_recipe_with_cache(recipe_id, source=request.args.get('source', 'local'))
     if not recipe: return jsonify({"error": "Recipe not found"}), 404
@@ -361,24 +461,34 @@ def get_recipe(recipe_id):
     return jsonify(data), 200
 
 @app.route('/api/recipes/search', methods=['GET'])
+@expensive
 def search_recipes():
     return jsonify(search_recipes_spoonacular(request.args.get('query')) if request.args.get('query') else []), 200
 
 # --- STATS READERS ---
 
 @app.route('/api/user/<int:user_id>/stats/latest', methods=['GET'])
+@user_etag()
 def get_user_stats(user_id):
     stats = UserStats.query.filter_by(user_id=user_id).order_by(UserStats.updated_at.desc()).first()
     if stats:
-        return jsonify({
-            "weight": stats.weight, "height": stats.height, "age": stats.age,
-            "bmi": stats.bmi, "activity_level": stats.activity_level,
-            "target": stats.calorie_target, "calorie_target": stats.calorie_target,
-            "target_weight": stats.target_weight, "updated_at": stats.updated_at
-        }), 200
+        return jsonify(serialize_stats(stats)), 200
     return jsonify({"error": "No stats found"}), 404
 
+@app.route('/api/user/<int:user_id>/stats/series', methods=['GET'])
+@user_etag(daily=True)
+def get_stats_series(user_id):
+    try:
+        series = stats_series(
+            user_id, request.args.get('metric', 'calories'), request.args.get('bucket', 'day'),
+            request.args.get('from'), request.args.get('to'), request.args.get('points', 300, type=int)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(series), 200
+
 @app.route('/api/user/<int:user_id>/weight', methods=['POST'])
+@unit_of_work
 def update_weight(user_id):
     data = request.json
     result = log_user_weight(user_id, data.get('weight'))
@@ -386,27 +496,84 @@ def update_weight(user_id):
     return jsonify({"error": "User not found"}), 404
 
 @app.route('/api/user/<int:user_id>/prediction', methods=['GET'])
+@user_etag(daily=True)
 def get_prediction(user_id):
-    return jsonify(predict_goal_date(user_id)), 200
+    return jsonify(stored_prediction(user_id) or predict_goal_date(user_id)), 200
+
+@app.route('/api/user/<int:user_id>/dashboard', methods=['GET'])
+@user_etag(daily=True)
+def get_dashboard(user_id):
+    dashboard = build_dashboard(user_id)
+    if not dashboard: return jsonify({"error": "User not found"}), 404
+    return jsonify(dashboard), 200
+
+@app.route('/api/user/<int:user_id>/export', methods=['GET'])
+@expensive
+@deadline(300)
+def export_history(user_id):
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported format. Choose from: {', '.join(EXPORT_FORMATS)}"}), 400
+    if not db.session.get(User, user_id):
+        return jsonify({"error": "User not found"}), 404
+
+    response = Response(stream_with_context(generate_export(user_id, fmt)), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=eathiopia_history_{user_id}.{fmt}'
+    return response
+
+@app.route('/api/user/<int:user_id>/import', methods=['POST'])
+@expensive
+@deadline(300)
+def import_user_history(user_id):
+    if not db.session.get(User, user_id):
+        return jsonify({"error": "User not found"}), 404
+
+    upload = request.files.get('file')
+    filename = upload.filename if upload else ''
+    fmt = request.args.get('format') or ('ndjson' if filename.endswith(('.ndjson', '.jsonl')) else 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported format. Choose from: {', '.join(EXPORT_FORMATS)}"}), 400
+
+    raw = upload.stream if upload else request.stream
+    stream = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+    try:
+        result = import_history(user_id, stream, fmt, request.args.get('weight_unit', 'kg'))
+    except (ValueError, csv.Error, SQLAlchemyError) as e:
+        db.session.rollback()
+        return jsonify({"error": f"Import failed: {str(e)}"}), 500
+
+    return jsonify(result), 201
+
+@app.route('/api/user/<int:user_id>/suggestions', methods=['GET'])
+def get_suggestions(user_id):
+    k = min(request.args.get('k', 10, type=int), 50)
+    result = suggest_meals(user_id, k=k, meals_left=request.args.get('meals_left', 1, type=int))
+    if result is None: return jsonify({"error": "No stats found"}), 404
+    return jsonify(result), 200
 
 # --- AI ROUTES ---
 
 @app.route('/api/ai/advice', methods=['POST'])
+@expensive
 def get_advice():
     data = request.get_json(force=True) 
     user_id = data.get('userid') or data.get('user_id')
     if not user_id: return jsonify({"error": "User ID is missing"}), 400
+    if not authorized_for(user_id): return jsonify({"error": "Forbidden"}), 403
     try:
-        analysis = PandasAnalysis(user_id)
-        response = AIService().advice(analysis.ai_input(), data.get('question'))
+        ai_input = PandasAnalysis(user_id).ai_input()
+        release_db_connection()
+        response = AIService().advice(ai_input, data.get('question'))
         return jsonify(response)
-    except Exception as e:
+    except (KeyError, ValueError, SQLAlchemyError) as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/init-db')
 def init_db():
     try:
         db.create_all()
+        upgrade_schema()
+        ensure_partitions()
         return "Database tables created successfully! You can now log in."
     except Exception as e:
         return f"Error creating tables: {str(e)}"
@@ -414,6 +581,8 @@ def init_db():
 if __name__ == "__main__":
     with app.app_context():
         db.create_all()
+        upgrade_schema()
+        ensure_partitions()
     
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
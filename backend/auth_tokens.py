@@ -0,0 +1,150 @@
+"""
+Stateless signed session tokens.
+
+`login`, `register` and `google_auth` return a short-lived token (itsdangerous, HMAC with
+the app's SECRET_KEY) carrying the user id and basic profile claims. Requests send it as
+`Authorization: Bearer <token>`; the guard checks the signature and age in memory, so
+authenticating a request costs microseconds and no database round trip. The claims are
+exposed through Flask-Login's `current_user` (a TokenUser, not a DB row).
+
+- A token older than TOKEN_TTL_SECONDS is rejected with 401. Logging in also returns a
+  refresh token (signed with a different salt, so neither kind passes for the other)
+  that POST /api/auth/refresh trades for a new pair while it is younger than
+  REFRESH_TTL_SECONDS. The pair keeps the original login time, and no refresh is granted
+  more than MAX_SESSION_SECONDS after it, so a leaked token can't be kept alive forever.
+- Refresh tokens carry the user's token_version; POST /api/auth/logout bumps it, which
+  revokes every refresh token of the user (access tokens then lapse within the TTL).
+- A route with a `user_id` argument only accepts the token of that user (403 otherwise).
+- Requests without a token are still served unless REQUIRE_AUTH_TOKENS=1, so clients can
+  move over before it is enforced. Invalid or expired tokens are always rejected.
+- With REQUIRE_AUTH_TOKENS=1 the app refuses to start without a real SECRET_KEY.
+"""
+import hashlib
+import os
+import time
+
+from flask import current_app, g, jsonify, request
+from flask_login import UserMixin
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+TOKEN_TTL_SECONDS = int(os.getenv("TOKEN_TTL_SECONDS", 900))
+REFRESH_TTL_SECONDS = int(os.getenv("REFRESH_TTL_SECONDS", 14 * 86400))
+MAX_SESSION_SECONDS = int(os.getenv("MAX_SESSION_SECONDS", 30 * 86400))
+REQUIRE_AUTH_TOKENS = os.getenv("REQUIRE_AUTH_TOKENS") == "1"
+TOKEN_SALT = "eathiopia-session"
+REFRESH_SALT = "eathiopia-refresh"
+INSECURE_SECRET_KEYS = {None, "", "dev-secret-key"}
+
+# Reachable without a (valid) token even when REQUIRE_AUTH_TOKENS is on.
+PUBLIC_ENDPOINTS = {"home", "google_auth", "register", "login", "refresh_token", "logout", "init_db", "static"}
+
+_serializers = {}
+
+
+class TokenUser(UserMixin):
+    def __init__(self, claims):
+        self.id = claims["uid"]
+        self.username = claims.get("name")
+        self.email = claims.get("email")
+        self.claims = claims
+
+
+def _serializer(salt=TOKEN_SALT):
+    key = (current_app.config["SECRET_KEY"], salt)
+    if key not in _serializers:
+        _serializers[key] = URLSafeTimedSerializer(
+            key[0], salt=salt, signer_kwargs={"digest_method": hashlib.sha256}
+        )
+    return _serializers[key]
+
+def issue_token(user, auth_time=None):
+    """Sign an access token and a refresh token for `user`.
+
+    Args:
+        user: A User row.
+        auth_time: When the user logged in (epoch seconds); defaults to now. Refreshes
+            pass the original value on so the session length stays capped.
+
+    Returns:
+        dict: {"token", "expires_in", "refresh_token"} to merge into the auth response.
+    """
+    token = _serializer().dumps({"uid": user.id, "name": user.username, "email": user.email})
+    refresh = _serializer(REFRESH_SALT).dumps({
+        "uid": user.id, "auth": int(auth_time or time.time()), "ver": user.token_version or 0
+    })
+    return {"token": token, "expires_in": TOKEN_TTL_SECONDS, "refresh_token": refresh}
+
+def verify_token(token, max_age=TOKEN_TTL_SECONDS):
+    """
+    Claims of a valid token, or None if the signature is wrong or it is older than max_age.
+    """
+    try:
+        return _serializer().loads(token, max_age=max_age)
+    except (SignatureExpired, BadSignature):
+        return None
+
+def verify_refresh_token(token):
+    """
+    Claims of a refresh token that is validly signed, younger than REFRESH_TTL_SECONDS and
+    from a login less than MAX_SESSION_SECONDS ago; None otherwise. The caller still has
+    to compare claims["ver"] with the user's token_version.
+    """
+    try:
+        claims = _serializer(REFRESH_SALT).loads(token, max_age=REFRESH_TTL_SECONDS)
+    except (SignatureExpired, BadSignature):
+        return None
+    if time.time() - claims.get("auth", 0) > MAX_SESSION_SECONDS:
+        return None
+    return claims
+
+def bearer_token():
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        return header[7:].strip()
+    return None
+
+
+def _unauthorized(message, status=401):
+    return jsonify({"error": message}), status
+
+def _authenticate():
+    # Public routes ignore the header: a stale token must not block logging in again.
+    if request.method == "OPTIONS" or request.endpoint in PUBLIC_ENDPOINTS:
+        return None
+    token = bearer_token()
+    if token is None:
+        if REQUIRE_AUTH_TOKENS:
+            return _unauthorized("Authentication required")
+        return None
+
+    claims = verify_token(token)
+    if claims is None:
+        return _unauthorized("Invalid or expired token")
+    g.auth_claims = claims
+
+    user_id = (request.view_args or {}).get("user_id")
+    if user_id is not None and str(user_id) != str(claims["uid"]):
+        return _unauthorized("Forbidden", 403)
+    return None
+
+def authorized_for(user_id):
+    """
+    False when the request carries a token of a different user (for ids outside the URL).
+    """
+    claims = g.get("auth_claims")
+    return claims is None or str(claims["uid"]) == str(user_id)
+
+def init_auth(app, login_manager):
+    """
+    Install the token guard and make Flask-Login's current_user come from the token.
+    """
+    if app.config.get("SECRET_KEY") in INSECURE_SECRET_KEYS:
+        if REQUIRE_AUTH_TOKENS:
+            raise RuntimeError("SECRET_KEY must be set to a real secret when REQUIRE_AUTH_TOKENS=1")
+        print("WARNING: SECRET_KEY is not set; session tokens are signed with a development key.")
+    app.before_request(_authenticate)
+
+    @login_manager.request_loader
+    def load_user_from_token(_request):
+        claims = g.get("auth_claims")
+        return TokenUser(claims) if claims else None
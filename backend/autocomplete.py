@@ -0,0 +1,177 @@
+"""
+Side-effect-free food autocomplete over an in-memory prefix index.
+
+The index holds every Ingredient name and cached Recipe title, keyed by each word start
+("doro wat" is findable by "doro" and "wat"), in one sorted list. A query is two
+bisects for the prefix range plus a NumPy top-k over the global popularity (how often
+the food was logged) of that range, so it never touches the database.
+
+New ingredients/recipes are appended to a small unsorted delta (scanned linearly on
+query) once their transaction commits, and folded into the sorted index by the periodic
+background rebuild, which also refreshes popularity.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Ingredient, Recipe, MealLog
+
+AUTOCOMPLETE_LIMIT = 10
+REBUILD_SECONDS = 600
+MAX_DELTA = 1000
+
+
+def _normalize(text):
+    return " ".join(str(text).lower().split())
+
+def _word_keys(name):
+    """
+    The name itself plus the suffix starting at every later word.
+    """
+    words = name.split(" ")
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex:
+    def __init__(self, items, popularity):
+        """
+        items: [(display name, type, id)]; popularity: matching list of counts.
+        """
+        self.items = items
+        self.popularity = np.asarray(popularity, dtype=np.float64)
+
+        entries = sorted(
+            (key, i) for i, (name, _, _) in enumerate(items) for key in _word_keys(_normalize(name))
+        )
+        self.keys = [key for key, _ in entries]
+        self.key_items = np.fromiter((i for _, i in entries), dtype=np.int64, count=len(entries))
+
+    def search(self, prefix, limit):
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + '\uffff', lo)
+        if lo == hi:
+            return []
+
+        candidates = self.key_items[lo:hi]
+        scores = self.popularity[candidates]
+        # Over-fetch so items matched through several word keys still fill `limit` after dedupe.
+        take = min(len(candidates), limit * 3)
+        top = np.argpartition(-scores, take - 1)[:take] if take < len(candidates) else np.arange(len(candidates))
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        seen, results = set(), []
+        for i in candidates[top]:
+            if i not in seen:
+                seen.add(i)
+                results.append((self.items[i], float(self.popularity[i])))
+                if len(results) == limit:
+                    break
+        return results
+
+
+class Autocomplete:
+    def __init__(self):
+        self._index = None
+        self._delta = []
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._refresher = None
+
+    def build(self):
+        """
+        Rebuild the sorted index from the database (needs an app context).
+        """
+        uses = dict(db.session.query(func.lower(MealLog.meal_name), func.count(MealLog.id))
+                    .group_by(func.lower(MealLog.meal_name)).all())
+
+        items, popularity = [], []
+        for ingredient_id, name in db.session.query(Ingredient.id, Ingredient.name):
+            items.append((name, "food", ingredient_id))
+            popularity.append(uses.get(name.lower(), 0))
+        for recipe_id, title in db.session.query(Recipe.id, Recipe.title):
+            items.append((title, "recipe", recipe_id))
+            popularity.append(uses.get(title.lower(), 0))
+
+        index = PrefixIndex(items, popularity)
+        with self._lock:
+            self._index = index
+            self._delta = []
+        return len(items)
+
+    def add(self, name, item_type, item_id):
+        with self._lock:
+            if self._index is not None and len(self._delta) < MAX_DELTA:
+                self._delta.append((name, item_type, item_id))
+
+    def _ensure_index(self, app):
+        if self._index is None:
+            with self._build_lock:
+                if self._index is None:
+                    self.build()
+        if self._refresher is None and app is not None:
+            with self._build_lock:
+                if self._refresher is None:
+                    self._refresher = threading.Thread(target=self._refresh_loop, args=(app,), daemon=True)
+                    self._refresher.start()
+
+    def _refresh_loop(self, app):
+        while True:
+            time.sleep(REBUILD_SECONDS)
+            try:
+                with app.app_context():
+                    self.build()
+            except Exception as e:
+                print(f"Autocomplete rebuild failed: {e}")
+
+    def search(self, query, limit=AUTOCOMPLETE_LIMIT, app=None):
+        """
+        Up to `limit` {"name", "type", "id"} matches for the query prefix, most logged first.
+        """
+        prefix = _normalize(query)
+        if not prefix:
+            return []
+        self._ensure_index(app)
+
+        with self._lock:
+            index, delta = self._index, list(self._delta)
+
+        results = index.search(prefix, limit)
+        found = {(item[1], item[2]) for item, _ in results}
+        for name, item_type, item_id in delta:
+            if len(results) >= limit:
+                break
+            if (item_type, item_id) not in found and any(k.startswith(prefix) for k in _word_keys(_normalize(name))):
+                results.append(((name, item_type, item_id), 0.0))
+
+        return [{"name": name, "type": item_type, "id": item_id} for (name, item_type, item_id), _ in results]
+
+
+autocomplete = Autocomplete()
+
+
+# Inserts are only indexed once committed; a rolled-back insert never shows up.
+def _stage(target, item):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('autocomplete_added', []).append(item)
+
+@event.listens_for(Ingredient, 'after_insert')
+def _index_new_ingredient(mapper, connection, target):
+    _stage(target, (target.name, "food", target.id))
+
+@event.listens_for(Recipe, 'after_insert')
+def _index_new_recipe(mapper, connection, target):
+    _stage(target, (target.title, "recipe", target.id))
+
+@event.listens_for(Session, 'after_commit')
+def _index_committed(session):
+    for item in session.info.pop('autocomplete_added', ()):
+        autocomplete.add(*item)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_rolled_back(session, previous_transaction):
+    session.info.pop('autocomplete_added', None)
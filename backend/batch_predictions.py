@@ -0,0 +1,217 @@
+"""
+Nightly batch job that computes every user's goal prediction in one ordered pass over
+weight_log and stores it in goal_prediction, where /prediction can serve it directly.
+
+Instead of one pandas + sklearn fit per user, the job streams (user_id, date, weight) rows
+ordered by user and date, and reduces each chunk with np.add.reduceat over the user
+segments into the least-squares sums (n, Σx, Σy, Σxy, Σx²). The slope for every user is
+then one vectorized expression: (nΣxy − ΣxΣy) / (nΣx² − (Σx)²), which is exactly what
+LinearRegression computes for a single feature. Users whose rows straddle a chunk
+boundary are carried over to the next chunk.
+
+Usage:
+    python batch_predictions.py [--chunk-size 200000]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, insert
+
+from models import db, User, UserStats, WeightLog, GoalPrediction
+from services import PREDICTION_MESSAGES
+
+STREAM_CHUNK_SIZE = 200000
+INSERT_BATCH_SIZE = 10000
+SECONDS_PER_DAY = 86400
+
+SUM_FIELDS = 5  # n, Σx, Σy, Σxy, Σx²
+
+
+def _load_user_targets():
+    """
+    Sorted user ids with their data_version and latest stats weight / target weight
+    (NaN when the user has no stats).
+    """
+    users = db.session.execute(select(User.id, User.data_version).order_by(User.id)).all()
+    ids = np.array([u[0] for u in users], dtype=np.int64)
+    versions = np.array([u[1] for u in users], dtype=np.int64)
+    current = np.full(len(ids), np.nan)
+    goal = np.full(len(ids), np.nan)
+
+    # Ordered by updated_at, so later rows overwrite earlier ones: the latest stats win.
+    stats = db.session.execute(
+        select(UserStats.user_id, UserStats.weight, UserStats.target_weight)
+        .order_by(UserStats.updated_at.asc())
+        .execution_options(yield_per=STREAM_CHUNK_SIZE)
+    )
+    for chunk in stats.partitions():
+        user_ids = np.array([r[0] for r in chunk], dtype=np.int64)
+        idx = np.searchsorted(ids, user_ids)
+        current[idx] = [r[1] for r in chunk]
+        goal[idx] = [r[2] if r[2] else np.nan for r in chunk]
+
+    return ids, versions, current, goal
+
+def _segment_sums(users, seconds, weights, carry):
+    """
+    Reduce one chunk of rows (sorted by user, date) into per-user least-squares sums.
+
+    `carry` is (user_id, first_seconds, sums) for a user whose rows began in an earlier
+    chunk, or None. Returns (completed user ids, completed sums, new carry); the last user
+    of the chunk is never completed because their rows may continue in the next one.
+    """
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    lengths = np.diff(np.r_[starts, len(users)])
+    segment_users = users[starts]
+
+    first_seconds = seconds[starts].copy()
+    if carry is not None and segment_users[0] == carry[0]:
+        first_seconds[0] = carry[1]
+
+    # Same x as predict_goal_date: whole days since the user's first weigh-in.
+    x = np.floor((seconds - np.repeat(first_seconds, lengths)) / SECONDS_PER_DAY)
+    y = weights
+    columns = np.stack([np.ones_like(x), x, y, x * y, x * x])
+    sums = np.add.reduceat(columns, starts, axis=1).T
+
+    completed_users, completed_sums = segment_users, sums
+    if carry is not None:
+        if segment_users[0] == carry[0]:
+            sums[0] += carry[2]
+        else:
+            completed_users = np.r_[carry[0], completed_users]
+            completed_sums = np.vstack([carry[2], completed_sums])
+
+    new_carry = (segment_users[-1], first_seconds[-1], sums[-1].copy())
+    return completed_users[:-1], completed_sums[:-1], new_carry
+
+def _predict(sums, current, goal, today):
+    """
+    Vectorized version of predict_from_weight_history over many users' sums.
+    Returns a list of row dicts for goal_prediction (minus user_id/data_version).
+    """
+    n, sx, sy, sxy, sxx = sums.T
+    denominator = n * sxx - sx * sx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(denominator != 0, (n * sxy - sx * sy) / denominator, 0.0)
+        days_needed = np.abs((goal - current) / slope)
+
+    insufficient = (n < 2) | np.isnan(current) | np.isnan(goal) | (goal == 0)
+    stalled = ~insufficient & (slope == 0)
+    wrong_way = ~insufficient & ~stalled & (((goal < current) & (slope > 0)) | ((goal > current) & (slope < 0)))
+    success = ~insufficient & ~stalled & ~wrong_way & np.isfinite(days_needed)
+
+    status = np.full(len(n), 'insufficient_data', dtype=object)
+    status[stalled] = 'stalled'
+    status[wrong_way] = 'wrong_direction'
+    status[success] = 'success'
+
+    rows = []
+    for i in range(len(n)):
+        if success[i]:
+            rows.append({"status": "success", "days_needed": int(days_needed[i]),
+                         "predicted_date": today + timedelta(days=float(days_needed[i])),
+                         "slope": round(float(slope[i]), 2)})
+        else:
+            rows.append({"status": status[i], "days_needed": None, "predicted_date": None, "slope": None})
+    return rows
+
+def run_batch(chunk_size=STREAM_CHUNK_SIZE, progress=True):
+    """Recompute and store goal predictions for every user.
+
+    Returns:
+        int: The number of predictions written.
+    """
+    started = time.perf_counter()
+    today = datetime.utcnow().date()
+    user_ids, versions, current, goal = _load_user_targets()
+    seen = np.zeros(len(user_ids), dtype=bool)
+
+    GoalPrediction.query.delete()
+    pending, written, rows_read = [], 0, 0
+
+    def emit(completed_users, completed_sums):
+        nonlocal pending, written
+        if len(completed_users) == 0:
+            return
+        idx = np.searchsorted(user_ids, completed_users)
+        seen[idx] = True
+        for i, row in zip(idx, _predict(completed_sums, current[idx], goal[idx], today)):
+            pending.append({"user_id": int(user_ids[i]), "data_version": int(versions[i]), **row})
+        if len(pending) >= INSERT_BATCH_SIZE:
+            db.session.execute(insert(GoalPrediction.__table__), pending)
+            written += len(pending)
+            pending = []
+
+    logs = db.session.execute(
+        select(WeightLog.user_id, WeightLog.date, WeightLog.weight)
+        .order_by(WeightLog.user_id, WeightLog.date)
+        .execution_options(yield_per=chunk_size)
+    )
+    carry = None
+    for chunk in logs.partitions():
+        users = np.fromiter((r[0] for r in chunk), dtype=np.int64, count=len(chunk))
+        seconds = np.array([r[1] for r in chunk], dtype='datetime64[s]').astype(np.int64).astype(np.float64)
+        weights = np.fromiter((r[2] for r in chunk), dtype=np.float64, count=len(chunk))
+
+        completed_users, completed_sums, carry = _segment_sums(users, seconds, weights, carry)
+        emit(completed_users, completed_sums)
+
+        rows_read += len(chunk)
+        if progress:
+            print(f"  {rows_read} weight rows, {int(seen.sum())} users, "
+                  f"{time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    if carry is not None:
+        emit(np.array([carry[0]]), carry[2][None, :])
+
+    # Users without any weight log still get an (insufficient_data) row.
+    remaining = np.flatnonzero(~seen)
+    emit(user_ids[remaining], np.zeros((len(remaining), SUM_FIELDS)))
+
+    if pending:
+        db.session.execute(insert(GoalPrediction.__table__), pending)
+        written += len(pending)
+    db.session.commit()
+
+    if progress:
+        print(f"Wrote {written} predictions in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return written
+
+def stored_prediction(user_id):
+    """
+    The batch prediction for a user if it is still current (no writes to their data since
+    the batch ran), formatted like predict_goal_date; otherwise None.
+    """
+    row = db.session.query(GoalPrediction.status, GoalPrediction.days_needed, GoalPrediction.predicted_date,
+                           GoalPrediction.slope, GoalPrediction.data_version, User.data_version)\
+        .join(User, User.id == GoalPrediction.user_id)\
+        .filter(GoalPrediction.user_id == user_id).first()
+    if not row or row[4] != row[5]:
+        return None
+
+    status, days_needed, predicted_date, slope = row[:4]
+    if status != 'success':
+        return {"status": status, "message": PREDICTION_MESSAGES[status]}
+    return {
+        "status": "success",
+        "days_needed": days_needed,
+        "predicted_date": predicted_date.strftime("%B %d, %Y"),
+        "slope": slope
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Recompute all users' goal predictions.")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        run_batch(args.chunk_size, progress=not args.quiet)
@@ -0,0 +1,3 @@
+"""
+Reproducible performance benchmarks for the backend (run from backend/ with `python -m`).
+"""
@@ -0,0 +1,167 @@
+"""
+Scaling micro-benchmarks for the analytics paths.
+
+Creates one synthetic user per history size (10^2 .. 10^5 meal rows by default, with
+proportional weight history) and measures the wall time and peak Python memory
+(tracemalloc) of PandasAnalysis.ai_input, predict_goal_date, GET /meal-log, the dashboard
+and the CSV export for each. The log-log slope of time against history size is reported
+per path (1.0 = linear), and --max-exponent turns a superlinear path into a failing exit
+code so regressions show up in CI or before/after comparisons.
+
+Usage (from backend/):
+    python -m benchmarks.analytics [--sizes 100 1000 10000 100000] [--output bench-analytics.json]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+DEFAULT_REPEATS = 3
+
+
+def _paths(app):
+    from analysis import PandasAnalysis
+    from dashboard import build_dashboard
+    from export import generate_export
+    from services import predict_goal_date
+
+    client = app.test_client()
+
+    def meal_log(user_id):
+        response = client.get(f"/api/user/{user_id}/meal-log")
+        assert response.status_code == 200, response.status_code
+
+    def export_csv(user_id):
+        for _ in generate_export(user_id, 'csv'):
+            pass
+
+    return {
+        "pandas_analysis": lambda user_id: PandasAnalysis(user_id).ai_input(),
+        "predict_goal_date": predict_goal_date,
+        "get_meal_log": meal_log,
+        "dashboard": build_dashboard,
+        "export_csv": export_csv,
+    }
+
+def _measure(db, fn, user_id, repeats):
+    """
+    Best-of-`repeats` wall time, then one traced run for peak memory. The session is reset
+    before each run so nothing is served from the identity map.
+    """
+    times = []
+    for _ in range(repeats):
+        db.session.remove()
+        started = time.perf_counter()
+        fn(user_id)
+        times.append(time.perf_counter() - started)
+
+    db.session.remove()
+    tracemalloc.start()
+    try:
+        fn(user_id)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+def scaling_exponent(sizes, seconds):
+    """
+    Slope of log(time) over log(size), ignoring the smallest size (fixed overheads dominate it).
+    """
+    if len(sizes) > 2:
+        sizes, seconds = sizes[1:], seconds[1:]
+    if len(sizes) < 2:
+        return None
+    return round(float(np.polyfit(np.log(sizes), np.log(np.maximum(seconds, 1e-9)), 1)[0]), 2)
+
+def run_benchmarks(app, db, sizes=DEFAULT_SIZES, repeats=DEFAULT_REPEATS, seed=1):
+    """Generate one user per history size and measure every analytics path on each.
+
+    Returns:
+        dict: per-path list of {meals, seconds, peak_bytes} plus the scaling exponent.
+    """
+    from benchmarks.generate import (generate_catalogue, generate_users, generate_meals,
+                                     generate_weights, generate_stats)
+
+    rng = np.random.default_rng(seed)
+    span_seconds = 2 * 365 * 86400
+    start = datetime.utcnow() - timedelta(seconds=span_seconds)
+
+    names, macros = generate_catalogue(rng, 200)
+    users = {}
+    for size in sizes:
+        user_id = generate_users(rng, 1)
+        generate_meals(rng, user_id, size, names, macros, start, span_seconds, progress=False)
+        generate_weights(rng, user_id, max(2, size // 3), start, span_seconds)
+        generate_stats(rng, user_id, 3, start, span_seconds)
+        users[size] = int(user_id[0])
+
+    results = {}
+    for name, fn in _paths(app).items():
+        rows = []
+        for size in sizes:
+            seconds, peak = _measure(db, fn, users[size], repeats)
+            rows.append({"meals": size, "seconds": round(seconds, 5), "peak_bytes": peak})
+            print(f"  {name:<18} {size:>9} meals  {seconds * 1000:9.1f} ms  {peak / 1e6:8.1f} MB", file=sys.stderr)
+        results[name] = {
+            "runs": rows,
+            "time_exponent": scaling_exponent([r["meals"] for r in rows], [r["seconds"] for r in rows]),
+            "memory_exponent": scaling_exponent([r["meals"] for r in rows], [r["peak_bytes"] for r in rows]),
+        }
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time and peak-memory scaling of the analytics paths.")
+    parser.add_argument("--database-url", help="Defaults to a fresh SQLite file in a temp dir.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-exponent", type=float,
+                        help="Exit non-zero if any path's time exponent exceeds this (e.g. 1.3).")
+    parser.add_argument("--output", default="bench-analytics.json")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    from app import app
+    from models import db
+    from schema import upgrade_schema
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        results = run_benchmarks(app, db, sorted(args.sizes), args.repeats, args.seed)
+
+    report = {
+        "meta": {"started_at": datetime.now(timezone.utc).isoformat(), "sizes": sorted(args.sizes),
+                 "repeats": args.repeats, "database": os.environ["DATABASE_URL"].split(":", 1)[0]},
+        "paths": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'path':<20}{'time exp':>10}{'mem exp':>10}{'largest ms':>12}{'largest MB':>12}")
+    failed = []
+    for name, result in results.items():
+        largest = result["runs"][-1]
+        print(f"{name:<20}{result['time_exponent'] or 0:>10.2f}{result['memory_exponent'] or 0:>10.2f}"
+              f"{largest['seconds'] * 1000:>12.1f}{largest['peak_bytes'] / 1e6:>12.1f}")
+        if args.max_exponent and (result["time_exponent"] or 0) > args.max_exponent:
+            failed.append(name)
+    print(f"Report written to {args.output}", file=sys.stderr)
+
+    if failed:
+        print(f"Superlinear scaling (> {args.max_exponent}): {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Validates the gevent serving mode (gunicorn.conf.py) under many slow external calls.
+
+Starts gunicorn with ONE worker process against a seeded SQLite (default) or Postgres
+database and the local API stubs, with Gemini answering slowly. It then:
+
+1. probes the fast routes (autocomplete, meal log) alone for a latency baseline,
+2. sends --slow requests that each wait on Gemini (AI advice, plus new-food searches that
+   go USDA -> Gemini), arriving over --ramp seconds, and keeps probing the fast routes
+   until they have all finished.
+
+Passes when the stubs saw at least --min-in-flight of those calls outstanding at once and
+the fast routes' p99 while that many were outstanding stayed below --max-fast-p99-ms;
+exits non-zero otherwise. Latency during the ramp is reported too: that is when the slow
+requests' own CPU work runs, which no worker class can overlap.
+
+Usage (from backend/):
+    python -m benchmarks.concurrency [--slow 300] [--gemini-latency 10] [--worker-class gevent]
+"""
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import requests
+
+from benchmarks.load import FOODS, reset_database, seed_database
+from benchmarks.stubs import StubServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _percentiles(latencies):
+    values = np.array(latencies) * 1000
+    if not len(values):
+        return {"requests": 0}
+    return {
+        "requests": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+def start_server(env, port, worker_class, timeout=60):
+    """
+    Run gunicorn with the repo's config and a single worker; returns once it answers.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", "1",
+         "--worker-class", worker_class, "--bind", f"127.0.0.1:{port}", "app:app"],
+        cwd=BACKEND_DIR, env={**os.environ, **env, "GUNICORN_WORKER_CLASS": worker_class},
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+def probe_fast_routes(base_url, user_ids, until, rng, stub):
+    """
+    Sequential requests to the fast routes until `until()` is true. Returns one
+    (latency, ok, external calls in flight when it was sent) tuple per request.
+    """
+    samples = []
+    http = requests.Session()
+    while not until():
+        if rng.random() < 0.5:
+            path = f"/api/food/autocomplete?q={rng.choice(FOODS)[:2]}"
+        else:
+            path = f"/api/user/{rng.choice(user_ids)}/meal-log"
+        in_flight = stub.in_flight
+        started = time.perf_counter()
+        try:
+            ok = http.get(base_url + path, timeout=30).status_code == 200
+        except requests.RequestException:
+            ok = False
+        samples.append((time.perf_counter() - started, ok, in_flight))
+        time.sleep(0.02)
+    return samples
+
+def _fast_stats(samples):
+    return {**_percentiles([s[0] for s in samples]), "errors": sum(not s[1] for s in samples)}
+
+def run_validation(base_url, stub, user_ids, slow=300, ramp=5.0, min_in_flight=270, baseline_seconds=3, seed=1):
+    """Measure the fast routes alone, then while `slow` Gemini-bound requests are in flight.
+
+    The slow requests arrive evenly over `ramp` seconds. Their own CPU work (analysis,
+    parsing) competes with the fast routes while they arrive; what this validates is the
+    steady state after that, with `min_in_flight` or more external calls outstanding.
+
+    Returns:
+        dict: fast-route latency at baseline, during the ramp and at steady state, slow
+        request stats and the peak number of concurrent external calls the stubs saw.
+    """
+    rng = random.Random(seed)
+    started = time.monotonic()
+    baseline = probe_fast_routes(base_url, user_ids, lambda: time.monotonic() - started > baseline_seconds,
+                                 rng, stub)
+
+    slow_latencies, slow_errors = [], []
+    lock = threading.Lock()
+
+    def slow_request(index, delay):
+        time.sleep(delay)
+        user_id = user_ids[index % len(user_ids)]
+        began = time.perf_counter()
+        try:
+            if index % 3 == 2:
+                response = requests.get(f"{base_url}/api/food/search/concurrency food {seed}x{index}/{user_id}",
+                                        timeout=120)
+            else:
+                response = requests.post(f"{base_url}/api/ai/advice", json={"user_id": user_id}, timeout=120)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        with lock:
+            slow_latencies.append(time.perf_counter() - began)
+            if not ok:
+                slow_errors.append(index)
+
+    stub.peak_in_flight = 0
+    threads = [threading.Thread(target=slow_request, args=(i, ramp * i / slow), daemon=True) for i in range(slow)]
+    for thread in threads:
+        thread.start()
+    under_load = probe_fast_routes(base_url, user_ids, lambda: not any(t.is_alive() for t in threads), rng, stub)
+    for thread in threads:
+        thread.join()
+
+    return {
+        "fast_baseline": _fast_stats(baseline),
+        "fast_during_ramp": _fast_stats([s for s in under_load if s[2] < min_in_flight]),
+        "fast_steady_state": _fast_stats([s for s in under_load if s[2] >= min_in_flight]),
+        "slow": {**_percentiles(slow_latencies), "errors": len(slow_errors)},
+        "peak_in_flight_external_calls": stub.peak_in_flight,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Concurrent slow external calls vs fast-route latency.")
+    parser.add_argument("--database-url", help="Defaults to a fresh SQLite file in a temp dir.")
+    parser.add_argument("--reset", action="store_true", help="Drop the tables of a --database-url that holds data.")
+    parser.add_argument("--slow", type=int, default=300, help="Gemini-bound requests to keep in flight.")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which the slow requests arrive.")
+    parser.add_argument("--gemini-latency", type=float, default=10.0)
+    parser.add_argument("--worker-class", default="gevent")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--min-in-flight", type=int, help="Defaults to 90%% of --slow.")
+    parser.add_argument("--max-fast-p99-ms", type=float, default=250)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench-concurrency.json")
+    args = parser.parse_args()
+
+    stub = StubServer(latency={"gemini": args.gemini_latency}).start()
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.update(stub.env())
+    os.environ["DATABASE_URL"] = database_url
+
+    from app import app
+    from models import db
+
+    with app.app_context():
+        reset_database(db, args.reset)
+        user_ids = seed_database(db, args.users, 100, rng=random.Random(args.seed))
+        db.engine.dispose()
+
+    min_in_flight = args.min_in_flight or int(args.slow * 0.9)
+    port = _free_port()
+    print(f"Starting gunicorn ({args.worker_class}, 1 worker) on port {port}...", file=sys.stderr)
+    server = start_server(stub.env(), port, args.worker_class)
+    try:
+        result = run_validation(f"http://127.0.0.1:{port}", stub, user_ids, args.slow, args.ramp,
+                                min_in_flight, seed=args.seed)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        stub.stop()
+
+    checks = {
+        "in_flight": result["peak_in_flight_external_calls"] >= min_in_flight,
+        "fast_p99": result["fast_steady_state"].get("p99_ms", float("inf")) <= args.max_fast_p99_ms,
+        "no_errors": not (result["slow"]["errors"] or result["fast_during_ramp"]["errors"]
+                          or result["fast_steady_state"]["errors"]),
+    }
+    report = {
+        "meta": {"started_at": datetime.now(timezone.utc).isoformat(), "worker_class": args.worker_class,
+                 "slow": args.slow, "ramp_s": args.ramp, "gemini_latency_s": args.gemini_latency,
+                 "database": database_url.split(":", 1)[0]},
+        **result,
+        "checks": checks,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps({k: v for k, v in report.items() if k != "meta"}, indent=2))
+    print(f"Report written to {args.output}", file=sys.stderr)
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Synthetic large-history dataset generator.
+
+Populates users, multi-year MealLog / WeightLog / UserStats histories and an ingredient
+catalogue at configurable scale (10^8 meal rows is a supported target on PostgreSQL).
+Rows are generated a chunk at a time with NumPy and loaded with COPY on PostgreSQL or a
+raw executemany elsewhere, so memory stays flat regardless of the total size. The
+bookkeeping the ORM hooks in models.py keep for every write is filled in as well: each meal
+gets its user's next change_seq, users end with the matching meal_log_seq, and every
+generator bumps the data_version of the users it wrote for.
+
+Usage (from backend/, against DATABASE_URL):
+    python -m benchmarks.generate --users 10000 --meals 100000000 --years 3
+"""
+import io
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import bindparam, func, insert, update
+
+from models import db, User, UserStats, MealLog, WeightLog, Ingredient, bump_data_version
+
+GENERATE_CHUNK_SIZE = 200000
+BASE_FOODS = [
+    "Injera", "Shiro Wat", "Doro Wat", "Misir Wat", "Kitfo", "Gomen", "Tibs", "Firfir",
+    "Atakilt Wat", "Kik Alicha", "Genfo", "Chechebsa", "Ayib", "Teff Porridge", "Dulet",
+]
+ACTIVITY_LEVELS = np.array(["sedentary", "light", "moderate", "active", "very_active"])
+
+MEAL_COLUMNS = ("user_id", "meal_name", "calories", "protein", "carbs", "fats", "amount", "date", "change_seq")
+WEIGHT_COLUMNS = ("user_id", "weight", "date")
+STATS_COLUMNS = ("user_id", "age", "gender", "height", "weight", "bmi", "target_weight",
+                 "activity_level", "calorie_target", "updated_at")
+
+
+def _bulk_load(table, columns, rows):
+    """
+    Load a list of tuples: COPY on PostgreSQL, a raw executemany elsewhere.
+    """
+    if not rows:
+        return
+    connection = db.session.connection()
+    if db.engine.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join("\\N" if v is None else str(v) for v in row))
+            buffer.write("\n")
+        buffer.seek(0)
+        with connection.connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    else:
+        placeholders = ", ".join("?" for _ in columns)
+        connection.exec_driver_sql(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+def _datetime_strings(start, seconds):
+    # "YYYY-MM-DD HH:MM:SS", the form both SQLite (as stored by SQLAlchemy) and COPY accept.
+    stamps = np.datetime64(start, 's') + seconds.astype('timedelta64[s]')
+    return np.char.replace(np.datetime_as_string(stamps), 'T', ' ')
+
+def _user_chunks(user_ids):
+    for i in range(0, len(user_ids), GENERATE_CHUNK_SIZE):
+        yield [int(u) for u in user_ids[i:i + GENERATE_CHUNK_SIZE]]
+
+def _bump_versions(user_ids):
+    for chunk in _user_chunks(user_ids):
+        bump_data_version(db.session, chunk)
+    db.session.commit()
+
+def _timestamps(rng, start, span_seconds, size):
+    return _datetime_strings(start, rng.integers(0, span_seconds, size))
+
+def generate_catalogue(rng, size):
+    """
+    Ingredients: the base Ethiopian foods plus numbered synthetic ones. Returns the names
+    and a (n, 4) calories/protein/carbs/fats matrix.
+    """
+    existing = {name for (name,) in db.session.query(Ingredient.name)}
+    names = [n for n in BASE_FOODS if n not in existing]
+    synthetic = (f"Synthetic Food {i:07d}" for i in range(size))
+    names += [n for n in synthetic if n not in existing][:max(size - len(names), 0)]
+
+    macros = np.column_stack([
+        rng.uniform(40, 600, len(names)), rng.uniform(0, 40, len(names)),
+        rng.uniform(0, 90, len(names)), rng.uniform(0, 35, len(names)),
+    ]).round(1)
+    for start in range(0, len(names), GENERATE_CHUNK_SIZE):
+        db.session.execute(insert(Ingredient.__table__), [
+            {"name": name, "calories_per_unit": m[0], "protein_per_unit": m[1],
+             "carbs_per_unit": m[2], "fats_per_unit": m[3]}
+            for name, m in zip(names[start:start + GENERATE_CHUNK_SIZE], macros[start:start + GENERATE_CHUNK_SIZE])
+        ])
+    db.session.commit()
+
+    rows = db.session.query(Ingredient.name, Ingredient.calories_per_unit, Ingredient.protein_per_unit,
+                            Ingredient.carbs_per_unit, Ingredient.fats_per_unit).all()
+    return [r[0] for r in rows], np.array([[v or 0 for v in r[1:]] for r in rows], dtype=np.float64)
+
+def generate_users(rng, count):
+    """
+    Insert `count` users and return their ids.
+    """
+    offset = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    for start in range(0, count, GENERATE_CHUNK_SIZE):
+        db.session.execute(insert(User.__table__), [
+            {"username": f"synthetic{offset + i}", "email": f"synthetic{offset + i}@example.com",
+             "data_version": 0, "meal_log_seq": 0}
+            for i in range(start, min(start + GENERATE_CHUNK_SIZE, count))
+        ])
+    db.session.commit()
+    return np.array([r[0] for r in db.session.query(User.id).filter(User.id >= offset).order_by(User.id)],
+                    dtype=np.int64)
+
+def generate_meals(rng, user_ids, total, names, macros, start, span_seconds, progress=True):
+    """
+    `total` meal rows spread uniformly over the users and the time span, streamed in chunks.
+    Change sequence numbers continue each user's meal_log_seq, in insertion order.
+    """
+    names = np.array(names, dtype=object)
+    seqs = np.zeros(len(user_ids), dtype=np.int64)
+    for chunk in _user_chunks(user_ids):
+        current = dict(db.session.query(User.id, User.meal_log_seq).filter(User.id.in_(chunk)))
+        seqs[np.searchsorted(user_ids, chunk)] = [current[u] or 0 for u in chunk]
+
+    written, started = 0, time.perf_counter()
+    while written < total:
+        size = min(GENERATE_CHUNK_SIZE, total - written)
+        positions = rng.integers(0, len(user_ids), size)
+        users = user_ids[positions]
+        # Rank of each row among the chunk's rows of the same user, in chunk order.
+        order = np.argsort(positions, kind="stable")
+        sorted_positions = positions[order]
+        group_start = np.searchsorted(sorted_positions, sorted_positions)
+        rank = np.empty(size, dtype=np.int64)
+        rank[order] = np.arange(size) - group_start
+        change_seqs = seqs[positions] + rank + 1
+        seqs += np.bincount(positions, minlength=len(user_ids))
+        foods = rng.integers(0, len(names), size)
+        portions = rng.choice([0.5, 1, 1, 1, 1.5, 2], size)
+        chunk_macros = (macros[foods] * portions[:, None]).round(1)
+        dates = _timestamps(rng, start, span_seconds, size)
+
+        _bulk_load(MealLog.__tablename__, MEAL_COLUMNS, list(zip(
+            users.tolist(), names[foods].tolist(), chunk_macros[:, 0].astype(np.int64).tolist(),
+            chunk_macros[:, 1].tolist(), chunk_macros[:, 2].tolist(), chunk_macros[:, 3].tolist(),
+            portions.tolist(), dates.tolist(), change_seqs.tolist()
+        )))
+        db.session.commit()
+        written += size
+        if progress:
+            elapsed = time.perf_counter() - started
+            print(f"  meals {written}/{total} ({written / elapsed:,.0f} rows/s)", file=sys.stderr)
+
+    for chunk in _user_chunks(user_ids):
+        db.session.execute(
+            update(User.__table__).where(User.__table__.c.id == bindparam("uid")).values(meal_log_seq=bindparam("seq")),
+            [{"uid": u, "seq": int(seqs[i])} for i, u in zip(np.searchsorted(user_ids, chunk), chunk)]
+        )
+    _bump_versions(user_ids)
+    return written
+
+def generate_weights(rng, user_ids, per_user, start, span_seconds):
+    """
+    A noisy downward/upward trend per user, `per_user` weigh-ins evenly over the span.
+    """
+    written = 0
+    users_per_chunk = max(1, GENERATE_CHUNK_SIZE // max(per_user, 1))
+    steps = np.linspace(0, span_seconds, per_user, endpoint=False).astype(np.int64)
+    for i in range(0, len(user_ids), users_per_chunk):
+        users = user_ids[i:i + users_per_chunk]
+        base = rng.uniform(55, 120, len(users))
+        trend = rng.uniform(-0.02, 0.01, len(users))
+        weights = (base[:, None] + trend[:, None] * (steps[None, :] / 86400)
+                   + rng.normal(0, 0.4, (len(users), per_user))).round(1)
+        dates = _datetime_strings(start, steps)
+
+        _bulk_load(WeightLog.__tablename__, WEIGHT_COLUMNS, list(zip(
+            np.repeat(users, per_user).tolist(), weights.ravel().tolist(), np.tile(dates, len(users)).tolist()
+        )))
+        db.session.commit()
+        written += weights.size
+    _bump_versions(user_ids)
+    return written
+
+def generate_stats(rng, user_ids, per_user, start, span_seconds):
+    n = len(user_ids) * per_user
+    users = np.repeat(user_ids, per_user)
+    height = rng.uniform(150, 195, n).round(1)
+    weight = rng.uniform(55, 120, n).round(1)
+    target = (weight + rng.choice([-10, -5, 0, 5], n)).round(1)
+    for i in range(0, n, GENERATE_CHUNK_SIZE):
+        part = slice(i, i + GENERATE_CHUNK_SIZE)
+        size = len(users[part])
+        _bulk_load(UserStats.__tablename__, STATS_COLUMNS, list(zip(
+            users[part].tolist(), rng.integers(18, 75, size).tolist(),
+            rng.choice(["male", "female"], size).tolist(), height[part].tolist(), weight[part].tolist(),
+            (weight[part] / (height[part] / 100) ** 2).round(2).tolist(), target[part].tolist(),
+            rng.choice(ACTIVITY_LEVELS, size).tolist(), rng.integers(1500, 3200, size).tolist(),
+            _timestamps(rng, start, span_seconds, size).tolist()
+        )))
+        db.session.commit()
+    _bump_versions(user_ids)
+    return n
+
+def generate_dataset(users=100, meals=100000, years=2, weights_per_user=None, stats_per_user=3,
+                     ingredients=1000, seed=1, progress=True):
+    """Populate the database with a synthetic history.
+
+    Args:
+        users: Number of users to create.
+        meals: Total meal log rows, spread over the users.
+        years: Length of the history, ending now.
+        weights_per_user: Weigh-ins per user (defaults to one every three days).
+        stats_per_user: UserStats rows per user.
+        ingredients: Size of the ingredient catalogue.
+        seed: RNG seed, so datasets are reproducible.
+
+    Returns:
+        dict: the created user ids and row counts per table.
+    """
+    rng = np.random.default_rng(seed)
+    span_seconds = int(years * 365 * 86400)
+    start = datetime.utcnow() - timedelta(seconds=span_seconds)
+    if weights_per_user is None:
+        weights_per_user = max(2, int(years * 365 / 3))
+
+    names, macros = generate_catalogue(rng, ingredients)
+    user_ids = generate_users(rng, users)
+    counts = {
+        "meal_log": generate_meals(rng, user_ids, meals, names, macros, start, span_seconds, progress),
+        "weight_log": generate_weights(rng, user_ids, weights_per_user, start, span_seconds),
+        "user_stats": generate_stats(rng, user_ids, stats_per_user, start, span_seconds),
+    }
+    return {"user_ids": user_ids, "counts": counts}
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import app
+    from schema import upgrade_schema
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic nutrition history dataset.")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--meals", type=int, default=100000, help="Total meal log rows.")
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--weights-per-user", type=int)
+    parser.add_argument("--stats-per-user", type=int, default=3)
+    parser.add_argument("--ingredients", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        started = time.perf_counter()
+        result = generate_dataset(args.users, args.meals, args.years, args.weights_per_user,
+                                  args.stats_per_user, args.ingredients, args.seed)
+        print(f"Generated {result['counts']} for {len(result['user_ids'])} users "
+              f"in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,377 @@
+"""
+End-to-end HTTP load benchmark.
+
+Boots the Flask app on a local port against a freshly seeded SQLite (default) or Postgres
+database, with USDA / Spoonacular / Gemini / Google served by the local stubs in
+benchmarks/stubs.py, then drives a weighted mix of realistic requests from concurrent
+clients. Per-endpoint request counts, errors, throughput and p50/p95/p99 latency are
+written to a JSON report so runs can be compared over time.
+
+Usage (from backend/):
+    python -m benchmarks.load [--duration 30] [--concurrency 16] [--output bench-load.json]
+    python -m benchmarks.load --database-url postgresql://... --reset --compare previous.json
+
+The database is dropped and recreated before seeding. A --database-url that already holds
+data is refused unless --reset is passed.
+"""
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import requests
+
+from benchmarks.stubs import StubServer, USDA_MISS_PREFIX
+
+FOODS = [
+    "Injera", "Shiro Wat", "Doro Wat", "Misir Wat", "Kitfo", "Gomen", "Tibs", "Firfir",
+    "Atakilt Wat", "Kik Alicha", "Genfo", "Chechebsa", "Ayib", "Teff Porridge", "Dulet",
+    "Chicken Breast", "Brown Rice", "Banana", "Lentil Soup", "Greek Yogurt",
+]
+ACTIVITY_LEVELS = ["sedentary", "light", "moderate", "active", "very_active"]
+
+# (scenario, relative weight); the mix roughly follows what the app does on each screen.
+TRAFFIC_MIX = [
+    ("dashboard", 20),
+    ("meal_log", 15),
+    ("meal_log_changes", 10),
+    ("log_meal", 15),
+    ("autocomplete", 10),
+    ("search_food_cached", 8),
+    ("search_food_new", 4),
+    ("search_food_miss", 2),
+    ("prediction", 5),
+    ("suggestions", 4),
+    ("recipes_search", 3),
+    ("ai_advice", 2),
+    ("google_auth", 2),
+]
+
+
+def reset_database(db, reset=False):
+    """
+    Drop and recreate every table for a benchmark run. Exits instead when the database
+    already holds rows and `reset` (--reset) wasn't given, so a mistyped --database-url
+    can't wipe real data. Needs an app context.
+    """
+    from sqlalchemy import inspect, select
+    from schema import upgrade_schema
+
+    if not reset:
+        existing = set(inspect(db.engine).get_table_names())
+        for table in db.metadata.sorted_tables:
+            if table.name in existing and db.session.execute(select(1).select_from(table).limit(1)).first():
+                sys.exit(f"{db.engine.url.render_as_string(hide_password=True)} is not empty (table {table.name} "
+                         f"has rows); pass --reset to drop all its tables.")
+        db.session.rollback()
+    db.drop_all()
+    db.create_all()
+    upgrade_schema()
+
+def seed_database(db, users=50, meals_per_user=200, weights_per_user=60, rng=None):
+    """
+    Bulk-load users with stats, meal history, weight history and an ingredient catalogue.
+    Returns the seeded user ids.
+    """
+    from sqlalchemy import insert
+    from models import User, UserStats, MealLog, WeightLog, Ingredient
+
+    rng = rng or random.Random(1)
+    now = datetime.utcnow()
+
+    db.session.execute(insert(Ingredient.__table__), [
+        {"name": name, "calories_per_unit": rng.uniform(50, 500), "protein_per_unit": rng.uniform(0, 30),
+         "carbs_per_unit": rng.uniform(0, 60), "fats_per_unit": rng.uniform(0, 25)}
+        for name in FOODS
+    ])
+    db.session.execute(insert(User.__table__), [
+        {"username": f"bench{i}", "email": f"bench{i}@example.com", "data_version": 0, "meal_log_seq": 0}
+        for i in range(users)
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+
+    stats, meals, weights = [], [], []
+    for user_id in user_ids:
+        weight = rng.uniform(55, 110)
+        stats.append({
+            "user_id": user_id, "age": rng.randint(18, 70), "gender": rng.choice(["male", "female"]),
+            "height": rng.uniform(150, 195), "weight": weight, "bmi": 24.0,
+            "target_weight": weight + rng.choice([-10, -5, 5]),
+            "activity_level": rng.choice(ACTIVITY_LEVELS), "calorie_target": rng.randint(1600, 3000),
+            "updated_at": now,
+        })
+        for _ in range(meals_per_user):
+            food = rng.choice(FOODS)
+            meals.append({
+                "user_id": user_id, "meal_name": food, "calories": rng.randint(80, 900),
+                "protein": rng.uniform(0, 40), "carbs": rng.uniform(0, 90), "fats": rng.uniform(0, 35),
+                "amount": 1, "date": now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+            })
+        for day in range(weights_per_user):
+            weight -= rng.uniform(-0.2, 0.3)
+            weights.append({"user_id": user_id, "weight": round(weight, 1),
+                            "date": now - timedelta(days=weights_per_user - day)})
+
+    db.session.execute(insert(UserStats.__table__), stats)
+    for start in range(0, len(meals), 10000):
+        db.session.execute(insert(MealLog.__table__), meals[start:start + 10000])
+    db.session.execute(insert(WeightLog.__table__), weights)
+    db.session.commit()
+    return user_ids
+
+
+class Client:
+    """
+    One simulated user session: picks scenarios from TRAFFIC_MIX and times each request.
+    """
+    def __init__(self, base_url, stub, user_ids, rng, record):
+        self.base_url = base_url
+        self.stub = stub
+        self.user_ids = user_ids
+        self.rng = rng
+        self.record = record
+        self.http = requests.Session()
+        self.seqs = {}
+        names, weights = zip(*TRAFFIC_MIX)
+        self.scenarios = [getattr(self, name) for name in names]
+        self.weights = weights
+
+    def _call(self, name, method, path, expect=200, **kwargs):
+        """
+        Issue one request; it only counts as a success when it answers with `expect`.
+        """
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=60, **kwargs)
+            ok = response.status_code == expect
+        except requests.RequestException:
+            response, ok = None, False
+        self.record(name, time.perf_counter() - started, ok)
+        return response
+
+    def step(self):
+        self.rng.choices(self.scenarios, weights=self.weights)[0](self.rng.choice(self.user_ids))
+
+    def dashboard(self, user_id):
+        self._call("dashboard", "GET", f"/api/user/{user_id}/dashboard")
+
+    def meal_log(self, user_id):
+        self._call("meal_log", "GET", f"/api/user/{user_id}/meal-log")
+
+    def meal_log_changes(self, user_id):
+        response = self._call("meal_log_changes", "GET",
+                              f"/api/user/{user_id}/meal-log/changes?since={self.seqs.get(user_id, 0)}")
+        if response is not None and response.ok:
+            self.seqs[user_id] = response.json()["seq"]
+
+    def log_meal(self, user_id):
+        self._call("log_meal", "POST", f"/api/user/{user_id}/meal-log", expect=201, json={
+            "food_name": self.rng.choice(FOODS), "calories": self.rng.randint(80, 900),
+            "protein": 10, "carbs": 30, "fats": 8,
+        })
+
+    def autocomplete(self, user_id):
+        food = self.rng.choice(FOODS)
+        self._call("autocomplete", "GET", f"/api/food/autocomplete?q={food[:self.rng.randint(1, 4)]}")
+
+    def search_food_cached(self, user_id):
+        self._call("search_food_cached", "GET", f"/api/food/search/{self.rng.choice(FOODS)}/{user_id}")
+
+    def search_food_new(self, user_id):
+        query = f"bench food {self.rng.getrandbits(48):x}"
+        self._call("search_food_new", "GET", f"/api/food/search/{query}/{user_id}")
+
+    def search_food_miss(self, user_id):
+        query = f"{USDA_MISS_PREFIX}{self.rng.getrandbits(32):x}"
+        self._call("search_food_miss", "GET", f"/api/food/search/{query}/{user_id}", expect=404)
+
+    def prediction(self, user_id):
+        self._call("prediction", "GET", f"/api/user/{user_id}/prediction")
+
+    def suggestions(self, user_id):
+        self._call("suggestions", "GET", f"/api/user/{user_id}/suggestions")
+
+    def recipes_search(self, user_id):
+        self._call("recipes_search", "GET", f"/api/recipes/search?query={self.rng.choice(FOODS)}")
+
+    def ai_advice(self, user_id):
+        self._call("ai_advice", "POST", "/api/ai/advice", json={"user_id": user_id})
+
+    def google_auth(self, user_id):
+        token = self.stub.mint_id_token(f"google-{user_id}", f"bench{user_id - 1}@example.com")
+        self._call("google_auth", "POST", "/api/auth/google", json={"token": token})
+
+
+def _summarize(latencies, errors, elapsed):
+    values = np.array(latencies) * 1000
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2),
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_load(base_url, stub, user_ids, duration=30, warmup=5, concurrency=16, seed=1):
+    """Drive the traffic mix against a running server.
+
+    Args:
+        base_url: Root URL of the app under test.
+        stub: The StubServer the app was configured with (used to mint Google tokens).
+        user_ids: Seeded users to act as.
+        duration: Measured seconds.
+        warmup: Seconds of traffic before measuring starts (not recorded).
+        concurrency: Number of concurrent clients.
+        seed: Seed for the clients' random choices.
+
+    Returns:
+        dict: per-endpoint and overall statistics.
+    """
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    measuring = threading.Event()
+    stop = threading.Event()
+
+    def record(name, latency, ok):
+        if not measuring.is_set():
+            return
+        with lock:
+            samples[name].append(latency)
+            if not ok:
+                errors[name] += 1
+
+    def worker(index):
+        client = Client(base_url, stub, user_ids, random.Random(seed * 1000 + index), record)
+        while not stop.is_set():
+            client.step()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(warmup)
+    measuring.set()
+    started = time.perf_counter()
+    time.sleep(duration)
+    measuring.clear()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    endpoints = {name: _summarize(samples[name], errors[name], elapsed) for name in sorted(samples)}
+    everything = [latency for values in samples.values() for latency in values]
+    return {
+        "endpoints": endpoints,
+        "total": _summarize(everything, sum(errors.values()), elapsed) if everything else {},
+    }
+
+def compare(report, previous):
+    """
+    Print p50/p95/p99 deltas against an earlier report.
+    """
+    print(f"{'endpoint':<22}{'p50 ms':>16}{'p95 ms':>16}{'p99 ms':>16}")
+    for name, stats in report["endpoints"].items():
+        before = previous.get("endpoints", {}).get(name)
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if before:
+                cells.append(f"{stats[key]:.1f} ({stats[key] - before[key]:+.1f})")
+            else:
+                cells.append(f"{stats[key]:.1f}")
+        print(f"{name:<22}" + "".join(f"{cell:>16}" for cell in cells))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="HTTP load benchmark with stubbed external APIs.")
+    parser.add_argument("--database-url", help="Defaults to a fresh SQLite file in a temp dir.")
+    parser.add_argument("--reset", action="store_true", help="Drop the tables of a --database-url that holds data.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--meals-per-user", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", action="append", default=[], metavar="SERVICE=SECONDS",
+                        help="Stub latency override, e.g. --latency gemini=0.2 (usda, spoonacular, gemini, google).")
+    parser.add_argument("--output", default="bench-load.json")
+    parser.add_argument("--compare", help="Earlier report to print latency deltas against.")
+    args = parser.parse_args()
+
+    latency = {service: float(seconds) for service, seconds in (item.split("=", 1) for item in args.latency)}
+    stub = StubServer(latency=latency).start()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.update(stub.env())
+    os.environ["DATABASE_URL"] = database_url
+
+    # Imported only now: services.py / ai.py read the stub endpoints at import time.
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from app import app
+    from models import db
+
+    with app.app_context():
+        reset_database(db, args.reset)
+        print(f"Seeding {args.users} users x {args.meals_per_user} meals...", file=sys.stderr)
+        user_ids = seed_database(db, args.users, args.meals_per_user, rng=random.Random(args.seed))
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"Running {args.duration:.0f}s at concurrency {args.concurrency} against {base_url}...", file=sys.stderr)
+    result = run_load(base_url, stub, user_ids, args.duration, args.warmup, args.concurrency, args.seed)
+    server.shutdown()
+    stub.stop()
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "database": database_url.split(":", 1)[0],
+            "users": args.users, "meals_per_user": args.meals_per_user,
+            "duration_s": args.duration, "concurrency": args.concurrency, "seed": args.seed,
+            "stub_latency_s": stub.latency,
+        },
+        **result,
+        "stub_calls": stub.calls,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    else:
+        compare(report, {})
+    print(f"Report written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
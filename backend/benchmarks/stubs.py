@@ -0,0 +1,249 @@
+"""
+Local stand-ins for the external APIs the backend calls: USDA FoodData Central,
+Spoonacular, Gemini (REST transport) and Google's ID-token signing certificates.
+
+One threaded HTTP server answers all four, each service with its own artificial latency,
+so load runs measure our code rather than third-party networks and stay reproducible.
+`StubServer.env()` gives the environment that points services.py / ai.py at it; it must
+be applied before `app` is imported.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+DEFAULT_LATENCY = {"usda": 0.08, "spoonacular": 0.15, "gemini": 0.8, "google": 0.03}
+GOOGLE_CLIENT_ID = "bench-client.apps.googleusercontent.com"
+KEY_ID = "bench-key"
+
+# USDA queries starting with this prefix return no foods (exercises the local fallbacks).
+USDA_MISS_PREFIX = "zz"
+
+
+def _stable_number(text, low, high):
+    digest = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+    return round(low + (high - low) * digest / 0xFFFFFFFF, 1)
+
+def _food_macros(name):
+    return {
+        "calories": _stable_number(name + "kcal", 50, 600),
+        "protein": _stable_number(name + "p", 0, 40),
+        "carbs": _stable_number(name + "c", 0, 80),
+        "fats": _stable_number(name + "f", 0, 30),
+    }
+
+def _usda_search(query):
+    query = query.get("query", [""])[0]
+    if query.lower().startswith(USDA_MISS_PREFIX):
+        return {"foods": []}
+    macros = _food_macros(query.lower())
+    return {"foods": [{
+        "description": query.title(),
+        "foodNutrients": [
+            {"nutrientId": 1008, "value": macros["calories"]},
+            {"nutrientId": 1003, "value": macros["protein"]},
+            {"nutrientId": 1005, "value": macros["carbs"]},
+            {"nutrientId": 1004, "value": macros["fats"]},
+        ],
+    }]}
+
+def _spoonacular_recipe(recipe_id, title):
+    macros = _food_macros(title)
+    return {
+        "id": recipe_id, "title": title, "image": None, "servings": 2, "readyInMinutes": 30,
+        "nutrition": {"nutrients": [
+            {"name": "Calories", "amount": macros["calories"]},
+            {"name": "Protein", "amount": macros["protein"]},
+            {"name": "Carbohydrates", "amount": macros["carbs"]},
+            {"name": "Fat", "amount": macros["fats"]},
+        ]},
+        "extendedIngredients": [
+            {"name": "onion", "original": "1 onion", "amount": 1, "unit": ""},
+            {"name": "berbere", "original": "2 tbsp berbere", "amount": 2, "unit": "tbsp"},
+        ],
+        "analyzedInstructions": [{"steps": [{"step": "Chop."}, {"step": "Simmer."}]}],
+    }
+
+def _spoonacular(path, query):
+    match = re.match(r"/recipes/(\d+)/information", path)
+    if match:
+        recipe_id = int(match.group(1))
+        return _spoonacular_recipe(recipe_id, f"Recipe {recipe_id}")
+    term = query.get("query", ["dish"])[0]
+    number = int(query.get("number", ["12"])[0])
+    return {"results": [_spoonacular_recipe(1000 + i, f"{term.title()} {i}") for i in range(number)]}
+
+# One reply that satisfies both the recipe prompt (services.py) and the advice prompt (ai.py).
+GEMINI_TEXT = json.dumps({
+    "description": "A quick stub recipe.",
+    "ingredients": ["1 cup lentils", "1 onion"],
+    "instructions": ["Cook the onion.", "Add lentils and simmer."],
+    "prepTime": "10 min", "cookTime": "20 min",
+    "analysis": "Balanced day so far.",
+    "suggestion": "Add a portion of vegetables at dinner.",
+    "encouragement": "Keep it up!",
+    "answer_to_question": None,
+})
+
+def _gemini():
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": GEMINI_TEXT}], "role": "model"},
+            "finishReason": "STOP", "index": 0,
+        }],
+        "usageMetadata": {"promptTokenCount": 100, "candidatesTokenCount": 80, "totalTokenCount": 180},
+    }
+
+
+class _SigningKey:
+    """
+    RSA key plus self-signed certificate in the {kid: PEM} format google-auth fetches.
+    """
+    def __init__(self):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench")])
+        now = datetime.now(timezone.utc)
+        cert = x509.CertificateBuilder().subject_name(name).issuer_name(name)\
+            .public_key(key.public_key()).serial_number(x509.random_serial_number())\
+            .not_valid_before(now - timedelta(days=1)).not_valid_after(now + timedelta(days=30))\
+            .sign(key, hashes.SHA256())
+
+        self.certs = {KEY_ID: cert.public_bytes(serialization.Encoding.PEM).decode()}
+        private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                        serialization.NoEncryption())
+        self.signer = crypt.RSASigner.from_string(private_pem, key_id=KEY_ID)
+
+    def mint(self, sub, email, name):
+        now = int(time.time())
+        return jwt.encode(self.signer, {
+            "iss": "https://accounts.google.com", "aud": GOOGLE_CLIENT_ID, "sub": sub,
+            "email": email, "name": name, "iat": now, "exp": now + 3600,
+        }).decode()
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # concurrency runs open hundreds of connections at once
+
+
+class StubServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=None):
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.key = _SigningKey()
+        self.calls = {service: 0 for service in DEFAULT_LATENCY}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self.httpd = _StubHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        return {
+            "USDA_API_URL": f"{self.url}/usda",
+            "SPOONACULAR_API_URL": f"{self.url}/spoonacular",
+            "GEMINI_API_ENDPOINT": self.url,
+            "GOOGLE_CERTS_URL": f"{self.url}/google/certs",
+            "GOOGLE_CLIENT_ID": GOOGLE_CLIENT_ID,
+            "gemini_key": "bench", "usda_api_key": "bench", "SPOONACULAR_API_KEY": "bench",
+        }
+
+    def mint_id_token(self, sub, email, name="Bench User"):
+        return self.key.mint(sub, email, name)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _respond(self, method, raw_path):
+        parsed = urlparse(raw_path)
+        path, query = parsed.path, parse_qs(parsed.query)
+
+        if path.startswith("/usda/"):
+            return "usda", _usda_search(query)
+        if path.startswith("/spoonacular/"):
+            return "spoonacular", _spoonacular(path[len("/spoonacular"):], query)
+        if path.startswith("/google/certs"):
+            return "google", self.key.certs
+        if method == "POST" and ":generateContent" in path:
+            return "gemini", _gemini()
+        return None, None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+
+                service, payload = server._respond(method, self.path)
+                if service is None:
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    server.calls[service] += 1
+                    server.in_flight += 1
+                    server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.latency[service])
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the external API stubs standalone.")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    stub = StubServer(port=args.port).start()
+    for key, value in stub.env().items():
+        print(f"export {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,183 @@
+"""
+Statements, commits and latency per write endpoint.
+
+Runs each write route in-process (Flask test client) against a freshly seeded SQLite
+(default) or Postgres database, with the external APIs served by the local stubs at zero
+latency so only the database work is timed. For every endpoint the median over --runs
+requests of the SQL statements executed, the COMMITs issued and the wall time is
+reported, which makes extra round trips (mid-request commits and the reloads of expired
+objects that follow them) easy to spot in before/after comparisons.
+
+Usage (from backend/):
+    python -m benchmarks.writes [--runs 50] [--output bench-writes.json]
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.load import reset_database, seed_database, FOODS
+from benchmarks.stubs import StubServer
+
+
+class _Counter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, 'before_cursor_execute', self._statement)
+        event.listen(engine, 'commit', self._commit)
+
+    def _statement(self, *args):
+        self.statements += 1
+
+    def _commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = self.commits = 0
+
+
+def _scenarios(app, db, stub, user_ids, counter):
+    """
+    {endpoint: fn(i)} where each call issues one request that writes. Setup queries reset
+    `counter` so only the request itself is counted.
+    """
+    from models import MealLog, Ingredient
+
+    client = app.test_client()
+    rng = random.Random(1)
+
+    def expect(response, *codes):
+        assert response.status_code in codes, (response.status_code, response.get_data(as_text=True)[:200])
+
+    def register(i):
+        expect(client.post("/api/auth/register", json={"username": f"writer{i}", "password": "pw",
+                                                       "email": f"writer{i}@example.com"}), 201)
+
+    def google_new(i):
+        token = stub.mint_id_token(f"new-{i}", f"google{i}@example.com", "Google User")
+        expect(client.post("/api/auth/google", json={"token": token}), 200)
+
+    def google_link(i):
+        # Existing password account, first Google sign-in with the same email.
+        token = stub.mint_id_token(f"link-{i}", f"writer{i}@example.com", f"writer{i}")
+        expect(client.post("/api/auth/google", json={"token": token}), 200)
+
+    def stats_post(i):
+        expect(client.post(f"/api/user/{rng.choice(user_ids)}/stats", json={
+            "weight": rng.uniform(55, 110), "height": rng.uniform(150, 195), "age": 30,
+            "gender": "female", "activity_level": "moderate"}), 201)
+
+    def weight(i):
+        expect(client.post(f"/api/user/{rng.choice(user_ids)}/weight", json={"weight": rng.uniform(55, 110)}), 200)
+
+    def log_meal(i):
+        expect(client.post(f"/api/user/{rng.choice(user_ids)}/meal-log", json={
+            "food_name": rng.choice(FOODS), "calories": 300, "protein": 20, "fats": 10, "carbs": 30}), 201)
+
+    def search_new_food(i):
+        expect(client.get(f"/api/food/search/Bench Food {i}/{rng.choice(user_ids)}"), 200)
+
+    def search_known_food(i):
+        # Catalogue hit without a cached recipe: generates one and stores it on the ingredient.
+        db.session.add(Ingredient(name=f"Known Food {i}", calories_per_unit=100, protein_per_unit=5,
+                                  fats_per_unit=2, carbs_per_unit=15))
+        db.session.commit()
+        counter.reset()
+        expect(client.get(f"/api/food/search/Known Food {i}/{rng.choice(user_ids)}"), 200)
+
+    def create_recipe(i):
+        expect(client.post("/api/recipes", json={"title": f"Bench Recipe {i}", "base_servings": 2, "ingredients": [
+            {"name": rng.choice(FOODS).lower(), "amount": 100, "unit": "g"},
+            {"name": rng.choice(FOODS).lower(), "amount": 50, "unit": "g"}]}), 201)
+
+    def spoonacular_recipe(i):
+        expect(client.get(f"/api/recipes/{900000 + i}?source=spoonacular"), 200)
+
+    def delete_meal(i):
+        user_id = rng.choice(user_ids)
+        meal_id = db.session.query(MealLog.id).filter_by(user_id=user_id).order_by(MealLog.id.desc()).limit(1).scalar()
+        db.session.commit()
+        counter.reset()
+        expect(client.delete(f"/api/user/{user_id}/meal-log/{meal_id}"), 200)
+
+    def delete_all(i):
+        expect(client.delete(f"/api/user/{user_ids[i % len(user_ids)]}/meal-log"), 200)
+
+    return {
+        "register": register, "google_auth_new": google_new, "google_auth_link": google_link,
+        "stats_post": stats_post, "weight": weight, "meal_log": log_meal,
+        "search_food_new": search_new_food, "search_food_known": search_known_food,
+        "create_recipe": create_recipe, "recipe_spoonacular": spoonacular_recipe,
+        "delete_meal": delete_meal, "delete_all_meals": delete_all,
+    }
+
+def run(app, db, stub, user_ids, runs):
+    with app.app_context():
+        counter = _Counter(db.engine)
+    scenarios = _scenarios(app, db, stub, user_ids, counter)
+
+    results = {}
+    for name, scenario in scenarios.items():
+        statements, commits, seconds = [], [], []
+        for i in range(runs):
+            with app.app_context():
+                counter.reset()
+                started = time.perf_counter()
+                scenario(i)
+                seconds.append(time.perf_counter() - started)
+                statements.append(counter.statements)
+                commits.append(counter.commits)
+                db.session.remove()
+        results[name] = {
+            "statements": statistics.median(statements),
+            "commits": statistics.median(commits),
+            "median_ms": round(statistics.median(seconds) * 1000, 2),
+        }
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Statements, commits and latency per write endpoint.")
+    parser.add_argument("--database-url", help="Defaults to a fresh SQLite file in a temp dir.")
+    parser.add_argument("--reset", action="store_true", help="Drop the tables of a --database-url that holds data.")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--output", default="bench-writes.json")
+    args = parser.parse_args()
+
+    stub = StubServer(latency={service: 0 for service in ("usda", "spoonacular", "gemini", "google")}).start()
+    os.environ.update(stub.env())
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+    from app import app
+    from models import db
+
+    with app.app_context():
+        reset_database(db, args.reset)
+        user_ids = seed_database(db, args.users, 50, rng=random.Random(1))
+        dialect = db.engine.dialect.name
+
+    try:
+        results = run(app, db, stub, user_ids, args.runs)
+    finally:
+        stub.stop()
+
+    with open(args.output, "w") as f:
+        json.dump({"runs": args.runs, "database": dialect, "endpoints": results}, f, indent=2)
+
+    print(f"{'endpoint':<22}{'statements':>12}{'commits':>10}{'median ms':>12}")
+    for name, result in results.items():
+        print(f"{name:<22}{result['statements']:>12g}{result['commits']:>10g}{result['median_ms']:>12.2f}")
+    print(f"Report written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
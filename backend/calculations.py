@@ -1,3 +1,115 @@
+"""
+Body metrics and energy expenditure (BMI, Mifflin-St Jeor BMR, TDEE, calorie targets).
+
+Every formula here is written with NumPy operations, so the same functions accept plain
+numbers (one user) or arrays (many users at once); `calorie_targets_batch` is the batched
+entry point used by the bulk recompute:
+
+    python calculations.py recompute-targets
+"""
+import numpy as np
+from sqlalchemy import select, update
+
+from models import db, User, UserStats
+
+# The usual Harris-Benedict / Mifflin scale. "active" is what the app's "Very Active" option
+# sends, so very_active is the same level under its conventional name; extra_active is the
+# top of the scale (hard daily exercise plus a physical job).
+ACTIVITY_MULTIPLIERS = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very_active": 1.725,
+    "extra_active": 1.9,
+}
+DEFAULT_ACTIVITY = "sedentary"
+
+GOAL_ADJUSTMENTS = {
+    "lose": -500,
+    "maintain": 0,
+    "gain": 500,
+}
+GOAL_ALIASES = {"lose_weight": "lose", "gain_weight": "gain"}
+
+LBS_TO_KG = 0.453592
+INCH_TO_CM = 2.54
+
+RECOMPUTE_BATCH_SIZE = 10000
+
+
+def to_kg(weight, unit='kg'):
+    return weight * LBS_TO_KG if unit == 'lbs' else weight
+
+def to_cm(height, unit='cm', height_inches=0):
+    if unit == 'm':
+        return height * 100
+    if unit == 'inches':
+        return (height + height_inches) * INCH_TO_CM
+    if unit == 'ft':
+        return (height * 12 + height_inches) * INCH_TO_CM
+    return height
+
+def activity_multiplier(activity_level):
+    return ACTIVITY_MULTIPLIERS.get(str(activity_level).lower(), ACTIVITY_MULTIPLIERS[DEFAULT_ACTIVITY])
+
+def goal_adjustment(goal):
+    goal = str(goal).lower()
+    return GOAL_ADJUSTMENTS.get(GOAL_ALIASES.get(goal, goal), 0)
+
+def goal_from_target(weight, target_weight):
+    """
+    Calorie adjustment implied by a target weight: -500 below the current weight,
+    +500 above it, 0 when equal or unset (NaN).
+    """
+    diff = np.nan_to_num(np.asarray(target_weight, dtype=float) - weight)
+    return np.sign(diff) * GOAL_ADJUSTMENTS["gain"]
+
+def is_male(gender):
+    return str(gender).lower() == 'male'
+
+def basal_metabolic_rate(weight_kg, height_cm, age, male):
+    """
+    Mifflin-St Jeor BMR. Scalars or equally-shaped arrays.
+    """
+    return 10 * weight_kg + 6.25 * height_cm - 5 * age + np.where(male, 5, -161)
+
+def calorie_targets_batch(weight_kg, height_cm, age, male, multipliers, adjustments):
+    """
+    Vectorized daily calorie targets: BMR x activity multiplier + goal adjustment,
+    truncated to whole calories.
+    """
+    tdee = basal_metabolic_rate(weight_kg, height_cm, age, male) * multipliers
+    return np.trunc(tdee + adjustments).astype(np.int64)
+
+def calorie_target(weight, height, age, gender, activity_level, goal=None, target_weight=None,
+                   weight_unit='kg', height_unit='cm', height_inches=0):
+    """Daily calorie target for one user.
+
+    Args:
+        weight, height, age, gender, activity_level: The user's biometrics.
+        goal: 'lose' / 'maintain' / 'gain' (or 'lose_weight' / 'gain_weight'). If omitted,
+            it is inferred from target_weight.
+        target_weight: Goal weight in the same unit as weight.
+        weight_unit: 'kg' or 'lbs'.
+        height_unit: 'cm', 'm', 'inches' or 'ft' (with height_inches).
+
+    Returns:
+        int: The calorie target.
+    """
+    weight_kg = to_kg(weight, weight_unit)
+    if goal is not None:
+        adjustment = goal_adjustment(goal)
+    elif target_weight:
+        adjustment = goal_from_target(weight_kg, to_kg(target_weight, weight_unit))
+    else:
+        adjustment = 0
+
+    return int(calorie_targets_batch(
+        weight_kg, to_cm(height, height_unit, height_inches), age, is_male(gender),
+        activity_multiplier(activity_level), adjustment
+    ))
+
 def calculate_bmi(weight,weight_unit, height, height_unit, height_inches=0):
     """
     Calculate Body Mass Index (BMI) using weight and height.
@@ -9,48 +121,17 @@ def calculate_bmi(weight,weight_unit, height, height_unit, height_inches=0):
     Returns:
         Calculated BMI value.
     """
-
-    
-    if is_height_valid and is_weight_valid:
-        if weight_unit == 'lbs':
-            weight = weight * 0.453592  
-        if height_unit == 'cm':
-            height = height / 100  
-        elif height_unit == 'inches':
-            total_height_inches = height + height_inches
-            height = total_height_inches * 0.0254  
-        bmi = weight / (height ** 2)
+    if is_height_valid(height, height_unit) and is_weight_valid(weight, weight_unit):
+        height_m = to_cm(height, height_unit, height_inches) / 100
+        bmi = to_kg(weight, weight_unit) / (height_m ** 2)
         return round(bmi, 2)
     else:
         raise ValueError("Invalid weight or height values.")
 
-def daily_caloric_needs(weight, weight_unit, height, height_unit, age, activity_level, goal):
+def daily_caloric_needs(weight, weight_unit, height, height_unit, age, activity_level, goal, gender='male'):
     if is_weight_valid(weight, weight_unit) and is_height_valid(height, height_unit):
-        if weight_unit == 'lbs':
-            weight = weight * 0.453592  
-        if height_unit == 'cm':
-            height = height / 100
-        elif height_unit == 'inches':
-            height = height * 0.0254  
-
-        bmr = 10 * weight + 6.25 * height - 5 * age + 5  # Mifflin-St Jeor for men
-        if activity_level == 'sedentary':
-            caloric_needs = bmr * 1.2
-        elif activity_level == 'light':
-            caloric_needs = bmr * 1.375
-        elif activity_level == 'moderate':
-            caloric_needs = bmr * 1.55
-        elif activity_level == 'active':
-            caloric_needs = bmr * 1.725
-        elif activity_level == 'very_active':
-            caloric_needs = bmr * 1.9
-
-        if goal == 'lose_weight':
-            caloric_needs -= 500 
-        elif goal == 'gain_weight':
-            caloric_needs += 500 
-
-        return round(caloric_needs, 2)
+        return calorie_target(weight, height, age, gender, activity_level, goal=goal,
+                              weight_unit=weight_unit, height_unit=height_unit)
     else:
         raise ValueError("Invalid weight, height, age, or activity level.")
 
@@ -59,7 +140,7 @@ def calculate_macros():
 
 def is_weight_valid(weight, unit):
     if unit == 'kg':
-        return weight > 0 and weight < 635  
+        return weight > 0 and weight < 635
     elif unit == 'lbs':
         return weight > 0 and weight < 1400
     return False
@@ -70,4 +151,52 @@ def is_height_valid(height, unit):
         return height > 0 and height < 250
     elif unit == 'inches':
         return height > 0 and height < 100
-    return False
\ No newline at end of file
+    return False
+
+def recompute_all_calorie_targets(batch_size=RECOMPUTE_BATCH_SIZE):
+    """
+    Refresh calorie_target on every UserStats row from the current formula, a batch of
+    rows per vectorized call. Stored weights are kg and heights cm; the goal comes from
+    target_weight as in recalculate_calorie_target. Returns the number of rows updated.
+    """
+    rows = db.session.execute(
+        select(UserStats.id, UserStats.weight, UserStats.height, UserStats.age, UserStats.gender,
+               UserStats.activity_level, UserStats.target_weight)
+        .execution_options(yield_per=batch_size)
+    )
+    updates = []
+    for chunk in rows.partitions():
+        ids, weight, height, age, gender, activity, target = zip(*chunk)
+        weight = np.array(weight, dtype=float)
+        targets = calorie_targets_batch(
+            weight, np.array(height, dtype=float), np.array(age, dtype=float),
+            np.array([is_male(g) for g in gender]),
+            np.array([activity_multiplier(a) for a in activity]),
+            goal_from_target(weight, np.array([t if t else np.nan for t in target], dtype=float))
+        )
+        updates.extend({"id": i, "calorie_target": int(t)} for i, t in zip(ids, targets))
+
+    for start in range(0, len(updates), batch_size):
+        db.session.execute(update(UserStats), updates[start:start + batch_size])
+    db.session.execute(
+        update(User).where(User.id.in_(select(UserStats.user_id)))
+        .values(data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return len(updates)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Energy-expenditure maintenance commands.")
+    parser.add_argument("command", choices=["recompute-targets"])
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        updated = recompute_all_calorie_targets()
+        print(f"Updated {updated} calorie targets in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,124 @@
+"""
+Aggregated startup payload for the frontend: profile, latest stats, today's meals and
+the goal prediction in a single response.
+
+The three reads it needs are independent, so they run concurrently, each on its own
+app context (and therefore its own DB session/connection). The prediction comes from the
+nightly batch (batch_predictions.py) while it is current; only when the user's data has
+changed since is the weight history loaded and the trend fitted here.
+
+"Today" is the UTC day, the same day the ETag (http_cache.py) rolls over on.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from batch_predictions import stored_prediction
+from http_cache import utc_today
+from models import db, User, UserStats, MealLog, WeightLog
+from services import meal_log_rows, serialize_stats, predict_from_weight_history
+from write_behind import merge_pending
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("DASHBOARD_WORKERS", 8)))
+
+
+def _run_in_context(app, fn, *args):
+    with app.app_context():
+        return fn(*args)
+
+def _fetch_profile(user_id):
+    """
+    User row joined with their most recent UserStats row, in one query.
+    """
+    latest_stats_id = db.session.query(UserStats.id)\
+        .filter(UserStats.user_id == User.id)\
+        .order_by(UserStats.updated_at.desc())\
+        .limit(1)\
+        .correlate(User)\
+        .scalar_subquery()
+
+    row = db.session.query(User, UserStats)\
+        .outerjoin(UserStats, UserStats.id == latest_stats_id)\
+        .filter(User.id == user_id)\
+        .first()
+
+    if not row:
+        return None
+
+    user, stats = row
+    return {
+        "profile": {"user_id": user.id, "username": user.username, "email": user.email},
+        "stats": serialize_stats(stats) if stats else None,
+        "weight": stats.weight if stats else None,
+        "target_weight": stats.target_weight if stats else None,
+    }
+
+def _fetch_today(user_id, day_start):
+    # Read before the meals so a delta sync from this seq can't miss a concurrent write.
+    meal_seq = db.session.query(User.meal_log_seq).filter_by(id=user_id).scalar() or 0
+    meals = meal_log_rows(
+        MealLog.user_id == user_id,
+        MealLog.date >= day_start,
+        MealLog.date < day_start + timedelta(days=1)
+    )
+
+    day = day_start.strftime("%Y-%m-%d")
+    meals = [m for m in merge_pending(user_id, meals) if m["date"].startswith(day)]
+    return {
+        "meals": meals,
+        "meal_seq": meal_seq,
+        "totals": {
+            "calories": sum(m["calories"] or 0 for m in meals),
+            "protein": round(sum(m["protein"] or 0 for m in meals), 1),
+            "carbs": round(sum(m["carbs"] or 0 for m in meals), 1),
+            "fats": round(sum(m["fats"] or 0 for m in meals), 1),
+        },
+    }
+
+def _fetch_prediction(user_id):
+    """
+    (stored prediction, None) while the batch result is current, else (None, weight history).
+    """
+    prediction = stored_prediction(user_id)
+    if prediction:
+        return prediction, None
+    history = db.session.query(WeightLog.date, WeightLog.weight)\
+        .filter_by(user_id=user_id)\
+        .order_by(WeightLog.date.asc())\
+        .all()
+    return None, history
+
+def build_dashboard(user_id):
+    """Assemble everything the app needs on startup for one user.
+
+    Args:
+        user_id: The identifier of the user to load.
+
+    Returns:
+        dict or None: profile, stats (None until onboarding is done), today's meals with
+        totals, and the goal prediction; None if the user does not exist.
+    """
+    app = current_app._get_current_object()
+    day_start = datetime.combine(utc_today(), datetime.min.time())
+
+    profile_future = _executor.submit(_run_in_context, app, _fetch_profile, user_id)
+    today_future = _executor.submit(_run_in_context, app, _fetch_today, user_id, day_start)
+    prediction_future = _executor.submit(_run_in_context, app, _fetch_prediction, user_id)
+
+    profile = profile_future.result()
+    today = today_future.result()
+    prediction, history = prediction_future.result()
+
+    if not profile:
+        return None
+    if prediction is None:
+        prediction = predict_from_weight_history(history, profile["weight"], profile["target_weight"])
+
+    return {
+        "profile": profile["profile"],
+        "stats": profile["stats"],
+        "today": today,
+        "prediction": prediction,
+    }
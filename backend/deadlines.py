@@ -0,0 +1,172 @@
+"""
+End-to-end request deadlines and admission control for expensive routes.
+
+Every request gets a deadline at ingress: REQUEST_DEADLINE_SECONDS after it reached the
+edge (the X-Request-Start header set by the proxy, when present) or after it reached us.
+What is left of it bounds everything the request does downstream:
+
+- PostgreSQL statements, via SET LOCAL statement_timeout at each transaction start,
+- outbound HTTP calls in services.py (`http_timeout`),
+- Gemini calls in services.py / ai.py (`gemini_request_options`).
+
+Once the budget is spent those raise (or time out) instead of holding a worker until
+gunicorn kills it, and an unhandled DeadlineExceeded becomes a 504. A statement that
+PostgreSQL cancels for the timeout is raised as DeadlineExceeded too. Bulk routes can set
+their own budget with `@deadline(seconds)`.
+
+Routes decorated with `@expensive` (outbound API / AI calls, bulk work) also go through
+admission control: at most EXPENSIVE_CONCURRENCY of them run per process (a streamed
+response keeps its slot until the stream is closed), and a request
+that has already waited QUEUE_BUDGET_SECONDS (at the proxy plus for a slot here) is
+answered 503 with Retry-After rather than queueing further. Cheap routes such as meal
+logging are never shed.
+"""
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_request_context, jsonify, make_response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", 25))
+QUEUE_BUDGET_SECONDS = float(os.getenv("QUEUE_BUDGET_SECONDS", 2))
+EXPENSIVE_CONCURRENCY = int(os.getenv("EXPENSIVE_CONCURRENCY", 200))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", 5))
+MIN_TIMEOUT_SECONDS = 0.05
+MAX_EDGE_WAIT_SECONDS = 600
+QUERY_CANCELED_SQLSTATE = '57014'
+
+_expensive_slots = threading.BoundedSemaphore(EXPENSIVE_CONCURRENCY)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def _edge_start(now):
+    """
+    When the request reached the proxy, from X-Request-Start ("t=<epoch>" in s, ms or us).
+    """
+    header = request.headers.get("X-Request-Start", "")
+    try:
+        value = float(header[2:] if header.startswith("t=") else header)
+    except ValueError:
+        return now
+    if value > 1e14:
+        value /= 1e6
+    elif value > 1e11:
+        value /= 1e3
+    # Proxy and app clocks can disagree slightly; ignore values that make no sense.
+    return min(value, now) if now - MAX_EDGE_WAIT_SECONDS <= value else now
+
+def _start_deadline():
+    now = time.time()
+    started = _edge_start(now)
+    g.queue_wait = now - started
+    g.deadline = time.monotonic() - g.queue_wait + REQUEST_DEADLINE_SECONDS
+
+def remaining():
+    """
+    Seconds left before the current request's deadline (None outside a request).
+    """
+    if not has_request_context() or "deadline" not in g:
+        return None
+    return g.deadline - time.monotonic()
+
+def time_left(cap):
+    """
+    `cap`, or less if the request deadline is nearer. Raises DeadlineExceeded when it has passed.
+    """
+    left = remaining()
+    if left is None:
+        return cap
+    if left < MIN_TIMEOUT_SECONDS:
+        raise DeadlineExceeded()
+    return min(cap, left)
+
+def http_timeout(cap=10.0):
+    """
+    Timeout for an outbound HTTP call: (connect, read) seconds.
+    """
+    timeout = time_left(cap)
+    return (min(timeout, 3.05), timeout)
+
+def gemini_request_options(cap=30.0):
+    return {"timeout": time_left(cap)}
+
+
+def deadline(seconds):
+    """
+    Decorator giving a route a different budget than REQUEST_DEADLINE_SECONDS (bulk
+    import / export), still counted from ingress.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if "deadline" in g:
+                g.deadline += seconds - REQUEST_DEADLINE_SECONDS
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _overloaded():
+    response = jsonify({"error": "Server is busy, please retry shortly."})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+    return response
+
+def expensive(view):
+    """
+    Admission control for a route: waits at most the rest of QUEUE_BUDGET_SECONDS for one
+    of the EXPENSIVE_CONCURRENCY slots, and sheds the request with 503 otherwise.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        wait_budget = QUEUE_BUDGET_SECONDS - g.get("queue_wait", 0)
+        if wait_budget <= 0 or not _expensive_slots.acquire(timeout=wait_budget):
+            return _overloaded()
+        streaming = False
+        try:
+            response = make_response(view(*args, **kwargs))
+            if response.is_streamed:
+                # The work happens while the body is sent; hold the slot until then.
+                response.call_on_close(_expensive_slots.release)
+                streaming = True
+            return response
+        finally:
+            if not streaming:
+                _expensive_slots.release()
+    return wrapper
+
+
+def _set_statement_timeout(session, transaction, connection):
+    left = remaining()
+    if left is None or connection.dialect.name != 'postgresql':
+        return
+    if left < MIN_TIMEOUT_SECONDS:
+        raise DeadlineExceeded()
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(left * 1000)}")
+
+def _statement_timeout_to_deadline(context):
+    """
+    A query PostgreSQL cancelled while a request deadline is set hit our statement_timeout:
+    raise it as DeadlineExceeded, so it is answered with 504 like any other spent deadline.
+    """
+    if getattr(context.original_exception, 'pgcode', None) == QUERY_CANCELED_SQLSTATE and remaining() is not None:
+        return DeadlineExceeded()
+    return None
+
+def _deadline_exceeded(e):
+    return jsonify({"error": "Request deadline exceeded"}), 504
+
+def init_deadlines(app):
+    app.before_request(_start_deadline)
+    app.register_error_handler(DeadlineExceeded, _deadline_exceeded)
+    if not event.contains(Session, 'after_begin', _set_statement_timeout):
+        event.listen(Session, 'after_begin', _set_statement_timeout)
+    if not event.contains(Engine, 'handle_error', _statement_timeout_to_deadline):
+        event.listen(Engine, 'handle_error', _statement_timeout_to_deadline, retval=True)
@@ -0,0 +1,96 @@
+"""
+Streaming export of a user's full history (meals, weights, stats) as CSV or NDJSON.
+
+Rows are read as plain column tuples through a server-side cursor (yield_per), written
+into small text chunks and yielded straight to the client, so memory stays flat no matter
+how long the history is and the first bytes go out before the queries finish.
+"""
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from models import db, MealLog, WeightLog, UserStats
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+CSV_COLUMNS = [
+    'type', 'date', 'meal_name', 'calories', 'protein', 'carbs', 'fats', 'amount',
+    'weight', 'height', 'age', 'gender', 'bmi', 'activity_level', 'calorie_target', 'target_weight',
+]
+
+# (record type, columns to select, date column) in export order
+EXPORT_SOURCES = [
+    ('meal', [MealLog.date, MealLog.meal_name, MealLog.calories, MealLog.protein,
+              MealLog.carbs, MealLog.fats, MealLog.amount], MealLog),
+    ('weight', [WeightLog.date, WeightLog.weight], WeightLog),
+    ('stats', [UserStats.updated_at.label('date'), UserStats.weight, UserStats.height, UserStats.age,
+               UserStats.gender, UserStats.bmi, UserStats.activity_level,
+               UserStats.calorie_target, UserStats.target_weight], UserStats),
+]
+
+
+def _stream_rows(user_id):
+    """
+    Yields (record_type, row_dict) for every row of the user's history, oldest first per type.
+    """
+    for record_type, columns, model in EXPORT_SOURCES:
+        date_column = model.updated_at if model is UserStats else model.date
+        stmt = select(*columns)\
+            .where(model.user_id == user_id)\
+            .order_by(date_column.asc())\
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+        for row in db.session.execute(stmt):
+            record = row._asdict()
+            if record['date'] is not None:
+                record['date'] = record['date'].isoformat()
+            yield record_type, record
+
+def _generate_csv(user_id):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    for count, (record_type, record) in enumerate(_stream_rows(user_id), start=1):
+        writer.writerow({'type': record_type, **record})
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+def _generate_ndjson(user_id):
+    rows = _stream_rows(user_id)
+    # The first record goes out on its own, like the CSV header, so the client gets bytes
+    # as soon as the first query returns; the rest is batched.
+    for record_type, record in rows:
+        yield json.dumps({'type': record_type, **record}) + "\n"
+        break
+
+    lines = []
+    for record_type, record in rows:
+        lines.append(json.dumps({'type': record_type, **record}))
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def generate_export(user_id, fmt):
+    """
+    Returns a generator of text chunks for the requested format ('csv' or 'ndjson').
+    """
+    if fmt == 'csv':
+        return _generate_csv(user_id)
+    return _generate_ndjson(user_id)
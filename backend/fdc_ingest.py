@@ -0,0 +1,230 @@
+"""
+Offline ingestion of the USDA FoodData Central bulk downloads into local, indexed tables
+(fdc_food, fdc_nutrient, fdc_food_nutrient), plus the local lookup used by
+fetch_nutritional_data before it falls back to the USDA API.
+
+Supported inputs (https://fdc.nal.usda.gov/download-datasets):
+    * the CSV download, as the .zip or its extracted directory
+      (food.csv, nutrient.csv, food_nutrient.csv)
+    * a JSON download (Foundation / SR Legacy / Survey / Branded); streaming JSON
+      parsing needs the optional `ijson` package
+
+Files are read row by row and written in batches, so the dump is never held in memory.
+
+Usage:
+    python fdc_ingest.py FoodData_Central_csv_2024-04-18.zip
+    python fdc_ingest.py FoodData_Central_foundation_food_json_2024-04-18.json
+"""
+import csv
+import io
+import os
+import zipfile
+from contextlib import contextmanager
+
+from sqlalchemy import insert, text
+
+from models import db, FdcFood, FdcNutrient, FdcFoodNutrient
+
+INGEST_BATCH_SIZE = 10000
+
+# FDC nutrient ids for the macros we keep on fdc_food (energy falls back to the Atwater values).
+ENERGY_IDS = (1008, 2047, 2048)
+PROTEIN_ID = 1003
+FAT_ID = 1004
+CARBS_ID = 1005
+
+MACRO_UPDATE_SQL = """
+    UPDATE fdc_food SET
+        calories = COALESCE(
+            (SELECT amount FROM fdc_food_nutrient n WHERE n.fdc_id = fdc_food.fdc_id AND n.nutrient_id = :energy),
+            (SELECT amount FROM fdc_food_nutrient n WHERE n.fdc_id = fdc_food.fdc_id AND n.nutrient_id = :energy_general),
+            (SELECT amount FROM fdc_food_nutrient n WHERE n.fdc_id = fdc_food.fdc_id AND n.nutrient_id = :energy_specific)
+        ),
+        protein = (SELECT amount FROM fdc_food_nutrient n WHERE n.fdc_id = fdc_food.fdc_id AND n.nutrient_id = :protein),
+        fats = (SELECT amount FROM fdc_food_nutrient n WHERE n.fdc_id = fdc_food.fdc_id AND n.nutrient_id = :fat),
+        carbs = (SELECT amount FROM fdc_food_nutrient n WHERE n.fdc_id = fdc_food.fdc_id AND n.nutrient_id = :carbs)
+"""
+
+
+def normalize_name(name):
+    return " ".join(name.lower().split())
+
+def _batched_insert(model, rows):
+    """
+    Consumes an iterator of row dicts, inserting INGEST_BATCH_SIZE rows per statement.
+    """
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INGEST_BATCH_SIZE:
+            db.session.execute(insert(model.__table__), batch)
+            db.session.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(model.__table__), batch)
+        db.session.commit()
+        total += len(batch)
+    return total
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+# --- CSV ---
+
+@contextmanager
+def _open_csv(source, name):
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            member = next((m for m in archive.namelist() if m.endswith('/' + name) or m == name), None)
+            if member is None:
+                raise FileNotFoundError(f"{name} not found in {source}")
+            with archive.open(member) as raw:
+                yield csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8', newline=''))
+    else:
+        with open(os.path.join(source, name), encoding='utf-8', newline='') as f:
+            yield csv.DictReader(f)
+
+def _ingest_csv(source):
+    with _open_csv(source, 'nutrient.csv') as reader:
+        nutrient_count = _batched_insert(FdcNutrient, (
+            {"id": int(r['id']), "name": r['name'], "unit_name": r.get('unit_name'),
+             "nutrient_nbr": r.get('nutrient_nbr')}
+            for r in reader
+        ))
+
+    with _open_csv(source, 'food.csv') as reader:
+        food_count = _batched_insert(FdcFood, (
+            {"fdc_id": int(r['fdc_id']), "description": r['description'][:255],
+             "search_name": normalize_name(r['description'])[:255], "data_type": r.get('data_type')}
+            for r in reader
+        ))
+
+    with _open_csv(source, 'food_nutrient.csv') as reader:
+        value_count = _batched_insert(FdcFoodNutrient, (
+            {"fdc_id": int(r['fdc_id']), "nutrient_id": int(r['nutrient_id']), "amount": _float(r['amount'])}
+            for r in reader if _float(r.get('amount')) is not None
+        ))
+
+    return food_count, nutrient_count, value_count
+
+# --- JSON ---
+
+def _ingest_json(path):
+    try:
+        import ijson
+    except ImportError:
+        raise RuntimeError("Streaming the JSON dumps requires `pip install ijson` (or use the CSV download).")
+
+    with open(path, 'rb') as f:
+        root_key = next(value for prefix, event, value in ijson.parse(f) if event == 'map_key')
+
+    seen_nutrients = {row[0] for row in db.session.query(FdcNutrient.id).all()}
+    food_rows, value_rows = [], []
+    food_count = value_count = 0
+
+    def flush():
+        nonlocal food_rows, value_rows
+        if food_rows:
+            db.session.execute(insert(FdcFood.__table__), food_rows)
+        if value_rows:
+            db.session.execute(insert(FdcFoodNutrient.__table__), value_rows)
+        db.session.commit()
+        food_rows, value_rows = [], []
+
+    with open(path, 'rb') as f:
+        for food in ijson.items(f, f'{root_key}.item', use_float=True):
+            fdc_id = int(food['fdcId'])
+            food_rows.append({
+                "fdc_id": fdc_id, "description": food['description'][:255],
+                "search_name": normalize_name(food['description'])[:255], "data_type": food.get('dataType'),
+            })
+            food_count += 1
+
+            values = {}
+            for item in food.get('foodNutrients', []):
+                nutrient, amount = item.get('nutrient') or {}, _float(item.get('amount'))
+                if not nutrient.get('id') or amount is None:
+                    continue
+                if nutrient['id'] not in seen_nutrients:
+                    db.session.execute(insert(FdcNutrient.__table__), {
+                        "id": nutrient['id'], "name": nutrient.get('name', ''),
+                        "unit_name": nutrient.get('unitName'), "nutrient_nbr": nutrient.get('number'),
+                    })
+                    seen_nutrients.add(nutrient['id'])
+                values[nutrient['id']] = amount
+            value_rows.extend({"fdc_id": fdc_id, "nutrient_id": k, "amount": v} for k, v in values.items())
+            value_count += len(values)
+
+            if len(food_rows) + len(value_rows) >= INGEST_BATCH_SIZE:
+                flush()
+    flush()
+
+    return food_count, len(seen_nutrients), value_count
+
+def ingest_fdc(path):
+    """Load an FDC bulk download into the local tables, replacing any previous load.
+
+    Args:
+        path: A CSV .zip, an extracted CSV directory, or a JSON dump.
+
+    Returns:
+        tuple: (foods, nutrients, food_nutrient values) loaded.
+    """
+    db.create_all()
+    FdcFoodNutrient.query.delete()
+    FdcFood.query.delete()
+    FdcNutrient.query.delete()
+    db.session.commit()
+
+    if path.lower().endswith('.json'):
+        counts = _ingest_json(path)
+    else:
+        counts = _ingest_csv(path)
+
+    db.session.execute(text(MACRO_UPDATE_SQL), {
+        "energy": ENERGY_IDS[0], "energy_general": ENERGY_IDS[1], "energy_specific": ENERGY_IDS[2],
+        "protein": PROTEIN_ID, "fat": FAT_ID, "carbs": CARBS_ID,
+    })
+    db.session.commit()
+    return counts
+
+def lookup_local_food(query):
+    """
+    Resolve a food name against the local FDC index: exact name first, then the shortest
+    description starting with the query, skipping foods without an energy value. Both use
+    the search_name indexes. Returns the FdcFood row or None.
+    """
+    name = normalize_name(query)
+    if not name:
+        return None
+
+    food = FdcFood.query.filter(FdcFood.search_name == name, FdcFood.calories.isnot(None)).first()
+    if food:
+        return food
+
+    if db.engine.dialect.name == 'postgresql':
+        # LIKE 'name%' is collation-independent and uses the text_pattern_ops index.
+        prefix = FdcFood.search_name.startswith(name, autoescape=True)
+    else:
+        # SQLite compares with the BINARY collation, where a range scan is a prefix match
+        # (its LIKE is case-insensitive and can't use the index).
+        prefix = (FdcFood.search_name >= name) & (FdcFood.search_name < name + '\U0010ffff')
+    return FdcFood.query.filter(prefix, FdcFood.calories.isnot(None))\
+        .order_by(db.func.length(FdcFood.search_name)).first()
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Load a USDA FoodData Central bulk download.")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    with app.app_context():
+        foods, nutrients, values = ingest_fdc(args.path)
+        print(f"Loaded {foods} foods, {nutrients} nutrients and {values} nutrient values.")
@@ -0,0 +1,180 @@
+"""
+Offline nutrition estimates for foods the USDA doesn't know (kitfo, gomen, firfir, ...).
+
+Every Ingredient with macros is indexed as a character n-gram TF-IDF vector over two
+spellings of its name: the name itself and a transliteration "skeleton" with vowels folded
+and doubled letters collapsed, so shiro/shuro, wat/wot/wet or gomen/gommen land close
+together. A query is one sparse matrix-vector product against the whole index; the nearest
+known food's macros are returned with its cosine similarity as the confidence. n-grams the
+index has never seen still count towards the query's norm (at the highest idf), so an
+unknown word lowers the confidence instead of being ignored.
+
+The index is built on first use and rebuilt in a background thread once it is older than
+INDEX_REFRESH_SECONDS; queries keep using the previous index meanwhile.
+"""
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from flask import current_app
+from scipy import sparse
+
+from models import db, Ingredient
+
+NGRAM_SIZES = (2, 3, 4)
+INDEX_REFRESH_SECONDS = 300
+
+# Confidence needed to answer before asking USDA, and to answer at all once USDA misses.
+CONFIDENT_MATCH = 0.8
+MIN_CONFIDENCE = 0.5
+
+# Transliteration variants folded into the skeleton (Amharic romanizations mostly differ
+# in vowels, doubled consonants and q/k, ts/tz/ts').
+_FOLDS = (("ph", "f"), ("q", "k"), ("tz", "ts"), ("c", "k"), ("'", ""))
+_VOWELS = re.compile(r"[aeiouy]+")
+_DOUBLES = re.compile(r"(.)\1+")
+_NON_ALPHA = re.compile(r"[^a-z' ]+")
+
+
+def _normalize(text):
+    return " ".join(_NON_ALPHA.sub(" ", str(text).lower()).split())
+
+def skeleton(text):
+    """
+    Transliteration-insensitive spelling: 'Shuro Wot' and 'shiro wat' both become
+    'sh*r* w*t' (vowel runs -> '*', doubled letters collapsed).
+    """
+    text = _normalize(text)
+    for old, new in _FOLDS:
+        text = text.replace(old, new)
+    return _DOUBLES.sub(r"\1", _VOWELS.sub("*", text))
+
+def _ngrams(text):
+    grams = []
+    for word in text.split():
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+def _features(name):
+    """
+    n-grams of the spelling itself plus (prefixed, so they never collide) of its skeleton.
+    """
+    return _ngrams(_normalize(name)) + ["~" + g for g in _ngrams(skeleton(name))]
+
+
+class FoodEstimator:
+    def __init__(self):
+        self._index = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def build(self, rows=None):
+        """
+        Index (name, calories, protein, carbs, fats) rows; defaults to every Ingredient with
+        calories (needs an app context then).
+        """
+        if rows is None:
+            rows = db.session.query(
+                Ingredient.name, Ingredient.calories_per_unit, Ingredient.protein_per_unit,
+                Ingredient.carbs_per_unit, Ingredient.fats_per_unit
+            ).filter(Ingredient.calories_per_unit > 0).all()
+
+        vocabulary, indices, indptr = {}, [], [0]
+        for row in rows:
+            for gram in _features(row[0]):
+                indices.append(vocabulary.setdefault(gram, len(vocabulary)))
+            indptr.append(len(indices))
+
+        counts = sparse.csr_matrix(
+            (np.ones(len(indices)), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(rows), len(vocabulary))
+        )
+        counts.sum_duplicates()
+        document_frequency = np.bincount(counts.indices, minlength=len(vocabulary))
+        idf = np.log((1 + len(rows)) / (1 + document_frequency)) + 1
+
+        matrix = counts.multiply(idf[None, :]).tocsr()
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        matrix = sparse.diags(1 / np.maximum(norms, 1e-12)) @ matrix
+
+        index = {
+            "vocabulary": vocabulary, "idf": idf, "matrix": matrix.T.tocsr(),
+            "names": [row[0] for row in rows],
+            "macros": np.array([[v or 0 for v in row[1:]] for row in rows], dtype=np.float64).reshape(-1, 4),
+        }
+        with self._lock:
+            self._index, self._loaded_at = index, time.monotonic()
+        return len(rows)
+
+    def _ensure_index(self):
+        if self._index is None:
+            with self._build_lock:
+                if self._index is None:
+                    self.build()
+        elif (time.monotonic() - self._loaded_at > INDEX_REFRESH_SECONDS
+              and self._build_lock.acquire(blocking=False)):
+            # Single flight: the thread holding the build lock rebuilds, everyone else
+            # keeps answering from the current index.
+            app = current_app._get_current_object()
+            threading.Thread(target=self._refresh, args=(app,), daemon=True).start()
+
+    def _refresh(self, app):
+        try:
+            with app.app_context():
+                self.build()
+        except Exception as e:
+            print(f"Food estimator rebuild failed: {e}")
+        finally:
+            self._build_lock.release()
+
+    def _vectorize(self, index, query):
+        vocabulary = index["vocabulary"]
+        grams = Counter(_features(query))
+        known = [(vocabulary[g], count) for g, count in grams.items() if g in vocabulary]
+        if not known:
+            return None
+        columns, counts = map(np.array, zip(*sorted(known)))
+        values = counts * index["idf"][columns]
+        # Unseen n-grams weigh as much as the rarest indexed one would (document frequency 0).
+        unseen_idf = np.log(1 + len(index["names"])) + 1
+        unseen = sum(count * count for g, count in grams.items() if g not in vocabulary)
+        return columns, values / np.sqrt(np.dot(values, values) + unseen * unseen_idf ** 2)
+
+    def estimate(self, query, min_confidence=MIN_CONFIDENCE):
+        """Nearest indexed food to `query` by TF-IDF cosine similarity.
+
+        Args:
+            query: Free-text food name.
+            min_confidence: Similarity below which no estimate is returned.
+
+        Returns:
+            dict or None: matched name, confidence and its calories/protein/carbs/fats.
+        """
+        self._ensure_index()
+        index = self._index
+        if not index["names"]:
+            return None
+
+        vector = self._vectorize(index, query)
+        if vector is None:
+            return None
+        columns, values = vector
+
+        # Rows of the transposed matrix are n-grams: only the query's columns are touched.
+        scores = index["matrix"][columns].T @ values
+        best = int(np.argmax(scores))
+        confidence = float(scores[best])
+        if confidence < min_confidence:
+            return None
+
+        calories, protein, carbs, fats = index["macros"][best].tolist()
+        return {"name": index["names"][best], "confidence": round(confidence, 3),
+                "calories": calories, "protein": protein, "carbs": carbs, "fats": fats}
+
+
+food_estimator = FoodEstimator()
@@ -0,0 +1,100 @@
+"""
+Gunicorn settings (`gunicorn -c gunicorn.conf.py app:app`, see Procfile / render.yaml).
+
+Most slow requests spend their time waiting on USDA, Spoonacular or Gemini rather than
+on our CPU, so the default is cooperative gevent workers: each worker process holds up to
+GUNICORN_WORKER_CONNECTIONS requests in flight, and a request that is waiting on the
+network does not hold up the fast routes being served next to it.
+
+The patching below runs when gunicorn loads this file, i.e. in the master and before the
+preloaded app is imported, so every module (requests, threading in dashboard.py and
+write_behind.py, the DB drivers) is imported already cooperative:
+
+- the standard library via gevent.monkey,
+- psycopg2 through a wait callback (it talks to PostgreSQL in C, out of gevent's reach),
+- grpc (Gemini's default transport) through its experimental gevent integration.
+
+Set GUNICORN_WORKER_CLASS=sync (or gthread) to go back to plain worker processes.
+
+Environment:
+    WEB_CONCURRENCY              worker processes (default: 2 x CPUs, at most 4; always 1
+                                 with MEAL_LOG_WRITE_BEHIND=1)
+    GUNICORN_WORKER_CLASS        gevent (default), gthread or sync
+    GUNICORN_WORKER_CONNECTIONS  concurrent requests per gevent worker (default 1000)
+    GUNICORN_THREADS             threads per gthread worker (default 8)
+    GUNICORN_TIMEOUT             seconds before a silent worker is restarted (default 60)
+    PORT                         listen port (default 8000)
+"""
+import multiprocessing
+import os
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+workers = int(os.getenv("WEB_CONCURRENCY", min(2 * multiprocessing.cpu_count(), 4)))
+# Write-behind meals are only visible (and deletable) in the process that queued them until
+# they are flushed, so every request has to reach that one process (write_behind.py).
+if os.getenv("MEAL_LOG_WRITE_BEHIND") == "1" and workers > 1:
+    print(f"MEAL_LOG_WRITE_BEHIND=1 needs a single worker; ignoring WEB_CONCURRENCY={workers}")
+    workers = 1
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+backlog = 2048
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+
+# Import the app once in the master: workers fork with the models, the food index modules
+# and numpy/pandas/scikit-learn already loaded (shared copy-on-write, faster restarts).
+# Not with the write-behind queue, whose journal lock and flusher thread (write_behind.py)
+# belong to the process that starts them and must not be inherited by forked workers.
+preload_app = os.getenv("MEAL_LOG_WRITE_BEHIND") != "1"
+
+# Recycle workers now and then so slow leaks in long-lived processes don't accumulate.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = 500
+
+
+def _make_psycopg2_green():
+    try:
+        from psycopg2 import extensions, OperationalError
+    except ImportError:
+        return
+    from gevent.socket import wait_read, wait_write
+
+    def wait_callback(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                wait_read(conn.fileno(), timeout=timeout)
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno(), timeout=timeout)
+            else:
+                raise OperationalError(f"Bad result from poll: {state}")
+
+    extensions.set_wait_callback(wait_callback)
+
+def _make_grpc_green():
+    try:
+        from grpc.experimental import gevent as grpc_gevent
+    except ImportError:
+        return
+    grpc_gevent.init_gevent()
+
+
+if worker_class == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+    _make_psycopg2_green()
+    _make_grpc_green()
+
+
+def post_fork(server, worker):
+    # Connections opened by the preloaded app in the master must not be shared with children.
+    if not server.cfg.preload_app:
+        return
+    from app import app
+    from models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,96 @@
+"""
+Conditional GET and response compression for the per-user read endpoints.
+
+Every user carries a `data_version` that is bumped on any write to their meals, weights
+or stats (see models.py). Read endpoints derive a strong ETag from it, so a client poll
+with a matching If-None-Match is answered with 304 after a single primary-key lookup,
+without running the endpoint's own queries or serialization.
+"""
+import gzip
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from flask import request, make_response
+
+from models import db, User
+from write_behind import meal_log_queue
+
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 6
+
+
+def utc_today():
+    """
+    The day "today" means for every view with a daily ETag (the ETag rolls over with it).
+    """
+    return datetime.utcnow().date()
+
+def get_data_version(user_id):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    return db.session.query(User.data_version).filter(User.id == user_id).scalar()
+
+def _make_etag(user_id, version, daily):
+    parts = [request.endpoint, str(user_id), str(version), request.query_string.decode(),
+             str(meal_log_queue.pending_version(int(user_id)))]
+    if daily:
+        # Payloads that depend on "today" (predicted dates, today's meals) go stale at midnight.
+        parts.append(utc_today().isoformat())
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]
+
+def user_etag(daily=False):
+    """
+    Decorator for GET views taking a `user_id` argument. Adds a strong ETag built from
+    the user's data_version and answers a matching If-None-Match with 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = kwargs.get('user_id')
+            version = get_data_version(user_id)
+            if version is None:
+                return view(*args, **kwargs)
+
+            etag = _make_etag(user_id, version, daily)
+            # The gzip-encoded variant carries its own tag (see compress_response).
+            if request.if_none_match.contains(etag) or request.if_none_match.contains(f"{etag}-gz"):
+                response = make_response("", 304)
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def compress_response(response):
+    """
+    after_request hook: gzip large JSON bodies when the client accepts it.
+    """
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype != 'application/json'
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    response.set_data(gzip.compress(body, compresslevel=COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-gz", weak=weak)
+    return response
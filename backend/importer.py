@@ -0,0 +1,259 @@
+"""
+Bulk import of meal and weight history from CSV or NDJSON (e.g. other trackers, or our own export).
+
+Each row needs a `type` of "meal" or "weight" (inferred from the columns when missing):
+    meal:   meal_name, calories, protein, carbs, fats, amount, date
+    weight: weight, date, optional weight_unit ("kg" or "lbs"; stored as kg)
+"stats" rows from an export are skipped.
+
+The file is parsed as a stream, validated in chunks with the rules from validators.py and
+loaded with COPY on PostgreSQL or a batched executemany elsewhere. Derived state (the
+user's data_version and latest stats / calorie target) is refreshed once at the end.
+
+Usage:
+    python importer.py --user-id 1 history.csv [--format ndjson]
+"""
+import csv
+import io
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from models import db, User, MealLog, WeightLog, UserStats, bump_data_version, allocate_meal_seqs
+from calculations import to_kg
+from services import recalculate_calorie_target
+from validators import validate_meal_log, validate_weight
+
+IMPORT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+MEAL_COLUMNS = ['user_id', 'meal_name', 'calories', 'protein', 'carbs', 'fats', 'amount', 'date', 'change_seq']
+WEIGHT_COLUMNS = ['user_id', 'weight', 'date']
+
+
+def _read_rows(stream, fmt):
+    """
+    Yields (line_number, dict) from a text stream without loading the file.
+    """
+    if fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        # Header is line 1
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_number, row
+
+def _number(value, default=0.0):
+    if value is None or value == '':
+        return default
+    return float(value)
+
+def _parse_date(value):
+    if not value:
+        return datetime.utcnow()
+    dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    # Dates are stored as naive UTC; an explicit offset is converted, not dropped.
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+def _row_type(row):
+    row_type = (row.get('type') or '').strip().lower()
+    if row_type:
+        return row_type
+    if row.get('meal_name') or row.get('food_name'):
+        return 'meal'
+    if row.get('weight') not in (None, ''):
+        return 'weight'
+    return ''
+
+def _parse_meal(user_id, row):
+    meal_name = (row.get('meal_name') or row.get('food_name') or '').strip()
+    try:
+        amount = _number(row.get('amount'), 1.0)
+        values = {
+            'user_id': user_id,
+            'meal_name': meal_name[:100],
+            'calories': int(round(_number(row.get('calories')))),
+            'protein': _number(row.get('protein')),
+            'carbs': _number(row.get('carbs')),
+            'fats': _number(row.get('fats')),
+            'amount': amount,
+            'date': _parse_date(row.get('date')),
+        }
+    except (TypeError, ValueError) as e:
+        return None, [f"Invalid value: {e}"]
+
+    errors = validate_meal_log({'food_name': meal_name, 'amount': amount})
+    if values['calories'] < 0 or min(values['protein'], values['carbs'], values['fats']) < 0:
+        errors.append("Calories and macros cannot be negative.")
+    return values, errors
+
+def _parse_weight(user_id, row, weight_unit):
+    weight_unit = row.get('weight_unit') or weight_unit
+    try:
+        values = {
+            'user_id': user_id,
+            'weight': _number(row.get('weight'), None),
+            'date': _parse_date(row.get('date')),
+        }
+    except (TypeError, ValueError) as e:
+        return None, [f"Invalid value: {e}"]
+
+    if values['weight'] is None:
+        return values, ["Weight is required."]
+    errors = validate_weight(values['weight'], weight_unit)
+    # Weights are stored in kg, like every other weight route.
+    values['weight'] = to_kg(values['weight'], weight_unit)
+    return values, errors
+
+def _copy_rows(table, columns, rows):
+    """
+    Loads rows into a PostgreSQL table with COPY ... FROM STDIN through the session's connection.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[c].isoformat() if isinstance(row[c], datetime) else row[c] for c in columns])
+    buffer.seek(0)
+
+    # COPY isn't supported while a psycopg2 wait callback is installed (gevent workers, see
+    # gunicorn.conf.py), so it runs blocking; an import is one request's bulk work anyway.
+    from psycopg2 import extensions
+    wait_callback = extensions.get_wait_callback()
+    extensions.set_wait_callback(None)
+    try:
+        raw_connection = db.session.connection().connection
+        with raw_connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        extensions.set_wait_callback(wait_callback)
+
+def _load_chunk(meals, weights):
+    if meals:
+        first_seq = allocate_meal_seqs(db.session, meals[0]['user_id'], len(meals))
+        for offset, meal in enumerate(meals):
+            meal['change_seq'] = first_seq + offset
+
+    if db.engine.dialect.name == 'postgresql':
+        if meals:
+            _copy_rows(MealLog.__tablename__, MEAL_COLUMNS, meals)
+        if weights:
+            _copy_rows(WeightLog.__tablename__, WEIGHT_COLUMNS, weights)
+    else:
+        if meals:
+            db.session.execute(insert(MealLog.__table__), meals)
+        if weights:
+            db.session.execute(insert(WeightLog.__table__), weights)
+    db.session.commit()
+
+def _refresh_user_state(user_id, latest_weight):
+    """
+    Recomputes derived state once after the whole import: the newest imported weight
+    becomes the current stats weight (as log_user_weight would do) and caches are invalidated.
+    """
+    if latest_weight:
+        weight_date, weight = latest_weight
+        stats = UserStats.query.filter_by(user_id=user_id).order_by(UserStats.updated_at.desc()).first()
+        if stats and (stats.updated_at is None or weight_date > stats.updated_at):
+            stats.weight = weight
+            stats.calorie_target = recalculate_calorie_target(stats)
+            stats.updated_at = weight_date
+
+    bump_data_version(db.session, [user_id])
+    db.session.commit()
+
+def import_history(user_id, stream, fmt='csv', weight_unit='kg', chunk_size=IMPORT_CHUNK_SIZE):
+    """Validate and bulk-load a CSV/NDJSON history file for one user.
+
+    Args:
+        user_id: The user the rows are imported for.
+        stream: A text stream of the file contents.
+        fmt: 'csv' or 'ndjson'.
+        weight_unit: Unit assumed for weight rows that don't carry a weight_unit column.
+        chunk_size: Rows validated and loaded per batch.
+
+    Returns:
+        dict: Counts of imported meals/weights, skipped and rejected rows, and up to
+        MAX_REPORTED_ERRORS per-row errors as {"line": n, "errors": [...]}.
+    """
+    result = {"meals": 0, "weights": 0, "skipped": 0, "rejected": 0, "errors": []}
+    meals, weights = [], []
+    latest_weight = None
+
+    def reject(line_number, errors):
+        result["rejected"] += 1
+        if len(result["errors"]) < MAX_REPORTED_ERRORS:
+            result["errors"].append({"line": line_number, "errors": errors})
+
+    for line_number, row in _read_rows(stream, fmt):
+        if row is None:
+            reject(line_number, ["Malformed row."])
+            continue
+
+        row_type = _row_type(row)
+        if row_type == 'meal':
+            values, errors = _parse_meal(user_id, row)
+            if errors:
+                reject(line_number, errors)
+                continue
+            meals.append(values)
+        elif row_type == 'weight':
+            values, errors = _parse_weight(user_id, row, weight_unit)
+            if errors:
+                reject(line_number, errors)
+                continue
+            weights.append(values)
+            if latest_weight is None or values['date'] > latest_weight[0]:
+                latest_weight = (values['date'], values['weight'])
+        elif row_type == 'stats':
+            result["skipped"] += 1
+            continue
+        else:
+            reject(line_number, ["Unknown row type; expected 'meal' or 'weight'."])
+            continue
+
+        if len(meals) + len(weights) >= chunk_size:
+            _load_chunk(meals, weights)
+            result["meals"] += len(meals)
+            result["weights"] += len(weights)
+            meals, weights = [], []
+
+    _load_chunk(meals, weights)
+    result["meals"] += len(meals)
+    result["weights"] += len(weights)
+
+    _refresh_user_state(user_id, latest_weight)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Bulk import meal and weight history for a user.")
+    parser.add_argument("path")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--weight-unit", choices=["kg", "lbs"], default="kg")
+    args = parser.parse_args()
+
+    fmt = args.format or ('ndjson' if args.path.endswith(('.ndjson', '.jsonl')) else 'csv')
+
+    with app.app_context():
+        if not db.session.get(User, args.user_id):
+            raise SystemExit(f"User {args.user_id} not found.")
+        with open(args.path, newline='', encoding='utf-8') as f:
+            result = import_history(args.user_id, f, fmt, args.weight_unit)
+        print(f"Imported {result['meals']} meals and {result['weights']} weights "
+              f"({result['skipped']} skipped, {result['rejected']} rejected).")
+        for error in result["errors"]:
+            print(f"  line {error['line']}: {'; '.join(error['errors'])}")
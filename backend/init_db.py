@@ -1,7 +1,9 @@
 from app import app, db
 from models import User, UserStats, WeightLog, MealLog
+from schema import upgrade_schema
 
 with app.app_context():
     print("Creating database tables...")
     db.create_all()
+    upgrade_schema()
     print("Tables created successfully!")
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""
+orjson-backed JSON provider for the app (jsonify, request.get_json).
+
+orjson encodes in C and handles datetime/date (ISO 8601), UUIDs, dataclasses and NumPy
+scalars/arrays natively, so the list endpoints and the analytics payloads (which carry
+NumPy values out of pandas / scikit-learn) need no per-value conversion in Python.
+Responses are built from orjson's bytes directly instead of str -> encode.
+
+Falls back to Flask's default provider when orjson is not installed, or when
+JSON_PROVIDER=default is set (e.g. to compare output while debugging).
+"""
+import os
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return DefaultJSONProvider.default(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE),
+            mimetype=self.mimetype,
+        )
+
+
+def init_json(app):
+    """
+    Install FastJSONProvider on the app if orjson is available. Returns whether it was.
+    """
+    if orjson is None or os.getenv("JSON_PROVIDER") == "default":
+        return False
+    app.json = FastJSONProvider(app)
+    return True
@@ -1,4 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -11,6 +13,12 @@ class User(db.Model):
     password = db.Column(db.String(200), nullable=True)
     google_id = db.Column(db.String(200), unique=True, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped on every write to the user's meals, weights or stats; drives ETags.
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Last change sequence handed out to this user's meal log (see MealLog.change_seq).
+    meal_log_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Part of every refresh token; bumping it (logout) revokes them all (auth_tokens.py).
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     stats = db.relationship('UserStats', backref='user', lazy=True)
     meal_logs = db.relationship('MealLog', backref='user', lazy=True)
 
@@ -35,6 +43,9 @@ class UserStats(db.Model):
 
 class MealLog(db.Model):
     __tablename__ = 'meal_log'
+    # AUTOINCREMENT on SQLite so the write-behind queue can reserve ids (write_behind.py).
+    __table_args__ = (db.Index('ix_meal_log_user_change_seq', 'user_id', 'change_seq'),
+                      {'sqlite_autoincrement': True})
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     meal_name = db.Column(db.String(100), nullable=False)
@@ -44,6 +55,21 @@ class MealLog(db.Model):
     fats = db.Column(db.Float, default=0)
     amount = db.Column(db.Float, default=1) 
     date = db.Column(db.DateTime, default=datetime.utcnow)
+    # Per-user sequence of the last write to this entry; drives /meal-log/changes.
+    change_seq = db.Column(db.Integer, nullable=True)
+
+class MealLogTombstone(db.Model):
+    """
+    A deleted meal log entry, kept so delta-syncing clients learn about the delete.
+    meal_log_id is NULL when all of the user's entries were removed at once.
+    """
+    __tablename__ = 'meal_log_tombstone'
+    __table_args__ = (db.Index('ix_meal_log_tombstone_user_seq', 'user_id', 'change_seq'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    meal_log_id = db.Column(db.Integer, nullable=True)
+    change_seq = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Recipe(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -52,6 +78,9 @@ class Recipe(db.Model):
     spoonacular_id = db.Column(db.Integer, unique=True)
     base_servings = db.Column(db.Integer)
     total_calories = db.Column(db.Float)
+    total_protein = db.Column(db.Float)
+    total_carbs = db.Column(db.Float)
+    total_fats = db.Column(db.Float)
     recipe_ingredients = db.relationship('RecipeIngredient', backref='recipe', lazy=True)
 
 class Ingredient(db.Model):
@@ -76,4 +105,125 @@ class WeightLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     weight = db.Column(db.Float, nullable=False)
-    date = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    date = db.Column(db.DateTime, default=datetime.utcnow)
+
+class MealDailySummary(db.Model):
+    __tablename__ = 'meal_daily_summary'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    meal_count = db.Column(db.Integer, nullable=False, default=0)
+    calories = db.Column(db.Float, default=0)
+    protein = db.Column(db.Float, default=0)
+    carbs = db.Column(db.Float, default=0)
+    fats = db.Column(db.Float, default=0)
+
+class WeightDailySummary(db.Model):
+    __tablename__ = 'weight_daily_summary'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    entries = db.Column(db.Integer, nullable=False, default=0)
+    avg_weight = db.Column(db.Float, nullable=False)
+    min_weight = db.Column(db.Float, nullable=False)
+    max_weight = db.Column(db.Float, nullable=False)
+
+
+# Written by the nightly batch job (batch_predictions.py); valid while data_version matches the user's.
+class GoalPrediction(db.Model):
+    __tablename__ = 'goal_prediction'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, autoincrement=False)
+    status = db.Column(db.String(20), nullable=False)
+    days_needed = db.Column(db.Integer, nullable=True)
+    predicted_date = db.Column(db.Date, nullable=True)
+    slope = db.Column(db.Float, nullable=True)
+    data_version = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Local copy of USDA FoodData Central; macros on FdcFood are per 100 g.
+class FdcFood(db.Model):
+    __tablename__ = 'fdc_food'
+    # Prefix LIKE on PostgreSQL only uses an index with pattern ops under a non-C collation.
+    __table_args__ = (db.Index('ix_fdc_food_search_name_pattern', 'search_name',
+                               postgresql_ops={'search_name': 'text_pattern_ops'}),)
+    fdc_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(255), nullable=False)
+    search_name = db.Column(db.String(255), nullable=False, index=True)
+    data_type = db.Column(db.String(50))
+    calories = db.Column(db.Float)
+    protein = db.Column(db.Float)
+    carbs = db.Column(db.Float)
+    fats = db.Column(db.Float)
+
+class FdcNutrient(db.Model):
+    __tablename__ = 'fdc_nutrient'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(150), nullable=False)
+    unit_name = db.Column(db.String(20))
+    nutrient_nbr = db.Column(db.String(20))
+
+class FdcFoodNutrient(db.Model):
+    __tablename__ = 'fdc_food_nutrient'
+    __table_args__ = (db.Index('ix_fdc_food_nutrient_food', 'fdc_id', 'nutrient_id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    fdc_id = db.Column(db.Integer, nullable=False)
+    nutrient_id = db.Column(db.Integer, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+
+
+VERSIONED_MODELS = (MealLog, WeightLog, UserStats)
+
+def bump_data_version(session, user_ids):
+    if user_ids:
+        session.execute(
+            update(User)
+            .where(User.id.in_(user_ids))
+            .values(data_version=User.data_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+@event.listens_for(Session, 'before_flush')
+def _bump_versions_on_flush(session, flush_context, instances):
+    user_ids = {
+        obj.user_id
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, VERSIONED_MODELS) and obj.user_id is not None
+    }
+    bump_data_version(session, user_ids)
+
+def allocate_meal_seqs(session, user_id, count=1):
+    """
+    Reserves `count` consecutive change sequence numbers for the user and returns the
+    first. The row lock taken by the UPDATE keeps sequences in commit order per user.
+    """
+    last = session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(meal_log_seq=User.meal_log_seq + count)
+        .returning(User.meal_log_seq)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    return last - count + 1
+
+def record_meal_log_reset(session, user_id):
+    """
+    Tombstone for a bulk delete of every meal log entry of the user (clients resync).
+    """
+    session.add(MealLogTombstone(user_id=user_id, meal_log_id=None,
+                                 change_seq=allocate_meal_seqs(session, user_id)))
+
+@event.listens_for(Session, 'before_flush')
+def _sequence_meal_log_changes(session, flush_context, instances):
+    changes = {}
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, MealLog) and obj.user_id is not None:
+            if obj in session.dirty and obj not in session.deleted and not session.is_modified(obj):
+                continue
+            changes.setdefault(obj.user_id, []).append(obj)
+
+    for user_id, meals in changes.items():
+        seq = allocate_meal_seqs(session, user_id, len(meals))
+        for meal in meals:
+            if meal in session.deleted:
+                session.add(MealLogTombstone(user_id=user_id, meal_log_id=meal.id, change_seq=seq))
+            else:
+                meal.change_seq = seq
+            seq += 1
@@ -0,0 +1,149 @@
+"""
+Read-only, memory-mapped catalogue of Ingredient macros shared by all gunicorn workers.
+
+`build_store()` exports every Ingredient into one structured NumPy file sorted by name:
+    name (utf-8, lower-cased), id, calories, protein, carbs, fats   (per unit)
+Workers open it with np.load(mmap_mode='r'), so the pages live once in the OS page cache
+no matter how many workers map it. Name lookups are a binary search (np.searchsorted)
+over the mapped name column; no per-process dict is built.
+
+Rebuilds write to a temp file and os.replace() it over the old one; readers notice the
+new inode on their next check and remap, while already-open maps stay valid.
+
+Usage:
+    python nutrient_store.py build
+"""
+import os
+import time
+
+import numpy as np
+
+from models import db, Ingredient
+
+STORE_PATH = os.getenv(
+    "NUTRIENT_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "nutrient_store.npy")
+)
+RELOAD_CHECK_SECONDS = 30
+NAME_BYTES = 100
+
+MACRO_FIELDS = ('calories', 'protein', 'carbs', 'fats')
+STORE_DTYPE = np.dtype([
+    ('name', f'S{NAME_BYTES}'),
+    ('id', '<i4'),
+    ('calories', '<f4'),
+    ('protein', '<f4'),
+    ('carbs', '<f4'),
+    ('fats', '<f4'),
+])
+
+
+def encode_name(name):
+    """
+    Normalized UTF-8 name, cut to NAME_BYTES on a character boundary (Amharic letters are
+    3 bytes each, so a plain byte slice could split one).
+    """
+    encoded = " ".join(name.lower().split()).encode('utf-8')
+    if len(encoded) <= NAME_BYTES:
+        return encoded
+    return encoded[:NAME_BYTES].decode('utf-8', 'ignore').encode('utf-8')
+
+def build_store(path=STORE_PATH):
+    """
+    Export all Ingredient macros to `path`, replacing the previous file atomically.
+    Returns the number of rows written.
+    """
+    rows = db.session.query(
+        Ingredient.name, Ingredient.id, Ingredient.calories_per_unit, Ingredient.protein_per_unit,
+        Ingredient.carbs_per_unit, Ingredient.fats_per_unit
+    ).all()
+
+    array = np.empty(len(rows), dtype=STORE_DTYPE)
+    for i, (name, ingredient_id, calories, protein, carbs, fats) in enumerate(rows):
+        array[i] = (encode_name(name), ingredient_id, calories or 0, protein or 0, carbs or 0, fats or 0)
+    array.sort(order='name')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(array)
+
+
+class NutrientStore:
+    """
+    Per-process handle on the shared store file. Safe to create at import time: the file
+    is only mapped on first use (i.e. after gunicorn forks).
+    """
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._array = None
+        self._inode = None
+        self._checked_at = 0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._array is not None and now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            self._array, self._inode = None, None
+            return
+        if inode != self._inode:
+            self._array = np.load(self.path, mmap_mode='r')
+            self._inode = inode
+
+    @property
+    def array(self):
+        """The mapped structured array (empty if the store has not been built)."""
+        self._refresh()
+        if self._array is None:
+            return np.empty(0, dtype=STORE_DTYPE)
+        return self._array
+
+    def __len__(self):
+        return len(self.array)
+
+    def index_of(self, name):
+        array = self.array
+        key = encode_name(name)
+        i = int(np.searchsorted(array['name'], key))
+        if i < len(array) and array['name'][i] == key:
+            return i
+        return None
+
+    def macros(self, rows):
+        """
+        (len(rows), 4) float32 matrix of calories/protein/carbs/fats for the given row indices.
+        """
+        array = self.array[np.asarray(rows, dtype=np.intp)]
+        return np.stack([array[field] for field in MACRO_FIELDS], axis=-1)
+
+    def lookup(self, name):
+        i = self.index_of(name)
+        if i is None:
+            return None
+        row = self.array[i]
+        return {"id": int(row['id']), "name": row['name'].decode('utf-8', 'ignore'),
+                **{field: float(row[field]) for field in MACRO_FIELDS}}
+
+
+nutrient_store = NutrientStore()
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Build the shared memory-mapped nutrient store.")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--path", default=STORE_PATH)
+    args = parser.parse_args()
+
+    with app.app_context():
+        print(f"Wrote {build_store(args.path)} ingredients to {args.path}")
@@ -0,0 +1,309 @@
+"""
+Monthly range partitioning, archival and chunked deletes for meal_log and weight_log.
+
+On PostgreSQL both tables are rebuilt once as `PARTITION BY RANGE (date)` tables with one
+partition per month plus a DEFAULT partition, so date-bounded queries only scan the months
+they touch and old months can be dropped without a table-wide DELETE or VACUUM.
+On SQLite (local development) the same maintenance commands fall back to plain SQL.
+
+Rows outside every monthly partition (dates before the migration's first month or beyond
+the created months) live in the DEFAULT partition; archival rolls those up and deletes them
+along with the expired months.
+
+Usage:
+    python partitioning.py migrate              # one-off conversion of the existing tables
+    python partitioning.py maintain             # create future partitions + archive old ones
+"""
+import os
+from datetime import date, datetime
+
+from sqlalchemy import bindparam, text
+
+from models import db, MealLog, WeightLog, User
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+RETENTION_MONTHS = int(os.getenv("LOG_RETENTION_MONTHS", 24))
+DELETE_CHUNK_SIZE = int(os.getenv("DELETE_CHUNK_SIZE", 5000))
+
+PARTITIONED_TABLES = ('meal_log', 'weight_log')
+
+# Per-day rollup of the rows matching {where}, written in the same transaction that removes
+# them. A day that already has a summary (an earlier run that stopped half way, or rows of
+# the same day archived from another partition) is merged into it, never duplicated.
+ARCHIVE_SQL = {
+    'meal_log': """
+        INSERT INTO meal_daily_summary (user_id, day, meal_count, calories, protein, carbs, fats)
+        SELECT user_id, DATE(date), COUNT(*), SUM(calories),
+               SUM(COALESCE(protein, 0)), SUM(COALESCE(carbs, 0)), SUM(COALESCE(fats, 0))
+        FROM {source}
+        WHERE {where}
+        GROUP BY user_id, DATE(date)
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            meal_count = meal_daily_summary.meal_count + excluded.meal_count,
+            calories = meal_daily_summary.calories + excluded.calories,
+            protein = meal_daily_summary.protein + excluded.protein,
+            carbs = meal_daily_summary.carbs + excluded.carbs,
+            fats = meal_daily_summary.fats + excluded.fats
+    """,
+    'weight_log': """
+        INSERT INTO weight_daily_summary (user_id, day, entries, avg_weight, min_weight, max_weight)
+        SELECT user_id, DATE(date), COUNT(*), AVG(weight), MIN(weight), MAX(weight)
+        FROM {source}
+        WHERE {where}
+        GROUP BY user_id, DATE(date)
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            entries = weight_daily_summary.entries + excluded.entries,
+            avg_weight = (weight_daily_summary.avg_weight * weight_daily_summary.entries
+                          + excluded.avg_weight * excluded.entries)
+                         / (weight_daily_summary.entries + excluded.entries),
+            min_weight = {least}(weight_daily_summary.min_weight, excluded.min_weight),
+            max_weight = {greatest}(weight_daily_summary.max_weight, excluded.max_weight)
+    """,
+}
+
+
+def is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+def add_months(d, months):
+    index = d.year * 12 + (d.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table, month):
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+def _parse_partition_month(table, name):
+    suffix = name[len(table) + 1:]
+    try:
+        return datetime.strptime(suffix, "y%Ym%m").date()
+    except ValueError:
+        return None
+
+def is_partitioned(table):
+    if not is_postgres():
+        return False
+    row = db.session.execute(text("""
+        SELECT 1 FROM pg_partitioned_table p
+        JOIN pg_class c ON c.oid = p.partrelid
+        WHERE c.relname = :table AND pg_table_is_visible(c.oid)
+    """), {"table": table}).first()
+    return row is not None
+
+def list_partitions(table):
+    """
+    Returns [(partition_name, month_start)] for the monthly partitions of a table, oldest first.
+    The DEFAULT partition is not included.
+    """
+    rows = db.session.execute(text("""
+        SELECT child.relname FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = :table AND pg_table_is_visible(parent.oid)
+    """), {"table": table}).scalars().all()
+
+    partitions = []
+    for name in rows:
+        month = _parse_partition_month(table, name)
+        if month:
+            partitions.append((name, month))
+    return sorted(partitions, key=lambda p: p[1])
+
+def _create_month_partition(table, month):
+    name = partition_name(table, month)
+    start, end = month, add_months(month, 1)
+    default = f"{table}_default"
+
+    # Rows that landed in the DEFAULT partition for this month have to be moved first,
+    # otherwise Postgres refuses to create the overlapping partition.
+    stray = db.session.execute(
+        text(f"SELECT 1 FROM {default} WHERE date >= :start AND date < :end LIMIT 1"),
+        {"start": start, "end": end}
+    ).first()
+
+    if stray:
+        db.session.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+
+    db.session.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    # Small, append-mostly partitions: vacuum them early and cheaply instead of
+    # letting one huge table accumulate dead tuples.
+    db.session.execute(text(
+        f"ALTER TABLE {name} SET (autovacuum_vacuum_scale_factor = 0.05, "
+        f"autovacuum_analyze_scale_factor = 0.02)"
+    ))
+
+    if stray:
+        db.session.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM {default} WHERE date >= :start AND date < :end RETURNING *
+            )
+            INSERT INTO {table} SELECT * FROM moved
+        """), {"start": start, "end": end})
+        db.session.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+
+def ensure_partitions(months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Creates the partitions for the current month and the next `months_ahead` months.
+    Safe to run repeatedly; does nothing on databases that are not partitioned.
+    """
+    created = []
+    current = month_start(datetime.utcnow())
+
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(table):
+            continue
+        existing = {month for _, month in list_partitions(table)}
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if month not in existing:
+                _create_month_partition(table, month)
+                created.append(partition_name(table, month))
+
+    db.session.commit()
+    return created
+
+def convert_to_partitioned(table, months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    One-off migration: rebuilds a plain table as a monthly-partitioned table, keeping
+    its rows, id sequence, foreign key and (user_id, date) index.
+    Returns False if the table is already partitioned.
+    """
+    if not is_postgres():
+        raise RuntimeError("Table partitioning requires PostgreSQL.")
+    if is_partitioned(table):
+        return False
+
+    legacy = f"{table}_legacy"
+    seq = db.session.execute(
+        text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}
+    ).scalar()
+
+    db.session.execute(text(f"UPDATE {table} SET date = now() WHERE date IS NULL"))
+    db.session.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    db.session.execute(text(
+        f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (date)"
+    ))
+    # The partition key has to be part of every unique constraint.
+    db.session.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, date)"))
+    db.session.execute(text(
+        f"ALTER TABLE {table} ADD FOREIGN KEY (user_id) REFERENCES users (id)"
+    ))
+    db.session.execute(text(f"CREATE INDEX ix_{table}_user_date ON {table} (user_id, date)"))
+    db.session.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+    oldest = db.session.execute(text(f"SELECT MIN(date) FROM {legacy}")).scalar()
+    month = month_start(oldest or datetime.utcnow())
+    last = add_months(month_start(datetime.utcnow()), months_ahead)
+    while month <= last:
+        _create_month_partition(table, month)
+        month = add_months(month, 1)
+
+    db.session.execute(text(f"INSERT INTO {table} SELECT * FROM {legacy}"))
+    if seq:
+        db.session.execute(text(f"ALTER SEQUENCE {seq} OWNED BY {table}.id"))
+    db.session.execute(text(f"DROP TABLE {legacy}"))
+    db.session.commit()
+    return True
+
+def _summarize(table, source, where, params):
+    """
+    Merges the rows of `source` matching `where` into the table's daily summary.
+    """
+    least, greatest = ("LEAST", "GREATEST") if is_postgres() else ("MIN", "MAX")
+    statement = text(ARCHIVE_SQL[table].format(source=source, where=where, least=least, greatest=greatest))
+    if "ids" in params:
+        statement = statement.bindparams(bindparam("ids", expanding=True))
+    db.session.execute(statement, params)
+
+def archive_old_data(retention_months=RETENTION_MONTHS, chunk_size=DELETE_CHUNK_SIZE):
+    """
+    Rolls every month older than the retention window up into per-day summaries
+    (meal_daily_summary / weight_daily_summary) and removes the raw rows.
+
+    On PostgreSQL each expired partition is aggregated, detached and dropped inside one
+    transaction, so no row-level DELETE or VACUUM is needed; expired rows in the DEFAULT
+    partition are aggregated and deleted in one more. Elsewhere the raw rows are aggregated
+    and deleted chunk by chunk, each chunk in its own transaction. Every transaction
+    summarizes exactly the rows it removes, so a run that fails half way can simply be re-run.
+    """
+    cutoff = add_months(month_start(datetime.utcnow()), -retention_months)
+    archived = []
+
+    for table in PARTITIONED_TABLES:
+        if is_partitioned(table):
+            for name, month in list_partitions(table):
+                if add_months(month, 1) > cutoff:
+                    break
+                _summarize(table, name, "date < :cutoff", {"cutoff": cutoff})
+                db.session.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                db.session.execute(text(f"DROP TABLE {name}"))
+                db.session.commit()
+                archived.append(name)
+
+            default = f"{table}_default"
+            _summarize(table, default, "date < :cutoff", {"cutoff": cutoff})
+            deleted = db.session.execute(text(f"DELETE FROM {default} WHERE date < :cutoff"), {"cutoff": cutoff}).rowcount
+            db.session.commit()
+            if deleted:
+                archived.append(f"{default} ({deleted} rows)")
+        else:
+            model = MealLog if table == 'meal_log' else WeightLog
+            deleted = delete_in_chunks(
+                model, model.date < cutoff, chunk_size=chunk_size,
+                before_delete=lambda ids, table=table: _summarize(table, table, "id IN :ids", {"ids": ids}),
+            )
+            if deleted:
+                archived.append(f"{table} ({deleted} rows)")
+
+    if archived:
+        # Raw history changed for everyone: invalidate all cached reads.
+        User.query.update({User.data_version: User.data_version + 1}, synchronize_session=False)
+        db.session.commit()
+
+    return archived
+
+def delete_in_chunks(model, *criteria, chunk_size=DELETE_CHUNK_SIZE, before_delete=None):
+    """
+    Deletes the rows of `model` matching `criteria` in primary-key batches, committing
+    after every batch so no single statement holds row locks for long. For offline jobs
+    only: a request must not commit part of its work (see unit_of_work.py).
+    `before_delete(ids)` runs in each batch's transaction before its rows are deleted.
+    Returns the number of deleted rows.
+    """
+    total = 0
+    while True:
+        ids = [row[0] for row in db.session.query(model.id).filter(*criteria).limit(chunk_size).all()]
+        if not ids:
+            break
+        if before_delete:
+            before_delete(ids)
+        model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        total += len(ids)
+    return total
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Partition maintenance for meal_log / weight_log.")
+    parser.add_argument("command", choices=["migrate", "maintain"])
+    parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    parser.add_argument("--retention-months", type=int, default=RETENTION_MONTHS)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        if args.command == "migrate":
+            for table in PARTITIONED_TABLES:
+                converted = convert_to_partitioned(table, args.months_ahead)
+                print(f"{table}: {'converted' if converted else 'already partitioned'}")
+        else:
+            print(f"Created partitions: {ensure_partitions(args.months_ahead) or 'none'}")
+            print(f"Archived: {archive_old_data(args.retention_months) or 'nothing'}")
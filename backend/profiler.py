@@ -0,0 +1,241 @@
+"""
+On-demand sampling profiler for individual requests.
+
+Enabled only when PROFILE_SECRET and/or PROFILE_SAMPLE_RATE are set; otherwise
+`init_profiling` registers nothing and requests pay no cost at all. A request is profiled
+when it sends `X-Profile: <PROFILE_SECRET>` or is picked by the sample rate (0..1).
+
+While a profiled request runs, a background thread snapshots its stack every
+PROFILE_INTERVAL_MS via sys._current_frames() (the request itself is not instrumented).
+When it finishes, three files named after the request go to PROFILE_DIR:
+
+    <id>.folded   folded stacks ("frame;frame;frame count"), flamegraph.pl / speedscope input
+    <id>.svg      a self-contained flamegraph
+    <id>.json     wall time split into SQL, outbound HTTP, AI (Gemini) and Python CPU
+
+The split is also returned in a Server-Timing header, with the id in X-Profile-Id.
+
+Under gevent workers (gunicorn.conf.py) requests are greenlets rather than threads, so the
+request greenlet's suspended frame is sampled instead; samples are then only taken while
+it waits on I/O, which makes the CPU share a lower bound.
+"""
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from html import escape
+
+from flask import g, request
+
+try:
+    from gevent import monkey as _gevent_monkey
+    import greenlet
+except ImportError:
+    _gevent_monkey = None
+
+PROFILE_SECRET = os.getenv("PROFILE_SECRET")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles"))
+
+# Checked in order: the first category whose marker appears anywhere in a sampled stack wins.
+CATEGORIES = (
+    ("ai", ("google/generativeai", "google/ai/generativelanguage")),
+    ("http", ("/requests/", "/urllib3/", "/http/client.py", "/google/auth/transport")),
+    ("sql", ("/sqlalchemy/engine/", "/sqlalchemy/pool/", "/psycopg2/", "/sqlite3/")),
+)
+CPU = "cpu"
+
+
+class RequestProfile:
+    def __init__(self, endpoint):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint or 'unknown'}-{uuid.uuid4().hex[:6]}"
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+        self.categories = Counter()
+
+    def add(self, frame):
+        names, files = [], []
+        while frame is not None:
+            code = frame.f_code
+            files.append(code.co_filename.replace(os.sep, "/"))
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(names))] += 1
+
+        category = next((name for name, markers in CATEGORIES
+                         if any(m in f for f in files for m in markers)), CPU)
+        self.categories[category] += 1
+
+
+def _current_task():
+    """
+    The running greenlet when gevent has patched threading, else the thread id.
+    """
+    if _gevent_monkey is not None and _gevent_monkey.is_module_patched("threading"):
+        return greenlet.getcurrent()
+    return threading.get_ident()
+
+def _task_frame(task, frames):
+    if isinstance(task, int):
+        return frames.get(task)
+    return task.gr_frame
+
+
+class _Sampler:
+    """
+    One daemon thread sampling every thread (or greenlet) that currently has a profile attached.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.targets = {}
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread = None
+
+    def attach(self, task, profile):
+        with self._lock:
+            self.targets[task] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._active.set()
+
+    def detach(self, task):
+        with self._lock:
+            self.targets.pop(task, None)
+            if not self.targets:
+                self._active.clear()
+
+    def _run(self):
+        me = _current_task()
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                targets = list(self.targets.items())
+            for task, profile in targets:
+                frame = _task_frame(task, frames) if task != me else None
+                if frame is not None:
+                    profile.add(frame)
+
+
+_sampler = _Sampler(PROFILE_INTERVAL_MS / 1000)
+
+
+def _wants_profile():
+    if PROFILE_SECRET and hmac.compare_digest(request.headers.get("X-Profile", ""), PROFILE_SECRET):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def summarize(profile, wall_seconds):
+    """
+    Wall time split by category, proportional to each category's share of the samples.
+    """
+    total = sum(profile.categories.values())
+    split = {}
+    for name in ("sql", "http", "ai", CPU):
+        share = profile.categories[name] / total if total else 0
+        split[name] = {"ms": round(wall_seconds * share * 1000, 1), "percent": round(share * 100, 1)}
+    return {"wall_ms": round(wall_seconds * 1000, 1), "samples": total, "split": split}
+
+def render_flamegraph(stacks, title="", width=1200, row_height=16):
+    """
+    A minimal static SVG flamegraph (root at the bottom) from folded-stack counts.
+    """
+    root = {"count": 0, "children": {}}
+    for stack, count in stacks.items():
+        node = root
+        node["count"] += count
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"count": 0, "children": {}})
+            node["count"] += count
+
+    def depth(node):
+        return 1 + max((depth(c) for c in node["children"].values()), default=0)
+
+    levels = depth(root)
+    height = (levels + 2) * row_height
+    total = root["count"] or 1
+    rects = []
+
+    def layout(node, name, x, level):
+        w = width * node["count"] / total
+        if w < 0.5:
+            return
+        y = height - (level + 1) * row_height
+        hue = 20 + (hash(name) % 40)
+        label = escape(name)
+        text = escape(name[:int(w / 7)]) if w > 30 else ""
+        rects.append(
+            f'<g><title>{label} ({node["count"]} samples, {100 * node["count"] / total:.1f}%)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" fill="hsl({hue},85%,60%)"/>'
+            f'<text x="{x + 3:.1f}" y="{y + row_height - 4}" font-size="11" font-family="monospace">{text}</text></g>'
+        )
+        for child_name, child in sorted(node["children"].items()):
+            layout(child, child_name, x, level + 1)
+            x += width * child["count"] / total
+
+    layout(root, "all", 0, 0)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">'
+            f'<text x="4" y="14" font-size="13" font-family="sans-serif">{escape(title)}</text>'
+            + "".join(rects) + "</svg>")
+
+def write_profile(profile, summary):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, profile.id)
+    with open(base + ".folded", "w") as f:
+        for stack, count in profile.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    with open(base + ".svg", "w") as f:
+        f.write(render_flamegraph(profile.stacks, f"{summary['method']} {summary['path']} - {summary['wall_ms']} ms"))
+    with open(base + ".json", "w") as f:
+        json.dump(summary, f, indent=2)
+
+
+def _start_profile():
+    if not _wants_profile():
+        return
+    g._profile = RequestProfile(request.endpoint)
+    _sampler.attach(_current_task(), g._profile)
+
+def _finish_profile(response):
+    profile = g.pop("_profile", None)
+    if profile is None:
+        return response
+    _sampler.detach(_current_task())
+
+    summary = summarize(profile, time.perf_counter() - profile.started)
+    summary.update(id=profile.id, method=request.method, path=request.path,
+                   endpoint=request.endpoint, status=response.status_code)
+    try:
+        write_profile(profile, summary)
+    except OSError as e:
+        print(f"Profiler: could not write {profile.id}: {e}")
+
+    response.headers["X-Profile-Id"] = profile.id
+    response.headers["Server-Timing"] = ", ".join(
+        f"{name};dur={part['ms']}" for name, part in summary["split"].items()
+    )
+    return response
+
+def _discard_profile(exc=None):
+    if g.pop("_profile", None) is not None:
+        _sampler.detach(_current_task())
+
+def init_profiling(app):
+    """
+    Register the profiling hooks, only if profiling is configured.
+    """
+    if not PROFILE_SECRET and PROFILE_SAMPLE_RATE <= 0:
+        return False
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_discard_profile)
+    return True
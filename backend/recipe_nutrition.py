@@ -0,0 +1,141 @@
+"""
+Vectorized recipe nutrition: combines RecipeIngredient amounts with the per-unit macros on
+Ingredient and stores the totals on Recipe (total_calories/protein/carbs/fats).
+
+All recipe-ingredient links are loaded as three flat arrays and turned into a sparse
+recipes x ingredients amount matrix A; with M the ingredients x 4 macro matrix, every
+recipe's totals are the single product A @ M.
+
+Recipes are recomputed incrementally whenever an Ingredient's macros change (see the
+session hooks at the bottom), and in bulk with:
+    python recipe_nutrition.py recompute
+"""
+import numpy as np
+from scipy import sparse
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from models import db, Recipe, Ingredient, RecipeIngredient
+
+MACRO_COLUMNS = ('calories_per_unit', 'protein_per_unit', 'carbs_per_unit', 'fats_per_unit')
+TOTAL_COLUMNS = ('total_calories', 'total_protein', 'total_carbs', 'total_fats')
+UPDATE_BATCH_SIZE = 5000
+
+
+def _load_links(recipe_ids=None):
+    query = db.session.query(RecipeIngredient.recipe_id, RecipeIngredient.ingredient_id, RecipeIngredient.amount)
+    if recipe_ids is not None:
+        query = query.filter(RecipeIngredient.recipe_id.in_(recipe_ids))
+    rows = query.all()
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float64)
+
+    recipe_col, ingredient_col, amount_col = zip(*rows)
+    return (np.fromiter(recipe_col, np.int64, len(rows)),
+            np.fromiter(ingredient_col, np.int64, len(rows)),
+            np.array([a or 0 for a in amount_col], dtype=np.float64))
+
+def _load_macros(ingredient_ids):
+    """
+    Returns (sorted ingredient ids, macro matrix, known mask). An ingredient counts as
+    "known" when it has any non-zero macro; placeholder rows created from Spoonacular
+    ingredient lists are all zeros.
+    """
+    rows = db.session.query(Ingredient.id, *[getattr(Ingredient, c) for c in MACRO_COLUMNS])\
+        .filter(Ingredient.id.in_(ingredient_ids.tolist())).all()
+    rows.sort(key=lambda r: r[0])
+
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    macros = np.array([[v or 0 for v in r[1:]] for r in rows], dtype=np.float64).reshape(-1, len(MACRO_COLUMNS))
+    return ids, macros, macros.any(axis=1)
+
+def compute_recipe_macros(recipe_ids=None):
+    """Compute macro totals for recipes from their ingredients in one sparse product.
+
+    Args:
+        recipe_ids: Recipes to compute, or None for every recipe with ingredients.
+
+    Returns:
+        tuple: (recipe ids, totals matrix of shape (n, 4), complete mask) where `complete`
+        is True when every ingredient of the recipe has nutrition data.
+    """
+    link_recipes, link_ingredients, amounts = _load_links(recipe_ids)
+    if len(link_recipes) == 0:
+        return np.empty(0, np.int64), np.empty((0, len(MACRO_COLUMNS))), np.empty(0, bool)
+
+    recipes, recipe_rows = np.unique(link_recipes, return_inverse=True)
+    ingredient_ids, macros, known = _load_macros(np.unique(link_ingredients))
+    ingredient_cols = np.searchsorted(ingredient_ids, link_ingredients)
+
+    amount_matrix = sparse.csr_matrix(
+        (amounts, (recipe_rows, ingredient_cols)),
+        shape=(len(recipes), len(ingredient_ids))
+    )
+    totals = amount_matrix @ macros
+
+    unknown_links = (~known[ingredient_cols]).astype(np.int64)
+    complete = np.bincount(recipe_rows, weights=unknown_links, minlength=len(recipes)) == 0
+    return recipes, np.round(totals, 1), complete
+
+def recompute_recipes(recipe_ids=None):
+    """
+    Compute and persist totals. Recipes whose ingredients are not all known keep the
+    totals they already have (e.g. Spoonacular's), unless they have none yet.
+    Returns the number of recipes updated.
+    """
+    recipes, totals, complete = compute_recipe_macros(recipe_ids)
+    if len(recipes) == 0:
+        return 0
+
+    existing = dict(db.session.query(Recipe.id, Recipe.total_calories)
+                    .filter(Recipe.id.in_(recipes.tolist())).all())
+
+    params = [
+        {"id": int(recipe_id), **{col: float(v) for col, v in zip(TOTAL_COLUMNS, row)}}
+        for recipe_id, row, is_complete in zip(recipes, totals, complete)
+        if is_complete or not existing.get(int(recipe_id))
+    ]
+    for start in range(0, len(params), UPDATE_BATCH_SIZE):
+        db.session.execute(update(Recipe), params[start:start + UPDATE_BATCH_SIZE])
+    return len(params)
+
+def recompute_for_ingredients(ingredient_ids):
+    recipe_ids = [r[0] for r in db.session.query(RecipeIngredient.recipe_id)
+                  .filter(RecipeIngredient.ingredient_id.in_(list(ingredient_ids))).distinct().all()]
+    if not recipe_ids:
+        return 0
+    return recompute_recipes(recipe_ids)
+
+# --- incremental updates ---
+
+@event.listens_for(Session, 'before_flush')
+def _track_ingredient_changes(session, flush_context, instances):
+    changed = session.info.setdefault('changed_ingredients', set())
+    for obj in session.dirty:
+        if isinstance(obj, Ingredient) and obj.id is not None:
+            state = db.inspect(obj)
+            if any(state.attrs[c].history.has_changes() for c in MACRO_COLUMNS):
+                changed.add(obj.id)
+
+@event.listens_for(Session, 'before_commit')
+def _recompute_changed_recipes(session):
+    session.flush()
+    changed = session.info.pop('changed_ingredients', None)
+    if changed:
+        recompute_for_ingredients(changed)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Recompute recipe nutrition from ingredient data.")
+    parser.add_argument("command", choices=["recompute"])
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        updated = recompute_recipes()
+        db.session.commit()
+        print(f"Updated {updated} recipes in {time.perf_counter() - started:.2f}s")
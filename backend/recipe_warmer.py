@@ -0,0 +1,159 @@
+"""
+Background pre-warming of AI recipes (Ingredient.recipe_json) for popular foods, so users
+hit the cache instead of waiting on Gemini inside search_food.
+
+Ingredients are ranked by how often they were logged (MealLog.meal_name) over the recent
+window; the top-N without a recipe are sent to Gemini several foods per prompt, under a
+requests-per-minute budget. The model is injectable: anything with a Gemini-style
+`generate_content(prompt, generation_config=...)` returning an object with `.text` works,
+which keeps local runs and tests off the network.
+
+Nothing schedules it: run it from cron (or a scheduled job on the host) next to the
+nightly batch_predictions.py, e.g. once a day.
+
+Usage:
+    python recipe_warmer.py [--top 200] [--batch-size 5] [--rpm 10] [--days 30]
+"""
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import google.generativeai as genai
+from sqlalchemy import func
+
+from models import db, Ingredient, MealLog
+
+WARM_TOP_N = int(os.getenv("RECIPE_WARM_TOP_N", 200))
+WARM_BATCH_SIZE = 5
+WARM_REQUESTS_PER_MINUTE = int(os.getenv("RECIPE_WARM_RPM", 10))
+WARM_WINDOW_DAYS = 30
+
+BATCH_PROMPT = """
+Write a simple cooking recipe for each of these foods: {foods}.
+Return ONLY a JSON object whose keys are exactly the food names given above and whose values
+are objects with keys: "description", "ingredients" (list), "instructions" (list), "prepTime", "cookTime".
+"""
+
+
+def popular_ingredients_without_recipe(limit=WARM_TOP_N, days=WARM_WINDOW_DAYS):
+    """
+    [(ingredient id, name, log count)] for the most-logged ingredients in the last `days`
+    that have no cached recipe yet, most popular first.
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    logs = db.session.query(
+        func.lower(MealLog.meal_name).label('name'), func.count(MealLog.id).label('uses')
+    ).filter(MealLog.date >= since).group_by(func.lower(MealLog.meal_name)).subquery()
+
+    return db.session.query(Ingredient.id, Ingredient.name, logs.c.uses)\
+        .join(logs, logs.c.name == func.lower(Ingredient.name))\
+        .filter(Ingredient.recipe_json.is_(None))\
+        .order_by(logs.c.uses.desc())\
+        .limit(limit).all()
+
+def _parse_batch(text, names):
+    """
+    Map each requested name to its recipe dict from the model's JSON reply (case-insensitive).
+    Foods missing from the reply are left out so they are retried on the next run.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        start, end = text.find('{'), text.rfind('}')
+        if start == -1 or end <= start:
+            return {}
+        try:
+            data = json.loads(text[start:end + 1])
+        except ValueError:
+            return {}
+    if not isinstance(data, dict):
+        return {}
+
+    by_lower = {str(k).lower(): v for k, v in data.items()}
+    return {name: by_lower[name.lower()] for name in names
+            if isinstance(by_lower.get(name.lower()), dict)}
+
+class RateBudget:
+    """
+    Spaces calls at least 60/rpm seconds apart.
+    """
+    def __init__(self, requests_per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0
+        self.clock = clock
+        self.sleep = sleep
+        self._next = 0
+
+    def wait(self):
+        now = self.clock()
+        if now < self._next:
+            self.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+def warm_recipes(top_n=WARM_TOP_N, batch_size=WARM_BATCH_SIZE, requests_per_minute=WARM_REQUESTS_PER_MINUTE,
+                 days=WARM_WINDOW_DAYS, model=None, budget=None):
+    """Generate and cache recipes for the most popular ingredients that lack one.
+
+    Args:
+        top_n: How many popular ingredients to consider.
+        batch_size: Foods per Gemini prompt.
+        requests_per_minute: Rate budget for model calls.
+        days: Popularity window.
+        model: Gemini-compatible model; defaults to gemini-2.5-flash.
+        budget: RateBudget to use (defaults to one built from requests_per_minute).
+
+    Returns:
+        dict: counts of candidates, recipes stored, failed foods and model requests made.
+    """
+    candidates = popular_ingredients_without_recipe(top_n, days)
+    result = {"candidates": len(candidates), "warmed": 0, "failed": 0, "requests": 0}
+    if not candidates:
+        return result
+
+    model = model or genai.GenerativeModel('gemini-2.5-flash')
+    budget = budget or RateBudget(requests_per_minute)
+
+    for start in range(0, len(candidates), batch_size):
+        batch = candidates[start:start + batch_size]
+        names = [name for _, name, _ in batch]
+
+        budget.wait()
+        result["requests"] += 1
+        try:
+            response = model.generate_content(
+                BATCH_PROMPT.format(foods=json.dumps(names)),
+                generation_config={"response_mime_type": "application/json"}
+            )
+            recipes = _parse_batch(response.text, names)
+        except Exception as e:
+            print(f"Recipe warmer: model error for {names}: {e}")
+            recipes = {}
+
+        for ingredient_id, name, _ in batch:
+            if name in recipes:
+                db.session.query(Ingredient).filter(Ingredient.id == ingredient_id)\
+                    .update({Ingredient.recipe_json: recipes[name]}, synchronize_session=False)
+                result["warmed"] += 1
+            else:
+                result["failed"] += 1
+        db.session.commit()
+
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Pre-generate AI recipes for popular ingredients.")
+    parser.add_argument("--top", type=int, default=WARM_TOP_N)
+    parser.add_argument("--batch-size", type=int, default=WARM_BATCH_SIZE)
+    parser.add_argument("--rpm", type=int, default=WARM_REQUESTS_PER_MINUTE)
+    parser.add_argument("--days", type=int, default=WARM_WINDOW_DAYS)
+    args = parser.parse_args()
+
+    with app.app_context():
+        result = warm_recipes(args.top, args.batch_size, args.rpm, args.days)
+        print(f"Warmed {result['warmed']} of {result['candidates']} ingredients "
+              f"in {result['requests']} requests ({result['failed']} failed).")
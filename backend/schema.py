@@ -0,0 +1,78 @@
+"""
+Lightweight in-place schema upgrades for databases created before a column existed.
+
+db.create_all() only creates missing tables, so columns added to existing models are
+listed here and added with ALTER TABLE when absent (likewise for their indexes). A
+SQLite meal_log created without AUTOINCREMENT is rebuilt with it.
+"""
+from sqlalchemy import inspect, text
+
+from models import db, MealLog
+
+# (table, column, DDL type/default)
+ADDED_COLUMNS = [
+    ('users', 'data_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('recipe', 'total_protein', 'FLOAT'),
+    ('recipe', 'total_carbs', 'FLOAT'),
+    ('recipe', 'total_fats', 'FLOAT'),
+    ('users', 'meal_log_seq', 'INTEGER NOT NULL DEFAULT 0'),
+    ('meal_log', 'change_seq', 'INTEGER'),
+    ('users', 'token_version', 'INTEGER NOT NULL DEFAULT 0'),
+]
+
+# (index name, table, columns) for indexes on tables that may predate them
+ADDED_INDEXES = [
+    ('ix_meal_log_user_change_seq', 'meal_log', 'user_id, change_seq'),
+]
+
+# Same, PostgreSQL only (operator classes)
+ADDED_POSTGRES_INDEXES = [
+    ('ix_fdc_food_search_name_pattern', 'fdc_food', 'search_name text_pattern_ops'),
+]
+
+
+def upgrade_schema():
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    added = []
+
+    for table, column, ddl in ADDED_COLUMNS:
+        if table not in tables:
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table)}
+        if column not in existing:
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            added.append(f"{table}.{column}")
+
+    for name, table, columns in ADDED_INDEXES:
+        if table in tables:
+            db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+    if db.engine.dialect.name == 'postgresql':
+        for name, table, columns in ADDED_POSTGRES_INDEXES:
+            if table in tables:
+                db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+    if db.engine.dialect.name == 'sqlite' and 'meal_log' in tables and not _has_autoincrement('meal_log'):
+        _rebuild_with_autoincrement(MealLog.__table__)
+        added.append("meal_log AUTOINCREMENT")
+
+    db.session.commit()
+    return added
+
+def _has_autoincrement(table):
+    sql = db.session.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :t"),
+                             {"t": table}).scalar()
+    return 'AUTOINCREMENT' in (sql or '').upper()
+
+def _rebuild_with_autoincrement(table):
+    """
+    SQLite can't add AUTOINCREMENT in place: copy the rows into a freshly created table.
+    """
+    legacy = f"{table.name}_legacy"
+    columns = ", ".join(c.name for c in table.columns)
+    db.session.execute(text(f"ALTER TABLE {table.name} RENAME TO {legacy}"))
+    for index in table.indexes:
+        db.session.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    table.create(db.session.connection())
+    db.session.execute(text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {legacy}"))
+    db.session.execute(text(f"DROP TABLE {legacy}"))
@@ -4,13 +4,20 @@ import os
 import re
 import google.generativeai as genai
 from dotenv import load_dotenv 
-from models import Recipe, db, Ingredient, RecipeIngredient, WeightLog, User, UserStats
+from models import Recipe, db, Ingredient, RecipeIngredient, WeightLog, User, UserStats, MealLog, MealLogTombstone
+from fdc_ingest import lookup_local_food
+from food_estimator import food_estimator, CONFIDENT_MATCH
+from calculations import calorie_target
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 from sklearn.linear_model import LinearRegression
 import numpy as np
 import pandas as pd
 from datetime import timedelta, datetime
+from sqlalchemy import func, select
+from functools import partial
+from deadlines import http_timeout, gemini_request_options
+from unit_of_work import commit_or_flush, has_unsaved_writes
 load_dotenv() 
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
@@ -18,9 +25,30 @@ spoonacular_api_key = os.getenv("SPOONACULAR_API_KEY")
 usda_api_key = os.getenv("usda_api_key")
 GOOGLE_API_KEY = os.getenv("gemini_key")
 
+# External API locations; overridable so benchmarks can point them at local stubs.
+USDA_API_URL = os.getenv("USDA_API_URL", "https://api.nal.usda.gov")
+SPOONACULAR_API_URL = os.getenv("SPOONACULAR_API_URL", "https://api.spoonacular.com")
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL")
+
 # CONFIGURE AI ---
 if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
+    if GEMINI_API_ENDPOINT:
+        genai.configure(api_key=GOOGLE_API_KEY, transport="rest",
+                        client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+    else:
+        genai.configure(api_key=GOOGLE_API_KEY)
+
+def release_db_connection():
+    """
+    Ends the session's read-only transaction so its pooled connection goes back to the pool
+    before a slow external call (a request waiting on Gemini or USDA shouldn't hold one of
+    the few connections the fast routes need). Loaded objects stay usable and refresh on
+    next access. Does nothing while the session has uncommitted changes (a unit of work
+    must not be committed halfway).
+    """
+    if not has_unsaved_writes(db.session):
+        db.session.commit()
 
 def generate_ai_recipe(food_name):
     """
@@ -41,7 +69,8 @@ def generate_ai_recipe(food_name):
         If you cannot use JSON, just write the recipe in plain text.
         """
         
-        response = model.generate_content(prompt)
+        release_db_connection()
+        response = model.generate_content(prompt, request_options=gemini_request_options())
         text_output = response.text
 
         try:
@@ -57,20 +86,72 @@ def generate_ai_recipe(food_name):
         print(f"!!! AI API CRITICAL ERROR: {e}")
         return "Recipe currently unavailable due to API connection issue."
 
+def _attach_ai_recipe(meal_data):
+    print(f"Fetching recipe for: {meal_data['meal_name']}...") 
+    ai_recipe = generate_ai_recipe(meal_data['meal_name'])
+    
+    if isinstance(ai_recipe, dict):
+        meal_data["recipe"] = ai_recipe
+        meal_data["ingredients"] = ai_recipe.get("ingredients", [])
+        meal_data["description"] = ai_recipe.get("description", "USDA Food Item")
+    else:
+        meal_data["recipe"] = ai_recipe 
+        meal_data["ingredients"] = [] 
+        meal_data["description"] = "USDA Food Item"
+    return meal_data
+
+def _estimated_meal(food_item, estimate):
+    """
+    Meal data for a food resolved by the local estimator. The user's own name is kept (the
+    estimate may come from a differently spelled ingredient) with the match it came from.
+    """
+    return _attach_ai_recipe({
+        "meal_name": food_item,
+        "protein": estimate["protein"],
+        "fats": estimate["fats"],
+        "carbs": estimate["carbs"],
+        "calories": estimate["calories"],
+        "image": None,
+        "estimated_from": estimate["name"],
+        "confidence": estimate["confidence"],
+    })
+
 def fetch_nutritional_data(food_item):
     """
-    Fetch nutritional data from USDA API and append AI Recipe.
+    Fetch nutritional data (local FDC index first, then the USDA API, with the local
+    nearest-neighbour estimate for close matches and USDA misses) and append AI Recipe.
     """
-    base_url = "https://api.nal.usda.gov/fdc/v1/foods/search"
+    base_url = f"{USDA_API_URL}/fdc/v1/foods/search"
     
     assert isinstance(food_item, str), "Food item must be a string"
+
+    local = lookup_local_food(food_item)
+    if local:
+        return _attach_ai_recipe({
+            "meal_name": local.description,
+            "protein": local.protein or 0,
+            "fats": local.fats or 0,
+            "carbs": local.carbs or 0,
+            "calories": local.calories or 0,
+            "image": None,
+            "fdc_id": local.fdc_id,
+        }), 200
+
+    estimate = food_estimator.estimate(food_item)
+    if estimate and estimate["confidence"] >= CONFIDENT_MATCH:
+        return _estimated_meal(food_item, estimate), 200
+
+    timeout = http_timeout()
     try:
         url = f"{base_url}?query={food_item}&pageSize=1&api_key={usda_api_key}"
-        response = requests.get(url)
+        release_db_connection()
+        response = requests.get(url, timeout=timeout)
         
         if response.status_code == 200:
             data = response.json()
             if not data.get('foods'):
+                if estimate:
+                    return _estimated_meal(food_item, estimate), 200
                 return {"meal_name": food_item, "calories": 0, "protein": 0, "fats": 0, "carbs": 0}, 404
                 
             food_nutrients = data['foods'][0]['foodNutrients']
@@ -92,23 +173,11 @@ def fetch_nutritional_data(food_item):
                 "image": None, 
             }
 
-            print(f"Fetching recipe for: {meal_name}...") 
-            ai_recipe = generate_ai_recipe(meal_name)
-            
-            if isinstance(ai_recipe, dict):
-                meal_data["recipe"] = ai_recipe
-                meal_data["ingredients"] = ai_recipe.get("ingredients", [])
-                meal_data["description"] = ai_recipe.get("description", "USDA Food Item")
-            else:
-                meal_data["recipe"] = ai_recipe 
-                meal_data["ingredients"] = [] 
-                meal_data["description"] = "USDA Food Item"
-
-            return meal_data, 200
+            return _attach_ai_recipe(meal_data), 200
         else:
             print(f"USDA API Error: {response.status_code}") 
             return {"error": "Failed to fetch data from USDA API"}, response.status_code
-    except Exception as e:
+    except (requests.RequestException, KeyError, IndexError, ValueError) as e:
         print(f"Exception in service: {e}") 
         return {"error": str(e)}, 500
 
@@ -135,7 +204,7 @@ def get_recipe_with_cache(recipe_id, source='local'):
         for ing in api_data['ingredients']:
             _link_ingredient_to_recipe(new_recipe.id, ing)
             
-        db.session.commit()
+        commit_or_flush()
         return new_recipe 
 
     return Recipe.query.get(recipe_id)
@@ -178,14 +247,16 @@ def _fetch_from_spoonacular_api(spoonacular_id):
         dict or None: A dictionary containing the recipe title, servings, instructions, calories, and ingredients, or None if the request fails.
     """
     
-    url = f"https://api.spoonacular.com/recipes/{spoonacular_id}/information"
+    url = f"{SPOONACULAR_API_URL}/recipes/{spoonacular_id}/information"
     params = {
         "apiKey": spoonacular_api_key,
         "includeNutrition": "true"
     }
 
+    timeout = http_timeout()
     try:
-        response = requests.get(url, params=params)
+        release_db_connection()
+        response = requests.get(url, params=params, timeout=timeout)
         response.raise_for_status() 
         data = response.json()
         steps = []
@@ -225,30 +296,45 @@ def format_recipe_with_servings(recipe, requested_servings):
     #couldn't get this to work :(
     ratio = float(requested_servings) / recipe.base_servings
 
-    adjusted_ingredients = []
-    for ri in recipe.recipe_ingredients: 
-        adjusted_ingredients.append({
-            "name": ri.ingredient.name,
-            "original_amount": ri.amount,
-            "scaled_amount": round(ri.amount * ratio, 2),
-            "unit": ri.ingredient.unit
-        })
-        
+    # One joined query for the ingredient rows instead of lazy-loading each link and ingredient.
+    rows = db.session.execute(
+        select(Ingredient.name, RecipeIngredient.amount, Ingredient.unit)
+        .join(Ingredient, Ingredient.id == RecipeIngredient.ingredient_id)
+        .where(RecipeIngredient.recipe_id == recipe.id)
+        .order_by(RecipeIngredient.id)
+    )
+    adjusted_ingredients = [
+        {"name": name, "original_amount": amount, "scaled_amount": round(amount * ratio, 2), "unit": unit}
+        for name, amount, unit in rows
+    ]
+
     return {
         "title": recipe.title,
         "instructions": recipe.instructions,
         "current_servings": requested_servings,
-        "total_calories": round(recipe.total_calories * ratio, 1),
+        "total_calories": round((recipe.total_calories or 0) * ratio, 1),
+        "total_protein": round((recipe.total_protein or 0) * ratio, 1),
+        "total_carbs": round((recipe.total_carbs or 0) * ratio, 1),
+        "total_fats": round((recipe.total_fats or 0) * ratio, 1),
         "ingredients": adjusted_ingredients
     }
     
 def verify_google_token(token):
+    transport = partial(google_requests.Request(), timeout=http_timeout())
     try:
-        id_info = id_token.verify_oauth2_token(
-            token, 
-            google_requests.Request(), 
-            GOOGLE_CLIENT_ID
-        )
+        if GOOGLE_CERTS_URL:
+            id_info = id_token.verify_token(
+                token,
+                transport,
+                GOOGLE_CLIENT_ID,
+                certs_url=GOOGLE_CERTS_URL
+            )
+        else:
+            id_info = id_token.verify_oauth2_token(
+                token, 
+                transport, 
+                GOOGLE_CLIENT_ID
+            )
 
         return {
             "google_id": id_info['sub'],
@@ -271,7 +357,7 @@ def search_recipes_spoonacular(query):
     Returns:
         list[dict]: A list of recipe dictionaries with identifiers, nutrition estimates, serving info, and structured recipe details.
     """
-    url = "https://api.spoonacular.com/recipes/complexSearch"
+    url = f"{SPOONACULAR_API_URL}/recipes/complexSearch"
     params = {
         "apiKey": spoonacular_api_key, 
         "query": query,
@@ -281,8 +367,9 @@ def search_recipes_spoonacular(query):
         "instructionsRequired": "true"
     }
     
+    timeout = http_timeout()
     try:
-        response = requests.get(url, params=params)
+        response = requests.get(url, params=params, timeout=timeout)
         if response.status_code != 200:
             return []
             
@@ -333,34 +420,92 @@ def search_recipes_spoonacular(query):
         print(f"Spoonacular Error: {e}")
         return []
 
-def recalculate_calorie_target(stats):
+def serialize_stats(stats):
+    return {
+        "weight": stats.weight, "height": stats.height, "age": stats.age,
+        "bmi": stats.bmi, "activity_level": stats.activity_level,
+        "target": stats.calorie_target, "calorie_target": stats.calorie_target,
+        "target_weight": stats.target_weight, "updated_at": stats.updated_at
+    }
+
+def serialize_meal(meal):
+    return {
+        "id": meal.id, "meal_name": meal.meal_name, "protein": meal.protein,
+        "fats": meal.fats, "carbs": meal.carbs, "calories": meal.calories,
+        "date": meal.date.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+MEAL_ROW_KEYS = ("id", "meal_name", "protein", "fats", "carbs", "calories", "date")
+
+def sql_datetime_text(column):
     """
-    Mifflin-St Jeor Equation + Goal Adjustment
+    `column` formatted as "YYYY-MM-DD HH:MM:SS" by the database (the format serialize_meal uses).
     """
-    if stats.gender == 'male':
-        bmr = (10 * stats.weight) + (6.25 * stats.height) - (5 * stats.age) + 5
-    else:
-        bmr = (10 * stats.weight) + (6.25 * stats.height) - (5 * stats.age) - 161
+    if db.engine.dialect.name == 'postgresql':
+        return func.to_char(column, 'YYYY-MM-DD HH24:MI:SS')
+    return func.strftime('%Y-%m-%d %H:%M:%S', column)
 
-    multipliers = {
-        "sedentary": 1.2,
-        "light": 1.375,
-        "moderate": 1.55,
-        "active": 1.725
-    }
-    tdee = bmr * multipliers.get(stats.activity_level, 1.2)
-    
-    if stats.target_weight:
-        if stats.target_weight < stats.weight:
-            target = tdee - 500  
-        elif stats.target_weight > stats.weight:
-            target = tdee + 500  
-        else:
-            target = tdee 
-    else:
-        target = tdee
+def meal_log_rows(*criteria, order_by=None):
+    """Serialized meal log entries, built straight from row tuples.
+
+    Same output as serialize_meal, without loading ORM objects: only the needed columns
+    are selected and the date is formatted in SQL.
+
+    Args:
+        *criteria: Filter expressions on MealLog.
+        order_by: Ordering (newest first by default).
+
+    Returns:
+        list[dict]: one dict per entry.
+    """
+    query = select(MealLog.id, MealLog.meal_name, MealLog.protein, MealLog.fats, MealLog.carbs,
+                   MealLog.calories, sql_datetime_text(MealLog.date))\
+        .where(*criteria)\
+        .order_by(MealLog.date.desc() if order_by is None else order_by)
+    return [dict(zip(MEAL_ROW_KEYS, row)) for row in db.session.execute(query)]
+
+def get_meal_log_changes(user_id, since=0):
+    """Meal log entries written and deleted after change sequence `since`.
+
+    Args:
+        user_id: The user whose log is synced.
+        since: The `seq` from the client's previous sync (0 for a full sync).
+
+    Returns:
+        dict or None: the current seq, upserted entries, deleted entry ids, and `reset`
+        (True when the client must replace its copy with `upserts`); None if the user
+        does not exist.
+    """
+    # Read the sequence first: anything committed afterwards is picked up next time.
+    current = db.session.query(User.meal_log_seq).filter_by(id=user_id).scalar()
+    if current is None:
+        return None
+
+    reset = since <= 0 or since > current or db.session.query(MealLogTombstone.id).filter(
+        MealLogTombstone.user_id == user_id,
+        MealLogTombstone.meal_log_id.is_(None),
+        MealLogTombstone.change_seq > since
+    ).first() is not None
+
+    if reset:
+        return {"seq": current, "reset": True, "upserts": meal_log_rows(MealLog.user_id == user_id), "deletes": []}
 
-    return int(target)
+    meals = meal_log_rows(
+        MealLog.user_id == user_id, MealLog.change_seq > since, MealLog.change_seq <= current,
+        order_by=MealLog.change_seq
+    )
+    deleted = db.session.query(MealLogTombstone.meal_log_id).filter(
+        MealLogTombstone.user_id == user_id,
+        MealLogTombstone.change_seq > since, MealLogTombstone.change_seq <= current
+    ).all()
+    return {"seq": current, "reset": False, "upserts": meals, "deletes": [row[0] for row in deleted]}
+
+def recalculate_calorie_target(stats):
+    """
+    Mifflin-St Jeor Equation + Goal Adjustment (see calculations.calorie_target)
+    """
+    return calorie_target(stats.weight, stats.height, stats.age, stats.gender,
+                          stats.activity_level, target_weight=stats.target_weight)
 
 def log_user_weight(user_id, new_weight):
     user = User.query.get(user_id)
@@ -378,10 +523,16 @@ def log_user_weight(user_id, new_weight):
         stats.calorie_target = new_target
         stats.updated_at = datetime.now()
     
-    db.session.commit()
+    commit_or_flush()
     return {"new_weight": new_weight, "new_target": new_target}
 
 #-----------COOLEST PART----->>>SK-LEARN--------------#
+PREDICTION_MESSAGES = {
+    "insufficient_data": "Log weight for at least 2 days to see prediction.",
+    "stalled": "Weight is stable.",
+    "wrong_direction": "Moving away from goal.",
+}
+
 def predict_goal_date(user_id):
     """Estimate when a user will reach their target weight based on logged progress.
 
@@ -394,19 +545,40 @@ def predict_goal_date(user_id):
         dict: A status dictionary describing whether data is sufficient, progress is stalled or going in the wrong direction, or a successful prediction with days needed, predicted date, and trend slope.
     """
 
-    logs = WeightLog.query.filter_by(user_id=user_id).order_by(WeightLog.date.asc()).all()
+    history = db.session.query(WeightLog.date, WeightLog.weight)\
+        .filter_by(user_id=user_id).order_by(WeightLog.date.asc()).all()
     stats = UserStats.query.filter_by(user_id=user_id).order_by(UserStats.updated_at.desc()).first()
-    
-    if len(logs) < 2 or not stats or not stats.target_weight:
-        return {"status": "insufficient_data", "message": "Log weight for at least 2 days to see prediction."}
+
+    return predict_from_weight_history(
+        history,
+        stats.weight if stats else None,
+        stats.target_weight if stats else None
+    )
+
+def predict_from_weight_history(history, current_weight, goal):
+    """Fit the weight trend for an already-loaded history of (date, weight) pairs.
+
+    Split out of predict_goal_date so callers that have fetched the rows themselves
+    (e.g. the dashboard) don't query them twice.
+
+    Args:
+        history: (date, weight) tuples sorted by date ascending.
+        current_weight: The user's latest recorded weight.
+        goal: The user's target weight.
+
+    Returns:
+        dict: The same status dictionary returned by predict_goal_date.
+    """
+    if len(history) < 2 or current_weight is None or not goal:
+        return {"status": "insufficient_data", "message": PREDICTION_MESSAGES["insufficient_data"]}
 
     data = {'days': [], 'weight': []}
-    start_date = logs[0].date
+    start_date = history[0][0]
     
-    for log in logs:
-        days_passed = (log.date - start_date).days
+    for log_date, weight in history:
+        days_passed = (log_date - start_date).days
         data['days'].append(days_passed)
-        data['weight'].append(log.weight)
+        data['weight'].append(weight)
 
     df = pd.DataFrame(data)
     X = df[['days']]
@@ -416,14 +588,12 @@ def predict_goal_date(user_id):
     model.fit(X, y)
     
     slope = model.coef_[0] 
-    current_weight = stats.weight
-    goal = stats.target_weight
 
     if slope == 0:
-         return {"status": "stalled", "message": "Weight is stable."}
+         return {"status": "stalled", "message": PREDICTION_MESSAGES["stalled"]}
     
     if (goal < current_weight and slope > 0) or (goal > current_weight and slope < 0):
-         return {"status": "wrong_direction", "message": "Moving away from goal."}
+         return {"status": "wrong_direction", "message": PREDICTION_MESSAGES["wrong_direction"]}
 
     days_needed = (goal - current_weight) / slope
     days_needed = abs(days_needed)
@@ -0,0 +1,176 @@
+"""
+Bucketed time series for the statistics charts.
+
+Meal metrics are summed per day and then per bucket in SQL, over both the live meal_log
+rows and the daily rollups that archived months were reduced to (meal_daily_summary,
+see partitioning.py), so nothing row-level leaves the database. A bucket's value is the
+average daily total over the days that have entries, with the raw total alongside.
+When the requested span would exceed MAX_POINTS buckets, the bucket is widened
+(day -> week -> month) and the response says which one was used.
+
+Weight is averaged per bucket the same way (weight_log plus weight_daily_summary) and
+then reduced with Largest-Triangle-Three-Buckets to at most `points` points, which keeps
+the shape of the curve (plateaus, drops, outliers) at a fraction of the size.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import text
+
+from http_cache import utc_today
+from models import db
+
+METRICS = ("calories", "protein", "carbs", "fats", "weight")
+BUCKETS = ("day", "week", "month")
+BUCKET_DAYS = {"day": 1, "week": 7, "month": 30.44}
+DEFAULT_SPAN_DAYS = 90
+MAX_SPAN_DAYS = 20 * 366
+MAX_POINTS = 400
+DEFAULT_WEIGHT_POINTS = 300
+
+
+def _bucket_sql(bucket, column):
+    """
+    SQL for the first day of the bucket containing `column` (a date), as a date/ISO string.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return f"CAST(date_trunc('{bucket}', {column}) AS DATE)"
+    if bucket == "week":
+        # Weeks start on Monday, like date_trunc('week').
+        return f"DATE({column}, '-' || ((CAST(strftime('%w', {column}) AS INTEGER) + 6) % 7) || ' days')"
+    if bucket == "month":
+        return f"strftime('%Y-%m-01', {column})"
+    return column
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, date) else str(value)[:10]
+
+def _parse_range(start, end):
+    try:
+        end = date.fromisoformat(end) if end else utc_today()
+        start = date.fromisoformat(start) if start else end - timedelta(days=DEFAULT_SPAN_DAYS)
+    except ValueError:
+        raise ValueError("from/to must be dates (YYYY-MM-DD)")
+    if start > end:
+        raise ValueError("from must not be after to")
+    if (end - start).days > MAX_SPAN_DAYS:
+        raise ValueError(f"Range is limited to {MAX_SPAN_DAYS} days")
+    return start, end
+
+def _widen(bucket, start, end):
+    days = (end - start).days + 1
+    while days / BUCKET_DAYS[bucket] > MAX_POINTS and bucket != "month":
+        bucket = BUCKETS[BUCKETS.index(bucket) + 1]
+    return bucket
+
+def _range_params(user_id, start, end):
+    return {
+        "user_id": user_id,
+        "start": f"{start.isoformat()} 00:00:00", "end": f"{(end + timedelta(days=1)).isoformat()} 00:00:00",
+        "start_day": start.isoformat(), "end_day": (end + timedelta(days=1)).isoformat(),
+    }
+
+def _meal_series(user_id, metric, bucket, start, end):
+    rows = db.session.execute(text(f"""
+        SELECT {_bucket_sql(bucket, 'day')} AS bucket, SUM(total), COUNT(*)
+        FROM (
+            SELECT DATE(date) AS day, SUM(COALESCE({metric}, 0)) AS total
+            FROM meal_log
+            WHERE user_id = :user_id AND date >= :start AND date < :end
+            GROUP BY DATE(date)
+            UNION ALL
+            SELECT day, COALESCE({metric}, 0)
+            FROM meal_daily_summary
+            WHERE user_id = :user_id AND day >= :start_day AND day < :end_day
+        ) daily
+        GROUP BY 1
+        ORDER BY 1
+    """), _range_params(user_id, start, end))
+    return [{"t": _iso(t), "value": round(total / days, 1), "total": round(total, 1), "days": days}
+            for t, total, days in rows]
+
+def _weight_series(user_id, bucket, start, end):
+    rows = db.session.execute(text(f"""
+        SELECT {_bucket_sql(bucket, 'day')} AS bucket, SUM(weight_sum) / SUM(entries), SUM(entries)
+        FROM (
+            SELECT DATE(date) AS day, SUM(weight) AS weight_sum, COUNT(*) AS entries
+            FROM weight_log
+            WHERE user_id = :user_id AND date >= :start AND date < :end
+            GROUP BY DATE(date)
+            UNION ALL
+            SELECT day, avg_weight * entries, entries
+            FROM weight_daily_summary
+            WHERE user_id = :user_id AND day >= :start_day AND day < :end_day
+        ) daily
+        GROUP BY 1
+        ORDER BY 1
+    """), _range_params(user_id, start, end)).all()
+    return [_iso(t) for t, _, _ in rows], np.array([value for _, value, _ in rows], dtype=np.float64)
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of `threshold - 2` equal buckets in
+    between, the point forming the largest triangle with the previously kept point and the
+    average of the next bucket.
+
+    Args:
+        x: Increasing x values (e.g. days since the first point).
+        y: The values.
+        threshold: Number of points to keep.
+
+    Returns:
+        numpy.ndarray: indices of the kept points, increasing.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        areas = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(areas))
+        kept[i + 1] = a
+    return kept
+
+def stats_series(user_id, metric="calories", bucket="day", start=None, end=None, points=DEFAULT_WEIGHT_POINTS):
+    """Pre-bucketed chart data for one metric of a user.
+
+    Args:
+        user_id: The user whose history is charted.
+        metric: calories, protein, carbs, fats or weight.
+        bucket: day, week or month (widened if the range would need more than MAX_POINTS).
+        start: First day (YYYY-MM-DD), defaults to DEFAULT_SPAN_DAYS before `end`.
+        end: Last day, inclusive (YYYY-MM-DD), defaults to today (UTC, as in the ETag).
+        points: Maximum number of weight points after downsampling.
+
+    Returns:
+        dict: the metric, effective bucket and range, and `points` as {t, value, ...}.
+
+    Raises:
+        ValueError: for an unknown metric or bucket, or an invalid range.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of: {', '.join(METRICS)}")
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of: {', '.join(BUCKETS)}")
+    start, end = _parse_range(start, end)
+    result = {"metric": metric, "from": start.isoformat(), "to": end.isoformat()}
+
+    if metric == "weight":
+        days, values = _weight_series(user_id, bucket, start, end)
+        x = np.array([(date.fromisoformat(d) - start).days for d in days], dtype=np.float64)
+        kept = lttb(x, values, max(3, min(points, MAX_POINTS)))
+        result.update(bucket=bucket, downsampled=len(kept) < len(days),
+                      points=[{"t": days[i], "value": round(float(values[i]), 1)} for i in kept])
+        return result
+
+    bucket = _widen(bucket, start, end)
+    result.update(bucket=bucket, points=_meal_series(user_id, metric, bucket, start, end))
+    return result
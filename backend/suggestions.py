@@ -0,0 +1,190 @@
+"""
+Macro-fitting meal suggestions: rank catalogue foods and recipes (and pairs of them) by
+how well they close the gap between the user's targets and what they've eaten today.
+
+The catalogue is one (n, 4) matrix of calories/protein/carbs/fats per serving: foods come
+from the shared memory-mapped nutrient store (nutrient_store.py) and recipes from their
+computed totals per serving (cached per process). Scoring is a single vectorized
+weighted distance over the whole matrix, so no LLM call or per-item Python is involved.
+"""
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func
+
+from models import db, MealLog, UserStats, Recipe, Ingredient
+from nutrient_store import nutrient_store, MACRO_FIELDS
+
+RECIPE_CACHE_SECONDS = 300
+PAIR_CANDIDATES = 40
+
+# Default split of the calorie target when deriving gram targets (protein/carbs/fats).
+MACRO_SPLIT = (0.30, 0.40, 0.30)
+KCAL_PER_GRAM = (4, 4, 9)
+
+# Relative importance of calories vs each macro, and extra cost for overshooting the gap.
+WEIGHTS = np.array([2.0, 1.0, 0.5, 0.5])
+OVERSHOOT_PENALTY = 3.0
+
+_recipe_cache = {"loaded_at": 0, "ids": None, "names": None, "macros": None}
+_food_fallback = {"loaded_at": 0, "ids": None, "names": None, "macros": None}
+
+
+def _load_recipes():
+    if _recipe_cache["ids"] is not None and time.monotonic() - _recipe_cache["loaded_at"] < RECIPE_CACHE_SECONDS:
+        return _recipe_cache
+
+    rows = db.session.query(
+        Recipe.id, Recipe.title, Recipe.base_servings,
+        Recipe.total_calories, Recipe.total_protein, Recipe.total_carbs, Recipe.total_fats
+    ).filter(Recipe.total_calories > 0).all()
+
+    servings = np.array([r[2] or 1 for r in rows], dtype=np.float64)
+    macros = np.array([[v or 0 for v in r[3:]] for r in rows], dtype=np.float64).reshape(-1, 4)
+
+    _recipe_cache.update(
+        loaded_at=time.monotonic(),
+        ids=np.array([r[0] for r in rows], dtype=np.int64),
+        names=[r[1] for r in rows],
+        macros=macros / servings[:, None] if len(rows) else macros,
+    )
+    return _recipe_cache
+
+def _load_foods():
+    """
+    Foods from the memory-mapped store; if it hasn't been built yet, from the DB (cached).
+    Names stay as the store's byte column and are only decoded for the winners.
+    """
+    array = nutrient_store.array
+    if len(array):
+        macros = np.stack([array[f] for f in MACRO_FIELDS], axis=-1).astype(np.float64)
+        return {"ids": array['id'], "names": array['name'], "macros": macros}
+
+    if _food_fallback["ids"] is None or time.monotonic() - _food_fallback["loaded_at"] > RECIPE_CACHE_SECONDS:
+        rows = db.session.query(
+            Ingredient.id, Ingredient.name, Ingredient.calories_per_unit,
+            Ingredient.protein_per_unit, Ingredient.carbs_per_unit, Ingredient.fats_per_unit
+        ).all()
+        _food_fallback.update(
+            loaded_at=time.monotonic(),
+            ids=np.array([r[0] for r in rows], dtype=np.int64),
+            names=[r[1] for r in rows],
+            macros=np.array([[v or 0 for v in r[2:]] for r in rows], dtype=np.float64).reshape(-1, 4),
+        )
+    return _food_fallback
+
+def _item_name(names, i):
+    name = names[i]
+    return name.decode('utf-8', 'ignore') if isinstance(name, bytes) else name
+
+def remaining_targets(user_id):
+    """
+    Returns (targets, eaten) as 4-vectors of calories/protein/carbs/fats for today, or None
+    if the user has no stats yet.
+    """
+    calorie_target = db.session.query(UserStats.calorie_target)\
+        .filter_by(user_id=user_id).order_by(UserStats.updated_at.desc()).limit(1).scalar()
+    if not calorie_target:
+        return None
+
+    day_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    eaten = db.session.query(
+        func.coalesce(func.sum(MealLog.calories), 0), func.coalesce(func.sum(MealLog.protein), 0),
+        func.coalesce(func.sum(MealLog.carbs), 0), func.coalesce(func.sum(MealLog.fats), 0)
+    ).filter(
+        MealLog.user_id == user_id, MealLog.date >= day_start, MealLog.date < day_start + timedelta(days=1)
+    ).one()
+
+    targets = np.array([calorie_target] + [
+        calorie_target * share / kcal for share, kcal in zip(MACRO_SPLIT, KCAL_PER_GRAM)
+    ], dtype=np.float64)
+    return targets, np.array(eaten, dtype=np.float64)
+
+def _score(candidates, gap, scale):
+    """
+    Weighted squared distance between each candidate row and the gap, in units of the
+    daily target; overshooting the gap costs OVERSHOOT_PENALTY times more than falling short.
+    """
+    diff = (candidates - gap) / scale
+    diff = np.where(diff > 0, diff * OVERSHOOT_PENALTY, diff)
+    return (diff * diff) @ WEIGHTS
+
+def _describe(source, kind, i, macros):
+    calories, protein, carbs, fats = (round(float(v), 1) for v in macros)
+    return {"type": kind, "id": int(source["ids"][i]), "name": _item_name(source["names"], i),
+            "calories": calories, "protein": protein, "carbs": carbs, "fats": fats}
+
+def suggest_meals(user_id, k=10, meals_left=1):
+    """Top-k single items and pairs that best fit what's left of today's targets.
+
+    Args:
+        user_id: The user to suggest for.
+        k: Number of single-item suggestions (and of pairs) to return.
+        meals_left: Meals the remaining budget is spread over; the gap is divided by it.
+
+    Returns:
+        dict or None: remaining budget, ranked suggestions and combinations; None if the
+        user has no stats to derive targets from.
+    """
+    budget = remaining_targets(user_id)
+    if budget is None:
+        return None
+    targets, eaten = budget
+    remaining = np.maximum(targets - eaten, 0)
+    gap = remaining / max(meals_left, 1)
+
+    foods, recipes = _load_foods(), _load_recipes()
+    sources = [(foods, "food"), (recipes, "recipe")]
+    macros = np.concatenate([s["macros"] for s, _ in sources])
+    usable = macros[:, 0] > 0
+    if not usable.any():
+        return {"remaining": dict(zip(("calories", "protein", "carbs", "fats"), remaining.round(1).tolist())),
+                "suggestions": [], "combinations": []}
+
+    # (source index, row within source) for every catalogue row
+    owners = np.concatenate([np.full(len(s["macros"]), n) for n, (s, _) in enumerate(sources)])
+    rows = np.concatenate([np.arange(len(s["macros"])) for s, _ in sources])
+    macros, owners, rows = macros[usable], owners[usable], rows[usable]
+
+    scale = np.maximum(targets, 1)
+    scores = _score(macros, gap, scale)
+
+    k = max(1, min(k, len(scores)))
+    top = np.argpartition(scores, k - 1)[:k]
+    top = top[np.argsort(scores[top])]
+
+    def describe(j):
+        source, kind = sources[owners[j]]
+        return _describe(source, kind, rows[j], macros[j])
+
+    suggestions = [{**describe(j), "score": round(float(scores[j]), 4)} for j in top]
+
+    # Pairs: take the items that best fill half the gap and combine them pairwise in one broadcast.
+    m = min(PAIR_CANDIDATES, len(scores))
+    half_scores = _score(macros, gap / 2, scale)
+    candidates = np.argpartition(half_scores, m - 1)[:m]
+    pair_macros = macros[candidates][:, None, :] + macros[candidates][None, :, :]
+    pair_scores = _score(pair_macros.reshape(-1, 4), gap, scale).reshape(m, m)
+    pair_scores[np.tril_indices(m)] = np.inf
+
+    combinations = []
+    n_pairs = m * (m - 1) // 2
+    if n_pairs:
+        kp = min(k, n_pairs)
+        flat = np.argpartition(pair_scores.ravel(), kp - 1)[:kp]
+        flat = flat[np.argsort(pair_scores.ravel()[flat])]
+        for a, b in zip(*np.unravel_index(flat, (m, m))):
+            total = macros[candidates[a]] + macros[candidates[b]]
+            combinations.append({
+                "items": [describe(candidates[a]), describe(candidates[b])],
+                "calories": round(float(total[0]), 1), "protein": round(float(total[1]), 1),
+                "carbs": round(float(total[2]), 1), "fats": round(float(total[3]), 1),
+                "score": round(float(pair_scores[a, b]), 4),
+            })
+
+    return {
+        "remaining": dict(zip(("calories", "protein", "carbs", "fats"), remaining.round(1).tolist())),
+        "suggestions": suggestions,
+        "combinations": combinations,
+    }
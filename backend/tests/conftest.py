@@ -0,0 +1,40 @@
+"""
+Shared fixtures: the Flask app against a throwaway SQLite database, recreated per test,
+with USDA / Spoonacular / Gemini / Google served by the local benchmark stubs.
+"""
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.stubs import StubServer
+
+# app.py and services.py read their configuration at import time.
+stub_server = StubServer(latency={service: 0 for service in ("usda", "spoonacular", "gemini", "google")}).start()
+os.environ.update(stub_server.env())
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ.pop("MEAL_LOG_WRITE_BEHIND", None)
+os.environ.pop("REQUIRE_AUTH_TOKENS", None)
+
+
+@pytest.fixture()
+def app():
+    from app import app as flask_app
+    from models import db
+    from schema import upgrade_schema
+
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        upgrade_schema()
+        yield flask_app
+        db.session.remove()
+
+@pytest.fixture()
+def db(app):
+    from models import db as database
+    return database
+
+@pytest.fixture()
+def stub():
+    return stub_server
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+from flask import Flask
+from flask_login import LoginManager
+from werkzeug.security import generate_password_hash
+
+import auth_tokens
+from auth_tokens import issue_token, init_auth
+from models import User
+
+
+@pytest.fixture()
+def session(app, db):
+    db.session.add(User(username="abebe", email="abebe@example.com", password=generate_password_hash("pw")))
+    db.session.commit()
+    response = app.test_client().post("/api/auth/login", json={"username": "abebe", "password": "pw"})
+    assert response.status_code == 200
+    return response.get_json()
+
+def _refresh(app, token):
+    return app.test_client().post("/api/auth/refresh", json={"refresh_token": token})
+
+
+def test_refresh_rotates_the_pair(app, session):
+    response = _refresh(app, session["refresh_token"])
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["token"] and data["refresh_token"]
+
+    me = app.test_client().get(f"/api/user/{session['user_id']}", headers={"Authorization": f"Bearer {data['token']}"})
+    assert me.status_code == 200
+
+def test_access_and_refresh_tokens_are_not_interchangeable(app, session):
+    assert _refresh(app, session["token"]).status_code == 401
+    me = app.test_client().get(f"/api/user/{session['user_id']}",
+                               headers={"Authorization": f"Bearer {session['refresh_token']}"})
+    assert me.status_code == 401
+
+def test_refresh_is_capped_by_the_original_login_time(app, db, session):
+    user = db.session.get(User, session["user_id"])
+    stale = issue_token(user, auth_time=time.time() - auth_tokens.MAX_SESSION_SECONDS - 60)
+    assert _refresh(app, stale["refresh_token"]).status_code == 401
+
+    # A refresh carries the login time over instead of restarting the session.
+    fresh = _refresh(app, session["refresh_token"]).get_json()
+    assert auth_tokens.verify_refresh_token(fresh["refresh_token"])["auth"] == \
+        auth_tokens.verify_refresh_token(session["refresh_token"])["auth"]
+
+def test_logout_revokes_refresh_tokens(app, session):
+    response = app.test_client().post("/api/auth/logout", json={"refresh_token": session["refresh_token"]})
+    assert response.status_code == 200
+    assert _refresh(app, session["refresh_token"]).status_code == 401
+
+def test_required_tokens_refuse_the_development_key(monkeypatch):
+    monkeypatch.setattr(auth_tokens, "REQUIRE_AUTH_TOKENS", True)
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = "dev-secret-key"
+    with pytest.raises(RuntimeError):
+        init_auth(app, LoginManager(app))
@@ -0,0 +1,37 @@
+import threading
+
+import autocomplete as autocomplete_module
+from autocomplete import Autocomplete, autocomplete
+from models import Ingredient
+
+
+def test_only_committed_inserts_are_indexed(db):
+    autocomplete.build()
+
+    db.session.add(Ingredient(name="Rolled Back Kolo", calories_per_unit=100))
+    db.session.flush()
+    db.session.rollback()
+    db.session.add(Ingredient(name="Committed Kolo", calories_per_unit=100))
+    db.session.commit()
+
+    assert [r["name"] for r in autocomplete.search("kolo")] == ["Committed Kolo"]
+
+def test_one_refresher_for_concurrent_first_searches(app, monkeypatch):
+    started = []
+    monkeypatch.setattr(autocomplete_module.Autocomplete, "_refresh_loop", lambda self, app: started.append(1))
+    index = Autocomplete()
+    with app.app_context():
+        index.build()
+
+    barrier = threading.Barrier(8)
+    def search():
+        barrier.wait()
+        index.search("a", app=app)
+    threads = [threading.Thread(target=search) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    index._refresher.join()
+    assert started == [1]
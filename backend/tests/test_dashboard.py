@@ -0,0 +1,43 @@
+from datetime import date, datetime
+
+import pytest
+
+import dashboard
+from models import GoalPrediction, User, UserStats, WeightLog
+
+
+@pytest.fixture()
+def user_id(db):
+    user = User(username="u", email="u@example.com")
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(UserStats(user_id=user.id, weight=80, height=170, age=30, gender="female",
+                             activity_level="moderate", target_weight=70, calorie_target=1800))
+    for day, weight in ((1, 82), (8, 81), (15, 80)):
+        db.session.add(WeightLog(user_id=user.id, weight=weight, date=datetime(2026, 1, day)))
+    db.session.commit()
+    return user.id
+
+def _store_prediction(db, user_id):
+    version = db.session.get(User, user_id).data_version
+    db.session.add(GoalPrediction(user_id=user_id, status="success", days_needed=70,
+                                  predicted_date=date(2026, 4, 1), slope=-0.14, data_version=version))
+    db.session.commit()
+
+
+def test_current_batch_prediction_is_used(app, db, user_id, monkeypatch):
+    _store_prediction(db, user_id)
+    monkeypatch.setattr(dashboard, "predict_from_weight_history", lambda *a: pytest.fail("refitted"))
+
+    prediction = app.test_client().get(f"/api/user/{user_id}/dashboard").get_json()["prediction"]
+
+    assert prediction == {"status": "success", "days_needed": 70, "predicted_date": "April 01, 2026", "slope": -0.14}
+
+def test_stale_batch_prediction_is_refitted(app, db, user_id):
+    _store_prediction(db, user_id)
+    db.session.add(WeightLog(user_id=user_id, weight=79, date=datetime(2026, 1, 22)))
+    db.session.commit()
+
+    prediction = app.test_client().get(f"/api/user/{user_id}/dashboard").get_json()["prediction"]
+
+    assert prediction["status"] == "success" and prediction["days_needed"] != 70
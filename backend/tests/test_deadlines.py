@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask, Response, stream_with_context
+
+import deadlines
+from deadlines import DeadlineExceeded, expensive
+
+
+def _free_slots():
+    return deadlines._expensive_slots._value
+
+@pytest.fixture()
+def bare_app():
+    bare = Flask(__name__)
+    bare.before_request(deadlines._start_deadline)
+    return bare
+
+
+def test_streamed_response_keeps_its_slot_until_closed(bare_app):
+    before = _free_slots()
+
+    @bare_app.route("/_test/stream")
+    @expensive
+    def stream():
+        def body():
+            yield "a"
+            assert _free_slots() == before - 1
+            yield "b"
+        return Response(stream_with_context(body()))
+
+    response = bare_app.test_client().get("/_test/stream", buffered=False)
+    assert _free_slots() == before - 1
+    assert response.get_data(as_text=True) == "ab"
+    response.close()
+    assert _free_slots() == before
+
+def test_plain_response_releases_its_slot(bare_app):
+    before = _free_slots()
+
+    @bare_app.route("/_test/plain")
+    @expensive
+    def plain():
+        return {"ok": True}
+
+    assert bare_app.test_client().get("/_test/plain").status_code == 200
+    assert _free_slots() == before
+
+def test_cancelled_statement_becomes_deadline_exceeded(bare_app):
+    cancelled = SimpleNamespace(original_exception=SimpleNamespace(pgcode="57014"))
+    other = SimpleNamespace(original_exception=SimpleNamespace(pgcode="23505"))
+
+    with bare_app.test_request_context():
+        bare_app.preprocess_request()
+        assert isinstance(deadlines._statement_timeout_to_deadline(cancelled), DeadlineExceeded)
+        assert deadlines._statement_timeout_to_deadline(other) is None
+    # Outside a request (CLI jobs) a cancel stays a database error.
+    assert deadlines._statement_timeout_to_deadline(cancelled) is None
+
+def test_deadline_spent_inside_a_route_answers_504(app, db, monkeypatch):
+    from models import Ingredient, User
+
+    user = User(username="u", email="u@example.com")
+    db.session.add(user)
+    db.session.commit()
+    monkeypatch.setattr(deadlines, "REQUEST_DEADLINE_SECONDS", 0)
+
+    response = app.test_client().get(f"/api/food/search/Deadline Food/{user.id}")
+
+    assert response.status_code == 504
+    assert Ingredient.query.filter_by(name="Deadline Food").count() == 0
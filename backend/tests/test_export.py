@@ -0,0 +1,23 @@
+import json
+from datetime import datetime, timedelta
+
+import export
+from export import generate_export
+from models import MealLog, User
+
+
+def test_ndjson_sends_the_first_record_before_the_first_batch(db, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 3)
+    user = User(username="u", email="u@example.com")
+    db.session.add(user)
+    db.session.flush()
+    for i in range(5):
+        db.session.add(MealLog(user_id=user.id, meal_name=f"meal {i}", calories=100 + i,
+                               date=datetime(2026, 1, 1) + timedelta(hours=i)))
+    db.session.commit()
+
+    chunks = list(generate_export(user.id, 'ndjson'))
+
+    assert [chunk.count("\n") for chunk in chunks] == [1, 3, 1]
+    records = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    assert [r["meal_name"] for r in records] == [f"meal {i}" for i in range(5)]
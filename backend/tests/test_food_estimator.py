@@ -0,0 +1,53 @@
+import threading
+
+import food_estimator as food_estimator_module
+from benchmarks.stubs import USDA_MISS_PREFIX
+from food_estimator import FoodEstimator, food_estimator, CONFIDENT_MATCH, MIN_CONFIDENCE
+from models import Ingredient, MealLog, User
+
+FOODS = ["Kitfo", "Beef", "Shiro Wat", "Doro Wat", "Gomen", "Injera", "Tibs", "Beef Stew"]
+
+
+def _estimator():
+    estimator = FoodEstimator()
+    estimator.build([(name, 100, 10, 10, 5) for name in FOODS])
+    return estimator
+
+
+def test_unknown_words_lower_the_confidence():
+    estimator = _estimator()
+
+    assert estimator.estimate("kitfo")["confidence"] == 1.0
+    assert estimator.estimate("kitfo zzzzz")["confidence"] < CONFIDENT_MATCH
+    assert estimator.estimate("beef stroganoff", min_confidence=0)["confidence"] < MIN_CONFIDENCE
+    assert estimator.estimate("beer") is None
+
+def test_stale_index_is_rebuilt_once_in_the_background(app, monkeypatch):
+    estimator = _estimator()
+    estimator._loaded_at -= food_estimator_module.INDEX_REFRESH_SECONDS + 1
+    release, builds = threading.Event(), []
+    def slow_build(rows=None):
+        builds.append(1)
+        release.wait(5)
+    monkeypatch.setattr(estimator, "build", slow_build)
+
+    results = [estimator.estimate("gomen") for _ in range(5)]
+    release.set()
+
+    assert [r["name"] for r in results] == ["Gomen"] * 5
+    assert builds == [1]
+
+def test_estimated_search_is_not_cached_as_an_ingredient(app, db):
+    user = User(username="u", email="u@example.com")
+    db.session.add_all([user, Ingredient(name="Kitfo", calories_per_unit=250, protein_per_unit=20,
+                                         fats_per_unit=18, carbs_per_unit=1)])
+    db.session.commit()
+    food_estimator.build()
+
+    response = app.test_client().get(f"/api/food/search/{USDA_MISS_PREFIX}kitfo/{user.id}")
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["estimated_from"] == "Kitfo" and MIN_CONFIDENCE <= body["confidence"] < 1
+    assert Ingredient.query.count() == 1
+    assert MealLog.query.filter_by(meal_name=f"{USDA_MISS_PREFIX}kitfo").count() == 1
@@ -0,0 +1,38 @@
+import io
+from datetime import datetime
+
+import pytest
+
+from calculations import LBS_TO_KG
+from importer import import_history
+from models import MealLog, User, WeightLog
+
+
+@pytest.fixture()
+def user(db):
+    user = User(username="u", email="u@example.com")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def test_lbs_weights_are_stored_in_kg(db, user):
+    csv = "type,weight,weight_unit,date\nweight,200,lbs,2024-05-01\nweight,80,,2024-05-02\n"
+
+    result = import_history(user.id, io.StringIO(csv))
+
+    assert result["weights"] == 2
+    weights = [w.weight for w in WeightLog.query.filter_by(user_id=user.id).order_by(WeightLog.date)]
+    assert weights == [pytest.approx(200 * LBS_TO_KG), 80.0]
+
+def test_dates_with_an_offset_are_converted_to_utc(db, user):
+    csv = ("meal_name,calories,date\n"
+           "Injera,300,2024-05-01T01:00:00+03:00\n"
+           "Shiro,250,2024-05-01T12:00:00Z\n"
+           "Kitfo,400,2024-05-01T09:30:00\n")
+
+    import_history(user.id, io.StringIO(csv))
+
+    dates = {m.meal_name: m.date for m in MealLog.query.filter_by(user_id=user.id)}
+    assert dates == {"Injera": datetime(2024, 4, 30, 22, 0), "Shiro": datetime(2024, 5, 1, 12, 0),
+                     "Kitfo": datetime(2024, 5, 1, 9, 30)}
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+
+import partitioning
+from models import MealDailySummary, MealLog, User, WeightDailySummary, WeightLog
+from partitioning import archive_old_data
+
+
+@pytest.fixture()
+def history(db):
+    user = User(username="u", email="u@example.com")
+    db.session.add(user)
+    db.session.flush()
+    for hour in range(5):
+        db.session.add(MealLog(user_id=user.id, meal_name="Shiro", calories=100, protein=5,
+                               date=datetime(2020, 3, 1, 8 + hour)))
+    db.session.add(MealLog(user_id=user.id, meal_name="Kitfo", calories=400, date=datetime.utcnow()))
+    for weight in (70, 72, 74):
+        db.session.add(WeightLog(user_id=user.id, weight=weight, date=datetime(2020, 3, 2, weight - 60)))
+    db.session.commit()
+    return user.id
+
+
+def test_archive_rolls_up_and_removes_expired_rows(db, history):
+    archived = archive_old_data(retention_months=12, chunk_size=2)
+
+    assert archived == ["meal_log (5 rows)", "weight_log (3 rows)"]
+    assert [m.meal_name for m in MealLog.query.all()] == ["Kitfo"]
+    meals = MealDailySummary.query.one()
+    assert (meals.meal_count, meals.calories, meals.protein) == (5, 500, 25)
+    weights = WeightDailySummary.query.one()
+    assert (weights.entries, weights.avg_weight, weights.min_weight, weights.max_weight) == (3, 72, 70, 74)
+
+def test_archive_rerun_after_a_failure_merges_into_the_summary(db, history, monkeypatch):
+    real_summarize, calls = partitioning._summarize, []
+    def failing_summarize(table, source, where, params):
+        calls.append(table)
+        if len(calls) == 2:
+            raise RuntimeError("connection lost")
+        real_summarize(table, source, where, params)
+    monkeypatch.setattr(partitioning, "_summarize", failing_summarize)
+    with pytest.raises(RuntimeError):
+        archive_old_data(retention_months=12, chunk_size=2)
+    db.session.rollback()
+    assert MealLog.query.count() == 4
+
+    monkeypatch.setattr(partitioning, "_summarize", real_summarize)
+    archive_old_data(retention_months=12, chunk_size=2)
+
+    meals = MealDailySummary.query.one()
+    assert (meals.meal_count, meals.calories) == (5, 500)
+    assert WeightDailySummary.query.one().entries == 3
+    assert MealLog.query.count() == 1
@@ -0,0 +1,83 @@
+import json
+import re
+from datetime import datetime, timedelta
+
+from models import Ingredient, MealLog, User
+from recipe_warmer import RateBudget, warm_recipes
+
+
+class FakeModel:
+    """
+    Gemini stand-in: answers every batch prompt with a recipe per requested food, except
+    the ones listed in `skip`.
+    """
+    def __init__(self, skip=()):
+        self.prompts = []
+        self.skip = set(skip)
+
+    def generate_content(self, prompt, generation_config=None):
+        self.prompts.append(prompt)
+        foods = json.loads(re.search(r"\[.*?\]", prompt).group(0))
+        reply = {food: {"description": f"{food} recipe", "ingredients": [], "instructions": []}
+                 for food in foods if food not in self.skip}
+        return type("Response", (), {"text": json.dumps(reply)})()
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _seed(db, uses):
+    user = User(username="u", email="u@example.com")
+    db.session.add(user)
+    db.session.flush()
+    now = datetime.utcnow()
+    for name, count in uses.items():
+        db.session.add(Ingredient(name=name, calories_per_unit=100))
+        for _ in range(count):
+            db.session.add(MealLog(user_id=user.id, meal_name=name.lower(), calories=100, date=now))
+    # Logged often, but outside the popularity window.
+    db.session.add(Ingredient(name="Old Favourite", calories_per_unit=100))
+    for _ in range(50):
+        db.session.add(MealLog(user_id=user.id, meal_name="Old Favourite", calories=100, date=now - timedelta(days=90)))
+    # Popular, but already has a recipe.
+    db.session.add(Ingredient(name="Injera", calories_per_unit=100, recipe_json={"description": "cached"}))
+    for _ in range(40):
+        db.session.add(MealLog(user_id=user.id, meal_name="Injera", calories=100, date=now))
+    db.session.commit()
+
+
+def test_warms_most_popular_first_in_batches_under_rate_budget(db):
+    _seed(db, {"Shiro": 9, "Doro Wat": 8, "Kitfo": 7, "Tibs": 6, "Gomen": 5, "Firfir": 1})
+    model, clock = FakeModel(), FakeClock()
+
+    result = warm_recipes(top_n=5, batch_size=2, model=model,
+                          budget=RateBudget(60, clock=clock, sleep=clock.sleep))
+
+    assert result == {"candidates": 5, "warmed": 5, "failed": 0, "requests": 3}
+    batches = [json.loads(re.search(r"\[.*?\]", p).group(0)) for p in model.prompts]
+    assert batches == [["Shiro", "Doro Wat"], ["Kitfo", "Tibs"], ["Gomen"]]
+    # 60 requests per minute: every call after the first waits a full second.
+    assert clock.sleeps == [1.0, 1.0]
+
+    warmed = {i.name for i in Ingredient.query.filter(Ingredient.recipe_json.isnot(None))}
+    assert warmed == {"Shiro", "Doro Wat", "Kitfo", "Tibs", "Gomen", "Injera"}
+
+def test_foods_missing_from_reply_are_left_for_next_run(db):
+    _seed(db, {"Shiro": 3, "Kitfo": 2})
+
+    result = warm_recipes(batch_size=5, model=FakeModel(skip={"Kitfo"}), budget=RateBudget(0))
+
+    assert result == {"candidates": 2, "warmed": 1, "failed": 1, "requests": 1}
+    assert Ingredient.query.filter_by(name="Kitfo").one().recipe_json is None
+
+    second = warm_recipes(batch_size=5, model=FakeModel(), budget=RateBudget(0))
+    assert second == {"candidates": 1, "warmed": 1, "failed": 0, "requests": 1}
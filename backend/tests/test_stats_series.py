@@ -0,0 +1,79 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+import stats_series as stats_series_module
+from models import MealDailySummary, MealLog, User, WeightLog
+from stats_series import lttb, stats_series
+
+
+@pytest.fixture()
+def user_id(db):
+    user = User(username="u", email="u@example.com")
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def _meal(user_id, day, calories):
+    return MealLog(user_id=user_id, meal_name="Shiro", calories=calories, date=datetime.combine(day, datetime.min.time()))
+
+
+@pytest.mark.parametrize("start,end,bucket", [
+    ("2026-01-01", "2026-03-31", "day"),
+    ("2024-01-01", "2025-12-31", "week"),   # 731 days
+    ("2010-01-01", "2025-12-31", "month"),  # 5844 days, > 400 weeks
+])
+def test_bucket_is_widened_to_stay_under_max_points(db, user_id, start, end, bucket):
+    assert stats_series(user_id, "calories", "day", start, end)["bucket"] == bucket
+
+def test_weeks_start_on_monday(db, user_id):
+    db.session.add_all([_meal(user_id, date(2026, 1, 4), 500),   # Sunday
+                        _meal(user_id, date(2026, 1, 5), 300),   # Monday
+                        _meal(user_id, date(2026, 1, 6), 100)])
+    db.session.commit()
+
+    points = stats_series(user_id, "calories", "week", "2025-12-29", "2026-01-11")["points"]
+
+    assert [(p["t"], p["total"], p["days"], p["value"]) for p in points] == [
+        ("2025-12-29", 500, 1, 500), ("2026-01-05", 400, 2, 200)]
+
+def test_months_include_archived_days(db, user_id):
+    db.session.add_all([_meal(user_id, date(2026, 1, 31), 600), _meal(user_id, date(2026, 2, 1), 200),
+                        MealDailySummary(user_id=user_id, day=date(2026, 1, 15), meal_count=2, calories=1000)])
+    db.session.commit()
+
+    points = stats_series(user_id, "calories", "month", "2026-01-01", "2026-02-28")["points"]
+
+    assert [(p["t"], p["total"], p["days"]) for p in points] == [("2026-01-01", 1600, 2), ("2026-02-01", 200, 1)]
+
+def test_range_defaults_to_the_etag_day(db, user_id, monkeypatch):
+    monkeypatch.setattr(stats_series_module, "utc_today", lambda: date(2026, 3, 31))
+
+    result = stats_series(user_id)
+
+    assert (result["from"], result["to"]) == ("2025-12-31", "2026-03-31")
+
+def test_lttb_keeps_the_endpoints_the_count_and_the_peaks():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    y[437] = 25
+
+    kept = lttb(x, y, 50)
+
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert np.all(np.diff(kept) > 0)
+    assert 437 in kept
+    assert list(lttb(x[:10], y[:10], 50)) == list(range(10))
+
+def test_weight_is_downsampled_to_the_requested_points(db, user_id):
+    for day in range(60):
+        db.session.add(WeightLog(user_id=user_id, weight=80 - day / 10, date=datetime(2026, 1, 1) + timedelta(days=day)))
+    db.session.commit()
+
+    result = stats_series(user_id, "weight", "day", "2026-01-01", "2026-03-01", points=10)
+
+    assert result["downsampled"] and len(result["points"]) == 10
+    assert result["points"][0] == {"t": "2026-01-01", "value": 80.0}
+    assert result["points"][-1] == {"t": "2026-03-01", "value": 74.1}
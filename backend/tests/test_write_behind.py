@@ -0,0 +1,56 @@
+import os
+from datetime import datetime
+
+import pytest
+
+import write_behind
+from models import MealLog, User
+from write_behind import WriteBehindQueue
+
+
+@pytest.fixture()
+def user_id(db):
+    user = User(username="u", email="u@example.com")
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def _journals(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".journal"))
+
+def _meal(user_id, i):
+    return {"user_id": user_id, "meal_name": f"meal {i}", "calories": 100, "date": datetime(2026, 1, 1)}
+
+
+def test_flushed_segments_are_deleted_under_sustained_load(app, db, user_id, tmp_path, monkeypatch):
+    monkeypatch.setattr(write_behind, "COMPACT_BYTES", 300)
+    monkeypatch.setattr(WriteBehindQueue, "_run", lambda self: None)
+    queue = WriteBehindQueue().start(app, journal_dir=str(tmp_path))
+
+    monkeypatch.setattr(write_behind, "MAX_BATCH", 1)
+    queue.submit(_meal(user_id, 0))
+    for i in range(1, 20):
+        # The queue never drains: every flush leaves the newest entry pending.
+        queue.submit(_meal(user_id, i))
+        queue.flush()
+
+    assert len(_journals(tmp_path)) <= 2
+    assert sum(os.path.getsize(tmp_path / name) for name in _journals(tmp_path)) < 2 * 300 + 200
+    queue.drain()
+    assert MealLog.query.count() == 20
+
+def test_journal_is_replayed_by_the_next_process(app, db, user_id, tmp_path, monkeypatch):
+    monkeypatch.setattr(write_behind, "COMPACT_BYTES", 150)
+    monkeypatch.setattr(WriteBehindQueue, "_run", lambda self: None)
+    first = WriteBehindQueue().start(app, journal_dir=str(tmp_path))
+    ids = [first.submit(_meal(user_id, i)) for i in range(3)]
+    first._journal.rotate()
+    ids += [first.submit(_meal(user_id, i)) for i in range(3, 5)]
+    first._journal._lock_file.close()  # the process dies before flushing
+
+    second = WriteBehindQueue().start(app, journal_dir=str(tmp_path))
+    assert list(second._pending) == ids
+    second.drain()
+
+    assert sorted(m.id for m in MealLog.query) == ids
+    assert _journals(tmp_path) == [f"meal_log.0.{second._journal.segment}.journal"]
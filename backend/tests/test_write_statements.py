@@ -0,0 +1,129 @@
+"""
+SQL statements and COMMITs per write endpoint (request-scoped unit of work, unit_of_work.py).
+
+The counts are exact on purpose: a route that goes back to committing as it goes, or that
+reloads objects expired by an intermediate commit, fails here.
+"""
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from food_estimator import food_estimator
+from models import Ingredient, MealLog, User, UserStats
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = 0
+        self.commits = 0
+
+    def _statement(self, *args):
+        self.statements += 1
+
+    def _commit(self, *args):
+        self.commits += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._statement)
+        event.listen(self.engine, 'commit', self._commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._statement)
+        event.remove(self.engine, 'commit', self._commit)
+
+
+@pytest.fixture()
+def user(db):
+    user = User(username="abebe", email="abebe@example.com", password=generate_password_hash("pw"))
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(UserStats(user_id=user.id, weight=70, height=170, age=30, gender="female",
+                             activity_level="moderate", bmi=24.2, target_weight=65, calorie_target=1800))
+    db.session.add(MealLog(user_id=user.id, meal_name="Shiro", calories=300))
+    db.session.add(Ingredient(name="Misir Wat", calories_per_unit=120, protein_per_unit=9,
+                              carbs_per_unit=20, fats_per_unit=3))
+    db.session.commit()
+    user_id = user.id
+    # Built up front so its query isn't counted against whichever search runs first.
+    food_estimator.build()
+    db.session.remove()
+    return user_id
+
+def _count(db, request):
+    with QueryCounter(db.engine) as counter:
+        response = request()
+    db.session.remove()
+    return response, counter
+
+
+# (name, request, expected status, statements, commits); the request gets (client, stub, user_id).
+# search_food and the Spoonacular recipe make one extra, read-only COMMIT: release_db_connection()
+# hands the connection back before the external call, when nothing has been written yet.
+ENDPOINTS = [
+    ("register", lambda c, s, u: c.post("/api/auth/register", json={"username": "new", "password": "pw"}), 201, 2, 1),
+    ("google_auth_new", lambda c, s, u: c.post("/api/auth/google", json={
+        "token": s.mint_id_token("g-new", "new@example.com", "Almaz")}), 200, 4, 1),
+    ("google_auth_link", lambda c, s, u: c.post("/api/auth/google", json={
+        "token": s.mint_id_token("g-link", "abebe@example.com", "abebe")}), 200, 3, 1),
+    ("stats_post", lambda c, s, u: c.post(f"/api/user/{u}/stats", json={
+        "weight": 71, "height": 170, "age": 30, "gender": "female", "activity_level": "moderate"}), 201, 4, 1),
+    ("weight", lambda c, s, u: c.post(f"/api/user/{u}/weight", json={"weight": 69.5}), 200, 6, 1),
+    ("meal_log", lambda c, s, u: c.post(f"/api/user/{u}/meal-log", json={
+        "food_name": "Kitfo", "calories": 400, "protein": 30, "fats": 25, "carbs": 2}), 201, 3, 1),
+    ("search_food_new", lambda c, s, u: c.get(f"/api/food/search/Bench Food/{u}"), 200, 7, 2),
+    ("search_food_known", lambda c, s, u: c.get(f"/api/food/search/Misir Wat/{u}"), 200, 7, 2),
+    ("create_recipe", lambda c, s, u: c.post("/api/recipes", json={"title": "Beyaynetu", "ingredients": [
+        {"name": "misir wat", "amount": 100, "unit": "g"}, {"name": "gomen", "amount": 50, "unit": "g"}]}), 201, 12, 1),
+    ("recipe_spoonacular", lambda c, s, u: c.get("/api/recipes/4242?source=spoonacular"), 200, 9, 2),
+    ("delete_meal", lambda c, s, u: c.delete(f"/api/user/{u}/meal-log/1"), 200, 5, 1),
+    ("delete_all_meals", lambda c, s, u: c.delete(f"/api/user/{u}/meal-log"), 200, 4, 1),
+]
+
+
+@pytest.mark.parametrize("name,request_fn,status,statements,commits", ENDPOINTS, ids=[e[0] for e in ENDPOINTS])
+def test_write_endpoint_statements_and_commits(app, db, stub, user, name, request_fn, status, statements, commits):
+    client = app.test_client()
+    response, counter = _count(db, lambda: request_fn(client, stub, user))
+
+    assert response.status_code == status, response.get_data(as_text=True)
+    assert (counter.statements, counter.commits) == (statements, commits)
+
+def test_failed_write_commits_nothing(app, db, user, monkeypatch):
+    import app as app_module
+
+    def fail(**values):
+        raise RuntimeError("meal insert failed")
+    monkeypatch.setattr(app_module, "log_meal_entry", fail)
+
+    response, counter = _count(db, lambda: app.test_client().get(f"/api/food/search/Rollback Food/{user}"))
+
+    assert response.status_code == 500
+    assert counter.commits == 1  # only the read-only release before the USDA call
+    assert Ingredient.query.filter_by(name="Rollback Food").count() == 0
+
+def test_queued_meal_waits_for_the_commit(app, db, user, monkeypatch):
+    from sqlalchemy.orm import Session
+    from unit_of_work import has_unsaved_writes
+    from write_behind import meal_log_queue
+
+    submitted = []
+    monkeypatch.setattr(meal_log_queue, "enabled", True)
+    monkeypatch.setattr(meal_log_queue, "reserve_id", lambda: 9001)
+    monkeypatch.setattr(meal_log_queue, "submit", lambda values, meal_id=None: submitted.append(meal_id))
+
+    def fail_commit(session):
+        if has_unsaved_writes(session):  # not the read-only release before the USDA call
+            raise RuntimeError("commit failed")
+    event.listen(Session, 'before_commit', fail_commit)
+    try:
+        response = app.test_client().get(f"/api/food/search/Queued Food/{user}")
+    finally:
+        event.remove(Session, 'before_commit', fail_commit)
+    assert response.status_code == 500
+    assert submitted == []
+
+    response = app.test_client().get(f"/api/food/search/Queued Food/{user}")
+    assert response.get_json()["id"] == 9001
+    assert submitted == [9001]
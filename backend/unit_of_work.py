@@ -0,0 +1,89 @@
+"""
+Request-scoped unit of work for the write routes.
+
+A route decorated with `@unit_of_work` commits exactly once: when it returns a response
+below 400. It rolls back when it raises or answers with an error status. Inside it,
+services end their writes with `commit_or_flush()`, which only flushes: the SQL runs where
+the change is made (ids are assigned, constraint errors surface in the route's own error
+handling), but the transaction stays open until the end of the request. Skipping the
+intermediate COMMITs also saves the reloads of every expired object that follows each one.
+
+Work that must only happen once the transaction is committed (queueing a write-behind
+meal next to an ingredient insert) is registered with `on_commit()`; it runs right after
+the COMMIT, before the response is returned, and is dropped on rollback.
+
+Outside a unit of work (CLI scripts, the write-behind thread, warmers) `commit_or_flush()`
+commits and `on_commit()` runs the callback at once.
+"""
+from functools import wraps
+
+from flask import g, has_request_context, make_response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db
+
+
+def in_unit_of_work():
+    return has_request_context() and g.get("unit_of_work", False)
+
+def commit_or_flush():
+    """
+    Flush inside a unit of work (the decorator commits at the end), commit otherwise.
+    """
+    if in_unit_of_work():
+        db.session.flush()
+    else:
+        db.session.commit()
+
+def on_commit(callback):
+    """
+    Run `callback` after the unit of work commits (immediately when there is none).
+    """
+    if in_unit_of_work():
+        g.unit_of_work_callbacks.append(callback)
+    else:
+        callback()
+
+def has_unsaved_writes(session):
+    """
+    True while the session has changes that are pending or flushed but not yet committed.
+    """
+    return bool(session.new or session.dirty or session.deleted or session.info.get("flushed_writes"))
+
+def unit_of_work(view):
+    """
+    Decorator: one COMMIT for the whole request if it succeeds, a rollback otherwise.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.unit_of_work = True
+        g.unit_of_work_callbacks = []
+        try:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code < 400:
+                db.session.commit()
+                callbacks = g.unit_of_work_callbacks
+                g.unit_of_work = False
+                for callback in callbacks:
+                    callback()
+            else:
+                db.session.rollback()
+            return response
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            g.unit_of_work = False
+            g.unit_of_work_callbacks = []
+    return wrapper
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_flushed_writes(session, flush_context):
+    session.info["flushed_writes"] = True
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_soft_rollback')
+def _clear_flushed_writes(session, *args):
+    session.info.pop("flushed_writes", None)
@@ -25,11 +25,7 @@ def validate_biometrics(data):
         return errors 
     
     
-    check_weight = weight if weight_unit == 'lbs' else weight * 2.204
-    if weight <= 0:
-        errors.append("Weight must be a positive number.")
-    elif check_weight > 1000:
-        errors.append("Weight exceeds realistic human limits (1000 lbs).")
+    errors.extend(validate_weight(weight, weight_unit))
 
 
     if height_unit == 'ft':
@@ -47,7 +43,7 @@ def validate_biometrics(data):
     if not (13 <= age <= 120):
         errors.append("Age must be between 13 and 120.")
 
-    valid_activities = ['sedentary', 'light', 'moderate', 'active', 'extra_active']
+    valid_activities = ['sedentary', 'light', 'moderate', 'active', 'very_active', 'extra_active']
     if activity_level.lower() not in valid_activities:
         errors.append(f"Invalid activity level. Choose from: {', '.join(valid_activities)}")
 
@@ -77,6 +73,17 @@ def validate_meal_log(data):
 
     return errors
 
+def validate_weight(weight, weight_unit='kg'):
+    """
+    Validates a single body-weight value (shared by biometrics and weight logging/import).
+    """
+    check_weight = weight if weight_unit == 'lbs' else weight * 2.204
+    if weight <= 0:
+        return ["Weight must be a positive number."]
+    if check_weight > 1000:
+        return ["Weight exceeds realistic human limits (1000 lbs)."]
+    return []
+
 def validate_email(email):
     """
     Simple check to ensure email has an @ and a dot.
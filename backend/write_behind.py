@@ -0,0 +1,441 @@
+"""
+Opt-in write-behind queue for meal log inserts (MEAL_LOG_WRITE_BEHIND=1).
+
+A new entry is acknowledged once it is in a local append-only journal and fsynced;
+concurrent writers share a single fsync, so a burst costs one disk flush instead of one
+database commit per request. A background flusher then inserts everything pending in one
+transaction every few milliseconds.
+
+- Ids are reserved up front in blocks from the database (the meal_log id sequence on
+  PostgreSQL, the AUTOINCREMENT counter in sqlite_sequence on SQLite), so the response
+  carries the entry's final id and no other writer (another worker, the importer, plain
+  ORM inserts) can take it. An id that is already in the table can therefore only be a
+  row of ours that an interrupted flush committed.
+- The change sequence and data_version bookkeeping that the ORM hooks in models.py do
+  for single inserts is done once per user per batch.
+- Reads merge `pending_for(user_id)` so users see their own writes immediately, and the
+  newest pending id is part of the ETag (http_cache.py). Pending rows only exist in the
+  process that queued them, so the app must run as a single worker process while this is
+  on (gunicorn.conf.py enforces it); a gevent worker still serves many requests at once.
+- The journal is a series of segment files. Once the current one passes COMPACT_BYTES the
+  next entries go to a new segment, and a segment is deleted as soon as every entry in it
+  has been flushed, so the journal (and the replay at startup) stays about as large as
+  what is actually pending, however long the queue keeps busy.
+- On startup the journal is replayed: entries whose id is not in the database yet are
+  queued again. Each process takes its own journal slot with an exclusive file lock, so
+  processes never share segments and the journal of one that died (or is still shutting
+  down while its replacement starts) is picked up by the next process that gets its slot.
+- A row the database rejects (constraint or data error, deleted user) is isolated by
+  splitting the batch and moved to a dead-letter file next to the journals, so it can't
+  hold back everyone else's entries.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import DataError, IntegrityError
+
+from models import db, MealLog, User, allocate_meal_seqs, bump_data_version
+from services import serialize_meal
+from unit_of_work import commit_or_flush, on_commit
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "journal")
+FLUSH_INTERVAL_SECONDS = 0.005
+MAX_BATCH = 1000
+ID_BLOCK = 100
+JOURNAL_SLOTS = 64
+COMPACT_BYTES = 1 << 20
+RETRY_SECONDS = 1.0
+DEAD_LETTER_FILE = "meal_log.dead.jsonl"
+
+MEAL_FIELDS = ("id", "user_id", "meal_name", "calories", "protein", "carbs", "fats", "amount", "date")
+
+
+def _utc_naive(value):
+    if value is None:
+        return datetime.utcnow()
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class MealLogJournal:
+    """
+    Append-only JSON-lines segments with group fsync. Each line is one pending meal log row.
+
+    Entries are referred to by the number of the segment they were written to; `release()`
+    marks one flushed, and a segment other than the current one is deleted when none of
+    its entries is left unflushed.
+    """
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        for slot in range(JOURNAL_SLOTS):
+            handle = open(os.path.join(directory, f"meal_log.{slot}.lock"), "a+b")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                continue
+            self.slot, self._lock_file = slot, handle
+            break
+        else:
+            raise RuntimeError(f"All {JOURNAL_SLOTS} meal log journal slots in {directory} are in use")
+
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._written = 0
+        self._synced = 0
+        self._unflushed = {}  # segment -> entries not yet released
+        self._segments = self._existing_segments()
+        self._open_segment(max(self._segments, default=0) + 1)
+
+    def _path(self, segment):
+        # Segment 0 is the single-file journal of earlier versions.
+        name = f"meal_log.{self.slot}.{segment}.journal" if segment else f"meal_log.{self.slot}.journal"
+        return os.path.join(self.directory, name)
+
+    def _existing_segments(self):
+        prefix = f"meal_log.{self.slot}."
+        segments = [0] if os.path.exists(self._path(0)) else []
+        for name in os.listdir(self.directory):
+            number = name[len(prefix):-len(".journal")]
+            if name.startswith(prefix) and name.endswith(".journal") and number.isdigit():
+                segments.append(int(number))
+        return sorted(segments)
+
+    def _open_segment(self, segment):
+        self.segment, self._file = segment, open(self._path(segment), "ab")
+        self._unflushed.setdefault(segment, 0)
+
+    def read(self):
+        """
+        [(segment, entry)] for every entry in the segments left by an earlier process.
+        """
+        entries = []
+        for segment in self._segments:
+            with open(self._path(segment), "rb") as f:
+                for line in f:
+                    try:
+                        entries.append((segment, json.loads(line)))
+                    except ValueError:
+                        break  # torn final line from a crash mid-write; never acknowledged
+                    self._unflushed[segment] = self._unflushed.get(segment, 0) + 1
+            if not self._unflushed.get(segment):
+                self._remove(segment)
+        return entries
+
+    def append(self, entry):
+        """
+        Write one entry and return its segment once it (and anything appended before it)
+        is on disk.
+        """
+        line = (json.dumps(entry, default=str) + "\n").encode()
+        with self._write_lock:
+            self._file.write(line)
+            self._written += 1
+            ticket, segment, handle = self._written, self.segment, self._file
+            self._unflushed[segment] += 1
+
+        # Whoever gets the sync lock first fsyncs for everyone who appended before it.
+        with self._sync_lock:
+            if self._synced < ticket:
+                with self._write_lock:
+                    handle.flush()
+                    target = self._written
+                os.fsync(handle.fileno())
+                self._synced = target
+        return segment
+
+    def release(self, segment):
+        with self._write_lock:
+            self._unflushed[segment] -= 1
+            done = segment != self.segment and not self._unflushed[segment]
+        if done:
+            self._remove(segment)
+
+    def _remove(self, segment):
+        self._unflushed.pop(segment, None)
+        try:
+            os.remove(self._path(segment))
+        except FileNotFoundError:
+            pass
+
+    def rotate(self):
+        """
+        Start a new segment once the current one is larger than COMPACT_BYTES; the old one is
+        deleted right away if everything in it has been flushed already.
+        """
+        with self._sync_lock, self._write_lock:
+            if self._file.tell() <= COMPACT_BYTES:
+                return
+            old_segment, old_file = self.segment, self._file
+            old_file.flush()
+            os.fsync(old_file.fileno())
+            self._synced = self._written
+            old_file.close()
+            self._open_segment(old_segment + 1)
+            done = not self._unflushed[old_segment]
+        if done:
+            self._remove(old_segment)
+
+
+class IdAllocator:
+    """
+    Hands out meal_log ids reserved from the database ID_BLOCK at a time.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = []
+
+    def next_id(self):
+        with self._lock:
+            if not self._ids:
+                self._ids = self._reserve(ID_BLOCK)
+            return self._ids.pop(0)
+
+    def _reserve(self, count):
+        if db.engine.dialect.name == 'postgresql':
+            return list(db.session.execute(text(
+                "SELECT nextval(pg_get_serial_sequence('meal_log', 'id')) FROM generate_series(1, :n)"
+            ), {"n": count}).scalars())
+
+        # SQLite: AUTOINCREMENT never hands out an id at or below sqlite_sequence.seq, so
+        # moving it forward (in its own, immediately committed transaction) reserves the block.
+        with db.engine.begin() as conn:
+            sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'meal_log'")).scalar()
+            if 'AUTOINCREMENT' not in (sql or '').upper():
+                raise RuntimeError("meal_log lacks AUTOINCREMENT; run init_db.py to upgrade the schema")
+            last = conn.execute(text(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, (SELECT COALESCE(MAX(id), 0) FROM meal_log)) + :n "
+                "WHERE name = 'meal_log' RETURNING seq"
+            ), {"n": count}).scalar()
+            if last is None:  # no row until the first insert into the table
+                last = conn.execute(text(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT 'meal_log', COALESCE(MAX(id), 0) + :n "
+                    "FROM meal_log RETURNING seq"
+                ), {"n": count}).scalar()
+        return list(range(last - count + 1, last + 1))
+
+
+class WriteBehindQueue:
+    def __init__(self):
+        self.enabled = False
+        self._app = None
+        self._journal = None
+        self._ids = None
+        self._pending = {}  # id -> row dict, in insertion order
+        self._segments = {}  # id -> journal segment holding the row
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, app, journal_dir=None):
+        """
+        Open (and replay) this process's journal and start the background flusher.
+        """
+        self._app = app
+        self._journal = MealLogJournal(journal_dir or os.getenv("MEAL_LOG_JOURNAL_DIR", DEFAULT_JOURNAL_DIR))
+
+        entries = self._journal.read()
+        with app.app_context():
+            ids = [e["id"] for _, e in entries]
+            existing = set()
+            for start in range(0, len(ids), MAX_BATCH):
+                existing.update(db.session.scalars(select(MealLog.id).where(MealLog.id.in_(ids[start:start + MAX_BATCH]))))
+            db.session.remove()
+
+        for segment, entry in entries:
+            if entry["id"] in existing or entry["id"] in self._pending:
+                self._journal.release(segment)
+            else:
+                entry["date"] = datetime.fromisoformat(entry["date"])
+                self._pending[entry["id"]] = entry
+                self._segments[entry["id"]] = segment
+        if self._pending:
+            print(f"Write-behind: replaying {len(self._pending)} journaled meal log entries")
+
+        self._ids = IdAllocator()
+        self.enabled = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._wake.set()
+        return self
+
+    def reserve_id(self):
+        return self._ids.next_id()
+
+    def submit(self, values, meal_id=None):
+        """
+        Journal a meal log row and return its id (reserved here unless `meal_id` was
+        reserved already); the insert happens in the background.
+        """
+        row = {field: values.get(field) for field in MEAL_FIELDS}
+        row["id"] = meal_id or self._ids.next_id()
+        row["date"] = _utc_naive(row["date"])
+        for field, default in (("protein", 0), ("carbs", 0), ("fats", 0), ("amount", 1)):
+            if row[field] is None:
+                row[field] = default
+        segment = self._journal.append(row)
+        with self._lock:
+            self._pending[row["id"]] = row
+            self._segments[row["id"]] = segment
+        self._wake.set()
+        return row["id"]
+
+    def pending_for(self, user_id):
+        with self._lock:
+            return [dict(row) for row in self._pending.values() if row["user_id"] == user_id]
+
+    def pending_version(self, user_id):
+        """
+        Changes whenever the user's set of pending rows does (part of the ETag).
+        """
+        if not self.enabled:
+            return 0
+        with self._lock:
+            return max((i for i, row in self._pending.items() if row["user_id"] == user_id), default=0)
+
+    def is_pending(self, meal_id):
+        with self._lock:
+            return meal_id in self._pending
+
+    def flush(self):
+        """
+        Insert everything pending in one transaction. Returns the number of rows written.
+        Needs an app context.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending.values())[:MAX_BATCH]
+            if not batch:
+                return 0
+
+            # Ids are reserved from the database, so one that is already there was committed
+            # by a previous, interrupted run: it is only dropped from the queue.
+            ids = [row["id"] for row in batch]
+            existing = set(db.session.scalars(select(MealLog.id).where(MealLog.id.in_(ids))))
+            users = set(db.session.scalars(select(User.id).where(User.id.in_({row["user_id"] for row in batch}))))
+            db.session.rollback()
+
+            rows = []
+            for row in batch:
+                if row["id"] in existing:
+                    continue
+                if row["user_id"] in users:
+                    rows.append(row)
+                else:
+                    self._dead_letter(row, "user does not exist")
+            self._insert_isolating(rows)
+
+            with self._lock:
+                segments = []
+                for row in batch:
+                    self._pending.pop(row["id"], None)
+                    segments.append(self._segments.pop(row["id"]))
+            for segment in segments:
+                self._journal.release(segment)
+            self._journal.rotate()
+            return len(batch)
+
+    def _insert(self, rows):
+        by_user = {}
+        for row in rows:
+            by_user.setdefault(row["user_id"], []).append(row)
+        try:
+            values = []
+            for user_id, user_rows in by_user.items():
+                seq = allocate_meal_seqs(db.session, user_id, len(user_rows))
+                values.extend({**row, "change_seq": seq + offset} for offset, row in enumerate(user_rows))
+            if values:
+                db.session.execute(insert(MealLog.__table__), values)
+            bump_data_version(db.session, list(by_user))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _insert_isolating(self, rows):
+        """
+        Insert `rows`; when the database rejects the batch, bisect it so the good rows still
+        commit and each rejected row ends up in the dead-letter file. Other errors (database
+        unreachable, ...) propagate and the flusher retries the whole batch.
+        """
+        if not rows:
+            return
+        try:
+            self._insert(rows)
+        except (IntegrityError, DataError) as e:
+            if len(rows) == 1:
+                self._dead_letter(rows[0], str(e.orig))
+                return
+            middle = len(rows) // 2
+            self._insert_isolating(rows[:middle])
+            self._insert_isolating(rows[middle:])
+
+    def _dead_letter(self, row, reason):
+        print(f"Write-behind: meal log entry {row['id']} rejected, moved to dead letters: {reason}")
+        path = os.path.join(self._journal.directory, DEAD_LETTER_FILE)
+        line = json.dumps({"row": row, "reason": reason, "at": datetime.utcnow()}, default=str) + "\n"
+        with open(path, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def drain(self):
+        """
+        Flush until nothing is pending (e.g. before a delete that must see every row).
+        """
+        while self.flush():
+            pass
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            time.sleep(FLUSH_INTERVAL_SECONDS)  # let a burst accumulate into one batch
+            try:
+                with self._app.app_context():
+                    self.drain()
+            except Exception as e:
+                print(f"Write-behind flush failed, retrying: {e}")
+                time.sleep(RETRY_SECONDS)
+                self._wake.set()
+
+
+meal_log_queue = WriteBehindQueue()
+
+
+def log_meal_entry(**values):
+    """
+    Insert a meal log row (through the write-behind queue when enabled) and return its id.
+    Inside a unit of work the queued row is only journaled once the request's other writes
+    have committed, so a failed commit doesn't leave the meal logged anyway.
+    """
+    if meal_log_queue.enabled:
+        meal_id = meal_log_queue.reserve_id()
+        on_commit(lambda: meal_log_queue.submit(values, meal_id))
+        return meal_id
+    meal = MealLog(**values)
+    db.session.add(meal)
+    commit_or_flush()
+    return meal.id
+
+def merge_pending(user_id, meals):
+    """
+    Serialized meals plus the user's not-yet-flushed ones, newest first.
+    """
+    if not meal_log_queue.enabled:
+        return meals
+    pending = meal_log_queue.pending_for(user_id)
+    if not pending:
+        return meals
+    known = {m["id"] for m in meals}
+    extra = [serialize_meal(SimpleNamespace(**row)) for row in pending if row["id"] not in known]
+    return sorted(meals + extra, key=lambda m: m["date"], reverse=True)
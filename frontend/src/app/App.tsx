@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { GoogleOAuthProvider } from '@react-oauth/google';
 import { CalorieTracker } from "./components/CalorieTracker";
 import { MealLogger, MealEntry } from "./components/MealLogger";
@@ -16,6 +16,7 @@ import { Input } from "./components/ui/input";
 import { Label } from "./components/ui/label";
 import { TibebPattern } from "./components/TibebPattern";
 import { Toaster, toast } from 'sonner';
+import { endSession } from "../services/auth";
 
 // --- CONFIGURATION ---
 const GOOGLE_CLIENT_ID = "905920031102-dh2ss3maqm4k4jt1fbjaobcej56c08eq.apps.googleusercontent.com";
@@ -24,6 +25,17 @@ const GOOGLE_CLIENT_ID = "905920031102-dh2ss3maqm4k4jt1fbjaobcej56c08eq.apps.goo
 const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:5000";
 
 type AppState = "auth" | "onboarding" | "app";
+
+const toMealEntry = (m: any): MealEntry => ({
+  id: m.id,
+  foodName: m.meal_name,
+  calories: m.calories,
+  servings: 1,
+  timestamp: new Date(m.date),
+  protein: m.protein,
+  carbs: m.carbs,
+  fats: m.fats
+});
 type Page = "home" | "statistics";
 
 export default function App() {
@@ -37,6 +49,9 @@ export default function App() {
 
   const [calorieTarget, setCalorieTarget] = useState(2000);
   const [meals, setMeals] = useState<MealEntry[]>([]);
+  const [prediction, setPrediction] = useState<any>(null);
+  // Last meal-log change sequence we've seen; /meal-log/changes only returns what came after it
+  const mealSeq = useRef(0);
   
   const [sidebarSearchResults, setSidebarSearchResults] = useState<FoodWithRecipe[]>([]);
   const [selectedFood, setSelectedFood] = useState<FoodWithRecipe | null>(null); 
@@ -61,16 +76,21 @@ export default function App() {
       if (storedPic) setUserPicture(storedPic);
 
       try {
-        const res = await fetch(`${API_URL}/api/user/${storedUserId}/stats/latest`);
+        // One round trip for profile, stats, today's meals and prediction
+        const res = await fetch(`${API_URL}/api/user/${storedUserId}/dashboard`);
         if (res.ok) {
             const data = await res.json();
-            if (data.calorie_target) setCalorieTarget(data.calorie_target);
-            await fetchMeals(storedUserId);
-            setAppState("app");
+            if (!data.stats) {
+                setAppState("onboarding");
+            } else {
+                if (data.stats.calorie_target) setCalorieTarget(data.stats.calorie_target);
+                setMeals(data.today.meals.map(toMealEntry));
+                mealSeq.current = data.today.meal_seq || 0;
+                setPrediction(data.prediction);
+                setAppState("app");
+            }
         } else if (res.status === 404) {
-            const userRes = await fetch(`${API_URL}/api/user/${storedUserId}`);
-            if (userRes.ok) setAppState("onboarding");
-            else handleLogout();
+            handleLogout();
         } else {
             setAppState("auth");
         }
@@ -84,25 +104,32 @@ export default function App() {
     initApp();
   }, []);
 
-  const fetchMeals = async (id: string) => {
+  const syncMeals = async (id: string) => {
     try {
-      const res = await fetch(`${API_URL}/api/user/${id}/meal-log`);
+      const res = await fetch(`${API_URL}/api/user/${id}/meal-log/changes?since=${mealSeq.current}`);
       if (res.ok) {
         const data = await res.json();
-        setMeals(data.map((m: any) => ({
-            id: m.id,
-            foodName: m.meal_name,
-            calories: m.calories,
-            servings: 1, 
-            timestamp: new Date(m.date),
-            protein: m.protein,
-            carbs: m.carbs,
-            fats: m.fats
-        })));
+        const dayStart = new Date();
+        dayStart.setHours(0, 0, 0, 0);
+        const changed = data.upserts.map(toMealEntry).filter((m: MealEntry) => m.timestamp >= dayStart);
+
+        setMeals(prev => {
+          if (data.reset) return changed;
+          const removed = new Set([...data.deletes, ...changed.map((m: MealEntry) => m.id)]);
+          return [...prev.filter(m => !removed.has(m.id)), ...changed];
+        });
+        mealSeq.current = data.seq;
       }
     } catch (err) { console.error(err); }
   };
 
+  useEffect(() => {
+    if (appState !== "app" || !userId) return;
+    const onFocus = () => syncMeals(userId);
+    window.addEventListener("focus", onFocus);
+    return () => window.removeEventListener("focus", onFocus);
+  }, [appState, userId]);
+
   const handleAuth = () => window.location.reload();
   
   const handleOnboardingComplete = (data: OnboardingData) => {
@@ -112,7 +139,7 @@ export default function App() {
   };
 
   const handleLogout = () => {
-    localStorage.clear();
+    endSession();
     setUserId(null);
     setAppState('auth');
   };
@@ -167,7 +194,9 @@ export default function App() {
                 protein: data.protein,
                 carbs: data.carbs,
                 fat: data.fats,
-                description: data.description || "Search Result",
+                description: data.estimated_from
+                    ? `Estimated from ${data.estimated_from} (${Math.round(data.confidence * 100)}% match)`
+                    : data.description || "Search Result",
                 image: data.image,
                 recipe: recipeData, 
                 ingredients: data.ingredients
@@ -298,7 +327,7 @@ export default function App() {
                                 </div>
                                 </div>
                             ) : (
-                                <Statistics meals={meals} calorieTarget={calorieTarget} />
+                                <Statistics meals={meals} calorieTarget={calorieTarget} initialPrediction={prediction} />
                             )}
                         </div>
                     </div>
@@ -7,6 +7,7 @@ import { Utensils, Loader2 } from "lucide-react";
 import { useState } from "react";
 import { toast } from "sonner";
 import { TibebPattern } from "./TibebPattern"; 
+import { saveSession } from "../../services/auth";
 
 const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:5000";
 
@@ -31,8 +32,7 @@ export function AuthPage({ onAuth }: { onAuth: () => void }) {
           const data = JSON.parse(text);
           if (!res.ok) throw new Error(data.error || text);
 
-          localStorage.setItem('user_id', data.user_id);
-          localStorage.setItem('username', data.username);
+          saveSession(data);
           if (data.picture) localStorage.setItem('user_picture', data.picture);
           
           toast.success(`Welcome, ${data.username}!`);
@@ -61,8 +61,7 @@ export function AuthPage({ onAuth }: { onAuth: () => void }) {
       
       const data = await res.json();
       if (res.ok) {
-        localStorage.setItem('user_id', data.user_id);
-        localStorage.setItem('username', data.username);
+        saveSession(data);
         onAuth();
       } else {
         toast.error(data.error);
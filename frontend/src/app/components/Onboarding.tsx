@@ -100,6 +100,7 @@ export function Onboarding({ onComplete }: { onComplete: (data: OnboardingData)
                         <SelectItem value="light">Lightly Active</SelectItem>
                         <SelectItem value="moderate">Moderately Active</SelectItem>
                         <SelectItem value="active">Very Active</SelectItem>
+                        <SelectItem value="extra_active">Extra Active (Physical Job + Training)</SelectItem>
                     </SelectContent>
                 </Select>
 
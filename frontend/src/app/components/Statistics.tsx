@@ -2,6 +2,7 @@ import { useEffect, useState } from "react";
 import { Card, CardHeader, CardTitle, CardContent } from "./ui/card";
 import { MealEntry } from "./MealLogger";
 import { Activity, Target, TrendingUp, Calendar } from "lucide-react";
+import { TrendsChart } from "./TrendsChart";
 
 // --- DYNAMIC URL ---
 const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:5000";
@@ -9,13 +10,15 @@ const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:5000";
 interface StatisticsProps {
   meals: MealEntry[];
   calorieTarget: number;
+  initialPrediction?: any;
 }
 
-export function Statistics({ meals, calorieTarget }: StatisticsProps) {
-  const [prediction, setPrediction] = useState<any>(null);
+export function Statistics({ meals, calorieTarget, initialPrediction }: StatisticsProps) {
+  const [prediction, setPrediction] = useState<any>(initialPrediction ?? null);
 
-  // FETCH PREDICTION ON LOAD
+  // FETCH PREDICTION ON LOAD (skipped when the dashboard already sent it)
   useEffect(() => {
+    if (initialPrediction) return;
     const userId = localStorage.getItem('user_id');
     if (userId) {
         // --- UPDATED URL ---
@@ -109,6 +112,8 @@ export function Statistics({ meals, calorieTarget }: StatisticsProps) {
           </CardContent>
         </Card>
       </div>
+
+      <TrendsChart />
     </div>
   );
 }
\ No newline at end of file
@@ -0,0 +1,99 @@
+import { useEffect, useState } from "react";
+import { LineChart, Line, XAxis, YAxis, Tooltip, ResponsiveContainer, CartesianGrid } from "recharts";
+import { Card, CardHeader, CardTitle, CardContent } from "./ui/card";
+import { Button } from "./ui/button";
+import { LineChart as LineChartIcon } from "lucide-react";
+
+const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:5000";
+
+type Metric = "calories" | "protein" | "weight";
+
+const METRICS: { key: Metric; label: string; unit: string }[] = [
+  { key: "calories", label: "Calories", unit: "kcal" },
+  { key: "protein", label: "Protein", unit: "g" },
+  { key: "weight", label: "Weight", unit: "" },
+];
+
+// Range in days -> bucket; the server widens the bucket further if needed.
+const RANGES: { label: string; days: number; bucket: string }[] = [
+  { label: "1M", days: 30, bucket: "day" },
+  { label: "3M", days: 90, bucket: "day" },
+  { label: "1Y", days: 365, bucket: "week" },
+  { label: "3Y", days: 3 * 365, bucket: "month" },
+];
+
+interface SeriesPoint {
+  t: string;
+  value: number;
+}
+
+export function TrendsChart() {
+  const [metric, setMetric] = useState<Metric>("calories");
+  const [range, setRange] = useState(RANGES[1]);
+  const [points, setPoints] = useState<SeriesPoint[]>([]);
+  const [loading, setLoading] = useState(false);
+
+  useEffect(() => {
+    const userId = localStorage.getItem("user_id");
+    if (!userId) return;
+
+    const from = new Date(Date.now() - range.days * 86400000).toISOString().slice(0, 10);
+    // Weight keeps daily resolution; the server downsamples it to a few hundred points.
+    const bucket = metric === "weight" ? "day" : range.bucket;
+    setLoading(true);
+    fetch(`${API_URL}/api/user/${userId}/stats/series?metric=${metric}&bucket=${bucket}&from=${from}`)
+      .then(res => res.json())
+      .then(data => setPoints(data.points || []))
+      .catch(err => console.error(err))
+      .finally(() => setLoading(false));
+  }, [metric, range]);
+
+  const unit = METRICS.find(m => m.key === metric)?.unit;
+
+  return (
+    <Card>
+      <CardHeader className="flex flex-row items-center justify-between pb-2">
+        <CardTitle className="text-lg font-medium flex items-center gap-2">
+          <LineChartIcon className="w-5 h-5 text-[#8b5a3c]" /> Trends
+        </CardTitle>
+        <div className="flex gap-1">
+          {RANGES.map(r => (
+            <Button key={r.label} size="sm" variant={r.label === range.label ? "default" : "outline"}
+                    className={r.label === range.label ? "bg-[#8b5a3c] hover:bg-[#6b4423]" : ""}
+                    onClick={() => setRange(r)}>
+              {r.label}
+            </Button>
+          ))}
+        </div>
+      </CardHeader>
+      <CardContent>
+        <div className="flex gap-1 mb-4">
+          {METRICS.map(m => (
+            <Button key={m.key} size="sm" variant={m.key === metric ? "default" : "outline"}
+                    className={m.key === metric ? "bg-[#8b5a3c] hover:bg-[#6b4423]" : ""}
+                    onClick={() => setMetric(m.key)}>
+              {m.label}
+            </Button>
+          ))}
+        </div>
+        {points.length === 0 ? (
+          <div className="h-64 flex items-center justify-center text-sm text-gray-500">
+            {loading ? "Loading..." : "Nothing logged in this period yet."}
+          </div>
+        ) : (
+          <div className="h-64">
+            <ResponsiveContainer width="100%" height="100%">
+              <LineChart data={points}>
+                <CartesianGrid strokeDasharray="3 3" stroke="#eee" />
+                <XAxis dataKey="t" tick={{ fontSize: 11 }} minTickGap={24} />
+                <YAxis tick={{ fontSize: 11 }} domain={metric === "weight" ? ["auto", "auto"] : [0, "auto"]} />
+                <Tooltip formatter={(value: number) => [`${value} ${unit}`.trim(), METRICS.find(m => m.key === metric)?.label]} />
+                <Line type="monotone" dataKey="value" stroke="#8b5a3c" strokeWidth={2} dot={false} />
+              </LineChart>
+            </ResponsiveContainer>
+          </div>
+        )}
+      </CardContent>
+    </Card>
+  );
+}
@@ -2,6 +2,9 @@ import React from 'react';
 import ReactDOM from 'react-dom/client';
 import App from './app/App';
 import './styles/index.css';
+import { installAuthFetch } from './services/auth';
+
+installAuthFetch();
 
 ReactDOM.createRoot(document.getElementById('root')!).render(
   <React.StrictMode>
@@ -0,0 +1,84 @@
+const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:5000";
+
+const TOKEN_KEY = "token";
+const REFRESH_KEY = "refresh_token";
+
+interface SessionData {
+  user_id: number | string;
+  username?: string;
+  token?: string;
+  refresh_token?: string;
+}
+
+export const saveSession = (data: SessionData) => {
+  localStorage.setItem("user_id", String(data.user_id));
+  if (data.username) localStorage.setItem("username", data.username);
+  if (data.token) localStorage.setItem(TOKEN_KEY, data.token);
+  if (data.refresh_token) localStorage.setItem(REFRESH_KEY, data.refresh_token);
+};
+
+// Revokes the server-side session (all refresh tokens of the user), then forgets it locally.
+export const endSession = () => {
+  const refresh = localStorage.getItem(REFRESH_KEY);
+  if (refresh) {
+    fetch(`${API_URL}/api/auth/logout`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ refresh_token: refresh }),
+    }).catch(() => {});
+  }
+  localStorage.clear();
+};
+
+let refreshing: Promise<string | null> | null = null;
+
+// One refresh at a time, shared by every request that hit an expired token.
+const refreshToken = (originalFetch: typeof fetch): Promise<string | null> => {
+  if (!refreshing) {
+    const refresh = localStorage.getItem(REFRESH_KEY);
+    refreshing = (refresh
+      ? originalFetch(`${API_URL}/api/auth/refresh`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ refresh_token: refresh }),
+        }).then(res => (res.ok ? res.json() : null))
+      : Promise.resolve(null))
+      .then(data => {
+        if (!data?.token) return null;
+        saveSession(data);
+        return data.token as string;
+      })
+      .catch(() => null)
+      .finally(() => { refreshing = null; });
+  }
+  return refreshing;
+};
+
+/**
+ * Adds `Authorization: Bearer <token>` to every request to the API and, when the server
+ * answers 401 because the short-lived token expired, trades the refresh token for a new
+ * pair once and retries.
+ */
+export const installAuthFetch = () => {
+  const originalFetch = window.fetch.bind(window);
+
+  window.fetch = async (input: RequestInfo | URL, init: RequestInit = {}) => {
+    const url = typeof input === "string" ? input : input instanceof URL ? input.href : input.url;
+    const token = localStorage.getItem(TOKEN_KEY);
+    if (!token || !url.startsWith(API_URL) || url.includes("/api/auth/")) {
+      return originalFetch(input, init);
+    }
+
+    const withToken = (value: string) => {
+      const headers = new Headers(init.headers);
+      headers.set("Authorization", `Bearer ${value}`);
+      return originalFetch(input, { ...init, headers });
+    };
+
+    const response = await withToken(token);
+    if (response.status !== 401) return response;
+
+    const fresh = await refreshToken(originalFetch);
+    return fresh ? withToken(fresh) : response;
+  };
+};